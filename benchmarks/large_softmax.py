@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks one training step of the output layer for a large vocabulary: a
+full softmax (a :class:`DenseLayer` with a softmax nonlinearity and
+:func:`lasagne.objectives.categorical_crossentropy`) against a
+:class:`SampledSoftmaxLayer` and an :class:`AdaptiveSoftmaxLayer`.
+
+Each step computes the loss of a batch of hidden states and applies the
+:func:`lasagne.updates.sgd` updates to the output layer. Targets are drawn
+from a Zipfian distribution, as for word frequencies.
+
+Usage: python benchmarks/large_softmax.py [--vocabulary N] [--hidden N]
+                                          [--batch-size N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+import lasagne
+from lasagne.layers import InputLayer, DenseLayer, get_output
+from lasagne.layers import SampledSoftmaxLayer, AdaptiveSoftmaxLayer
+
+
+def compile_step(layer, loss, x, t):
+    updates = lasagne.updates.sgd(loss.mean(), layer.get_params(),
+                                  learning_rate=0.01)
+    return theano.function([x, t], loss.mean(), updates=updates)
+
+
+def main(vocabulary=100000, hidden=256, batch_size=128, num_sampled=1024,
+         repeats=5):
+    rng = np.random.RandomState(42)
+    X = rng.randn(batch_size, hidden).astype(theano.config.floatX)
+    targets = np.minimum(rng.zipf(1.1, batch_size) - 1,
+                         vocabulary - 1).astype('int32')
+    l_in = InputLayer((None, hidden))
+    x, t = l_in.input_var, T.ivector('targets')
+
+    steps = []
+    l_full = DenseLayer(l_in, vocabulary,
+                        nonlinearity=lasagne.nonlinearities.softmax)
+    loss = lasagne.objectives.categorical_crossentropy(get_output(l_full), t)
+    steps.append(('full softmax', compile_step(l_full, loss, x, t)))
+    l_sampled = SampledSoftmaxLayer(l_in, vocabulary, num_sampled)
+    steps.append(('sampled softmax', compile_step(
+            l_sampled, l_sampled.get_loss_for(x, t), x, t)))
+    cutoffs = [c for c in (2000, 20000) if c < vocabulary]
+    l_adaptive = AdaptiveSoftmaxLayer(l_in, vocabulary, cutoffs)
+    steps.append(('adaptive softmax', compile_step(
+            l_adaptive, l_adaptive.get_loss_for(x, t), x, t)))
+
+    print("%-18s %12s %9s" % ("output layer", "ms/step", "speedup"))
+    reference = None
+    for name, step in steps:
+        step(X, targets)  # warm up
+        start = time.time()
+        for _ in range(repeats):
+            step(X, targets)
+        elapsed = (time.time() - start) / repeats
+        reference = reference or elapsed
+        print("%-18s %12.2f %8.1fx" % (name, 1e3 * elapsed,
+                                       reference / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vocabulary', type=int, default=100000)
+    parser.add_argument('--hidden', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--num-sampled', type=int, default=1024)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    main(vocabulary=args.vocabulary, hidden=args.hidden,
+         batch_size=args.batch_size, num_sampled=args.num_sampled,
+         repeats=args.repeats)
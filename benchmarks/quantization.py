@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks the accuracy and speed of int8-quantized networks exported with
+:func:`lasagne.inference.export` against the floating-point export.
+
+A classifier is trained on a synthetic task (inputs labelled by a fixed random
+teacher network), exported three times -- in floating point, with int8
+weights dequantized on the fly, and with int8 weights and calibrated int8
+inputs accumulating in int32 -- and all exports are evaluated on the same
+held-out data.
+
+The "int8 weights" row measures the uncalibrated path: the int8 weights of
+each layer are cast to floating point a block of output units at a time
+into a small reused buffer, multiplied with the input, and the output block
+is scaled afterwards, so no full-size floating-point copy of the weights is
+made. Its speed relative to the floating-point export depends on how fast
+NumPy casts int8 to floating point compared to how fast the floating-point
+weights are read from memory.
+
+Usage: python benchmarks/quantization.py [--model {mlp,cnn}] [--epochs N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+import lasagne
+from lasagne.inference import export
+
+
+def make_data(model, num_examples, num_classes, rng):
+    if model == 'mlp':
+        shape = (num_examples, 256)
+    else:
+        shape = (num_examples, 3, 16, 16)
+    X = rng.randn(*shape).astype(theano.config.floatX)
+    flat = X.reshape(num_examples, -1)
+    W1 = rng.randn(flat.shape[1], 128) / np.sqrt(flat.shape[1])
+    W2 = rng.randn(128, num_classes) / np.sqrt(128)
+    y = np.tanh(flat.dot(W1)).dot(W2).argmax(axis=1).astype('int32')
+    return X, y
+
+
+def build_model(model, num_classes):
+    L = lasagne.layers
+    if model == 'mlp':
+        network = L.InputLayer((None, 256))
+        network = L.DenseLayer(network, 512)
+        network = L.DenseLayer(network, 512)
+    else:
+        network = L.InputLayer((None, 3, 16, 16))
+        network = L.Conv2DLayer(network, 32, 3, pad=1)
+        network = L.MaxPool2DLayer(network, 2)
+        network = L.Conv2DLayer(network, 32, 3, pad=1)
+        network = L.NINLayer(network, 16)
+        network = L.MaxPool2DLayer(network, 2)
+        network = L.DenseLayer(network, 256)
+    return L.DenseLayer(network, num_classes,
+                        nonlinearity=lasagne.nonlinearities.softmax)
+
+
+def train(network, X, y, epochs, batch_size=128):
+    input_var = lasagne.layers.get_all_layers(network)[0].input_var
+    target_var = T.ivector('targets')
+    prediction = lasagne.layers.get_output(network)
+    loss = lasagne.objectives.categorical_crossentropy(prediction, target_var)
+    params = lasagne.layers.get_all_params(network, trainable=True)
+    updates = lasagne.updates.adam(loss.mean(), params, learning_rate=1e-3)
+    train_fn = theano.function([input_var, target_var], loss.mean(),
+                               updates=updates)
+    for epoch in range(epochs):
+        order = np.random.permutation(len(X))
+        losses = [train_fn(X[order[i:i + batch_size]],
+                           y[order[i:i + batch_size]])
+                  for i in range(0, len(X), batch_size)]
+        print("epoch %d: training loss %.4f" % (epoch + 1, np.mean(losses)))
+
+
+def evaluate(network, X, batch_size, repeats):
+    network(X[:batch_size])  # allocate the buffers
+    start = time.time()
+    for _ in range(repeats):
+        for i in range(0, len(X), batch_size):
+            network.run(X[i:i + batch_size])
+    elapsed = (time.time() - start) / repeats
+    outputs = np.concatenate([network(X[i:i + batch_size])
+                              for i in range(0, len(X), batch_size)])
+    return outputs, elapsed
+
+
+def weight_bytes(network):
+    return sum(op.W.nbytes for op, _ in network.program if hasattr(op, 'W'))
+
+
+def main(model='mlp', epochs=5, num_train=10000, num_test=2000,
+         batch_size=128, repeats=3, num_calibration=512):
+    rng = np.random.RandomState(42)
+    X, y = make_data(model, num_train + num_test, 10, rng)
+    X_train, y_train = X[:num_train], y[:num_train]
+    X_test, y_test = X[num_train:], y[num_train:]
+
+    network = build_model(model, 10)
+    train(network, X_train, y_train, epochs)
+
+    calibration = [X_train[i:i + batch_size]
+                   for i in range(0, num_calibration, batch_size)]
+    exports = [
+        ('float', export(network)),
+        ('int8 weights', export(network, quantize=True)),
+        ('int8 calibrated', export(network, quantize=True,
+                                   calibration=calibration)),
+    ]
+
+    reference = None
+    print("%-16s %9s %9s %9s %11s %11s %10s" % (
+        "export", "accuracy", "delta", "agree", "max |dp|", "weights",
+        "ms/batch"))
+    for name, exported in exports:
+        probs, elapsed = evaluate(exported, X_test, batch_size, repeats)
+        accuracy = np.mean(probs.argmax(axis=1) == y_test)
+        if reference is None:
+            reference = probs, accuracy
+        agree = np.mean(probs.argmax(axis=1) == reference[0].argmax(axis=1))
+        print("%-16s %9.4f %+9.4f %9.4f %11.2e %9.1fkB %10.2f" % (
+            name, accuracy, accuracy - reference[1], agree,
+            np.abs(probs - reference[0]).max(), weight_bytes(exported) / 1e3,
+            1e3 * elapsed / -(-len(X_test) // batch_size)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--model', choices=['mlp', 'cnn'], default='mlp')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    main(model=args.model, epochs=args.epochs, batch_size=args.batch_size,
+         repeats=args.repeats)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks a :class:`SparseDenseLayer` against a :class:`DenseLayer` holding
+the same magnitude-pruned weights, to find the density below which the
+sparse product is faster.
+
+For each density, the weights of a dense layer are pruned with
+:func:`lasagne.compression.prune_by_magnitude`, copied into a sparse layer,
+and both layers are timed on the same inputs, for the forward pass alone and
+for the forward and backward pass of a training step.
+
+Usage: python benchmarks/sparse_dense.py [--num-inputs N] [--num-units N]
+                                         [--batch-size N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+import lasagne
+from lasagne.compression import prune_by_magnitude
+
+
+DENSITIES = [1., .5, .3, .2, .1, .05, .02, .01]
+
+
+def compile_functions(layer, x):
+    output = layer.get_output_for(x)
+    forward = theano.function([x], output)
+    grad = theano.grad(output.sum(), layer.W)
+    if hasattr(grad, 'toarray'):
+        # only compute the stored entries of the sparse gradient
+        grad = theano.sparse.csm_data(grad)
+    backward = theano.function([x], [output, grad])
+    return forward, backward
+
+
+def timeit(fn, X, repeats):
+    fn(X)  # warm up
+    start = time.time()
+    for _ in range(repeats):
+        fn(X)
+    return (time.time() - start) / repeats
+
+
+def main(num_inputs=4096, num_units=4096, batch_size=64, repeats=10,
+         densities=DENSITIES):
+    rng = np.random.RandomState(42)
+    X = rng.randn(batch_size, num_inputs).astype(theano.config.floatX)
+    x = T.matrix('x')
+    shape = (None, num_inputs)
+
+    print("%8s %12s %12s %8s %12s %12s %8s" % (
+        "density", "dense fwd", "sparse fwd", "speedup",
+        "dense f+b", "sparse f+b", "speedup"))
+    crossover = None
+    for density in densities:
+        dense = lasagne.layers.DenseLayer(shape, num_units, nonlinearity=None)
+        prune_by_magnitude(dense, 1 - density)
+        sparse = lasagne.layers.SparseDenseLayer(
+                shape, num_units, W=dense.W.get_value(), nonlinearity=None)
+        times = []
+        for layer in (dense, sparse):
+            forward, backward = compile_functions(layer, x)
+            times.append((timeit(forward, X, repeats),
+                          timeit(backward, X, repeats)))
+        (dense_fwd, dense_bwd), (sparse_fwd, sparse_bwd) = times
+        print("%8.2f %10.2fms %10.2fms %7.2fx %10.2fms %10.2fms %7.2fx" % (
+            density, 1e3 * dense_fwd, 1e3 * sparse_fwd, dense_fwd / sparse_fwd,
+            1e3 * dense_bwd, 1e3 * sparse_bwd, dense_bwd / sparse_bwd))
+        if crossover is None and sparse_fwd < dense_fwd:
+            crossover = density
+    if crossover is None:
+        print("The sparse forward pass was never faster.")
+    else:
+        print("The sparse forward pass is faster from a density of %.2f."
+              % crossover)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--num-inputs', type=int, default=4096)
+    parser.add_argument('--num-units', type=int, default=4096)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+    main(num_inputs=args.num_inputs, num_units=args.num_units,
+         batch_size=args.batch_size, repeats=args.repeats)
@@ -274,17 +274,20 @@ def main(model='mlp', num_epochs=500):
     test_prediction = lasagne.layers.get_output(network, deterministic=True)
     test_loss = lasagne.objectives.categorical_crossentropy(test_prediction,
                                                             target_var)
-    test_loss = test_loss.mean()
-    # As a bonus, also create an expression for the classification accuracy:
-    test_acc = T.mean(T.eq(T.argmax(test_prediction, axis=1), target_var),
-                      dtype=theano.config.floatX)
+    # We accumulate the mean loss and the classification accuracy over all
+    # validation batches inside the compiled function, so only the final
+    # results need to be fetched:
+    val_loss = lasagne.metrics.Mean()
+    val_acc = lasagne.metrics.CategoricalAccuracy()
+    val_updates = val_loss.get_updates(test_loss)
+    val_updates.update(val_acc.get_updates(test_prediction, target_var))
 
     # Compile a function performing a training step on a mini-batch (by giving
     # the updates dictionary) and returning the corresponding training loss:
     train_fn = theano.function([input_var, target_var], loss, updates=updates)
 
-    # Compile a second function computing the validation loss and accuracy:
-    val_fn = theano.function([input_var, target_var], [test_loss, test_acc])
+    # Compile a second function adding a batch to the validation metrics:
+    val_fn = theano.function([input_var, target_var], [], updates=val_updates)
 
     # Finally, launch the training loop.
     print("Starting training...")
@@ -294,44 +297,37 @@ def main(model='mlp', num_epochs=500):
         train_err = 0
         train_batches = 0
         start_time = time.time()
-        for batch in iterate_minibatches(X_train, y_train, 500, shuffle=True):
+        # (prefetch() prepares the next minibatches in a background thread)
+        for batch in lasagne.data.prefetch(
+                iterate_minibatches(X_train, y_train, 500, shuffle=True)):
             inputs, targets = batch
             train_err += train_fn(inputs, targets)
             train_batches += 1
 
         # And a full pass over the validation data:
-        val_err = 0
-        val_acc = 0
-        val_batches = 0
+        val_loss.reset()
+        val_acc.reset()
         for batch in iterate_minibatches(X_val, y_val, 500, shuffle=False):
             inputs, targets = batch
-            err, acc = val_fn(inputs, targets)
-            val_err += err
-            val_acc += acc
-            val_batches += 1
+            val_fn(inputs, targets)
 
         # Then we print the results for this epoch:
         print("Epoch {} of {} took {:.3f}s".format(
             epoch + 1, num_epochs, time.time() - start_time))
         print("  training loss:\t\t{:.6f}".format(train_err / train_batches))
-        print("  validation loss:\t\t{:.6f}".format(val_err / val_batches))
+        print("  validation loss:\t\t{:.6f}".format(val_loss.get_value()))
         print("  validation accuracy:\t\t{:.2f} %".format(
-            val_acc / val_batches * 100))
+            val_acc.get_value() * 100))
 
     # After training, we compute and print the test error:
-    test_err = 0
-    test_acc = 0
-    test_batches = 0
+    val_loss.reset()
+    val_acc.reset()
     for batch in iterate_minibatches(X_test, y_test, 500, shuffle=False):
         inputs, targets = batch
-        err, acc = val_fn(inputs, targets)
-        test_err += err
-        test_acc += acc
-        test_batches += 1
+        val_fn(inputs, targets)
     print("Final results:")
-    print("  test loss:\t\t\t{:.6f}".format(test_err / test_batches))
-    print("  test accuracy:\t\t{:.2f} %".format(
-        test_acc / test_batches * 100))
+    print("  test loss:\t\t\t{:.6f}".format(val_loss.get_value()))
+    print("  test accuracy:\t\t{:.2f} %".format(val_acc.get_value() * 100))
 
     # Optionally, you could now dump the network weights to a file like this:
     # np.savez('model.npz', *lasagne.layers.get_all_param_values(network))
@@ -24,9 +24,16 @@ else:
 from . import nonlinearities
 from . import init
 from . import layers
+from . import autotune
+from . import compression
+from . import data
+from . import decoding
+from . import inference
+from . import metrics
 from . import objectives
 from . import random
 from . import regularization
+from . import training
 from . import updates
 from . import utils
 
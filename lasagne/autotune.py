@@ -0,0 +1,264 @@
+"""
+Functions to select the fastest convolution implementation for each layer.
+
+:class:`Conv1DLayer` and :class:`Conv2DLayer` accept a ``convolution``
+callable, and which of the available implementations is fastest depends on
+the shapes involved and on the hardware. :func:`autotune` benchmarks the
+registered implementations for each convolution layer of a network and
+selects the fastest one, remembering the choice in a cache file:
+
+.. autosummary::
+    :nosignatures:
+
+    autotune
+    register_convolution
+
+Examples
+--------
+>>> from lasagne.layers import InputLayer, Conv1DLayer
+>>> from lasagne.autotune import autotune
+>>> l_in = InputLayer((None, 3, 100))
+>>> l_conv = Conv1DLayer(l_in, num_filters=16, filter_size=5)
+>>> choices = autotune(l_conv, batch_size=32)  # doctest: +SKIP
+>>> choices[l_conv]  # doctest: +SKIP
+'conv1d_mc1'
+"""
+from collections import OrderedDict
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+from .layers import Conv1DLayer, Conv2DLayer, get_all_layers
+from .theano_extensions import conv
+
+
+__all__ = [
+    "autotune",
+    "register_convolution",
+]
+
+
+_convolutions = OrderedDict([
+    (Conv1DLayer, OrderedDict([
+        ('conv1d_sc', conv.conv1d_sc),
+        ('conv1d_mc0', conv.conv1d_mc0),
+        ('conv1d_mc1', conv.conv1d_mc1),
+        ('conv1d_unstrided', conv.conv1d_unstrided),
+        ('conv1d_sd', conv.conv1d_sd),
+        ('conv1d_md', conv.conv1d_md),
+        ('conv1d_fft', conv.conv1d_fft),
+    ])),
+    (Conv2DLayer, OrderedDict([
+        ('conv2d', T.nnet.conv2d),
+        ('conv2d_convop', conv.conv2d_convop),
+        ('conv2d_fft', conv.conv2d_fft),
+        ('conv2d_winograd', conv.conv2d_winograd),
+    ])),
+])
+
+
+def register_convolution(layer_class, name, convolution):
+    """
+    Registers a convolution implementation as a candidate for a layer class.
+
+    Parameters
+    ----------
+    layer_class : class
+        The layer class, a subclass of :class:`BaseConvLayer` with a
+        ``convolution`` attribute, such as :class:`Conv2DLayer`.
+    name : string
+        The name of the implementation, used as its key in the cache.
+    convolution : callable
+        The implementation, with the same signature as
+        :func:`theano.tensor.nnet.conv2d`. It may raise an exception for
+        configurations it does not support, which excludes it for these.
+    """
+    _convolutions.setdefault(layer_class, OrderedDict())[name] = convolution
+
+
+def _candidates(layer):
+    for layer_class in type(layer).__mro__:
+        if layer_class in _convolutions:
+            return _convolutions[layer_class]
+    return None
+
+
+def _default_cache_file():
+    return os.environ.get('LASAGNE_AUTOTUNE_CACHE',
+                          os.path.join(os.path.expanduser('~'), '.lasagne',
+                                       'autotune.json'))
+
+
+def _signature(layer, input_shape):
+    return json.dumps([type(layer).__name__, list(input_shape),
+                       list(layer.get_W_shape()), list(layer.stride),
+                       layer.pad if isinstance(layer.pad, str)
+                       else list(layer.pad),
+                       layer.flip_filters, theano.config.floatX,
+                       theano.config.device])
+
+
+def _load_cache(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_cache(filename, cache):
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    # write to a temporary file first, so concurrent readers never see a
+    # partially written cache
+    temporary = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temporary, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    _replace(temporary, filename)
+
+
+def _replace(source, destination):
+    # os.replace overwrites an existing file on all platforms, but is missing
+    # in Python 2, whose os.rename fails on Windows if the target exists
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def _benchmark(layer, convolution, input, num_repeats):
+    original = layer.convolution
+    layer.convolution = convolution
+    try:
+        x = T.TensorType(theano.config.floatX, (False,) * input.ndim)('x')
+        conved = layer.convolve(x)
+        grads = theano.grad(conved.sum(), [x, layer.W])
+        fn = theano.function([x], [conved] + grads)
+    finally:
+        layer.convolution = original
+    output = fn(input)[0]  # the first call may allocate memory
+    times = []
+    for _ in range(num_repeats):
+        start = time.time()
+        fn(input)
+        times.append(time.time() - start)
+    return min(times), output
+
+
+def autotune(layer_or_layers, batch_size=None, cache=True, num_repeats=3,
+             verbose=False):
+    """
+    Selects the fastest convolution implementation for convolution layers.
+
+    For each :class:`Conv1DLayer` and :class:`Conv2DLayer` (or a layer class
+    registered with :func:`register_convolution`) in the network, compiles
+    the forward pass and its gradient with each registered implementation,
+    times them on random data of the layer's input shape, and sets the
+    ``convolution`` attribute of the layer to the fastest one. Candidates
+    failing to compile or to run, or whose result differs from the first
+    working candidate, are skipped.
+
+    The choices are cached in a JSON file, keyed by the layer class, input
+    shape, weight shape, stride, padding, filter flipping, floatX and
+    device, so later calls for the same configurations do not run any
+    benchmarks.
+
+    Parameters
+    ----------
+    layer_or_layers : Layer or list
+        The :class:`Layer` instance for which to gather all layers feeding
+        into it, or a list of :class:`Layer` instances.
+    batch_size : int or None
+        The batch size to benchmark with, for layers whose input shape does
+        not specify it.
+    cache : bool or string
+        The cache file to use. ``True`` selects the file given by the
+        environment variable ``LASAGNE_AUTOTUNE_CACHE``, or
+        ``~/.lasagne/autotune.json`` if that is not set. ``False`` disables
+        the cache.
+    num_repeats : int
+        The number of timed runs per candidate; the fastest run counts.
+    verbose : bool
+        If ``True``, prints the time of each candidate.
+
+    Returns
+    -------
+    OrderedDict
+        A dictionary mapping each tuned layer to the name of the selected
+        implementation.
+
+    Notes
+    -----
+    Since the implementation is set on the layers, this has to be called
+    before compiling functions with the network's output. Expressions
+    obtained from :func:`lasagne.layers.get_output` earlier keep the
+    previous implementation.
+    """
+    if cache is True:
+        cache = _default_cache_file()
+    choices = _load_cache(cache) if cache else {}
+    changed = False
+    result = OrderedDict()
+    for layer in get_all_layers(layer_or_layers):
+        candidates = _candidates(layer)
+        if not candidates:
+            continue
+        input_shape = layer.input_shape
+        if input_shape[0] is None:
+            if batch_size is None:
+                raise ValueError("layer %r has no fixed batch size; specify "
+                                 "the batch_size to benchmark with" % layer)
+            input_shape = (batch_size, ) + tuple(input_shape[1:])
+        if None in input_shape:
+            raise ValueError("cannot benchmark layer %r with input shape %r"
+                             % (layer, layer.input_shape))
+        key = _signature(layer, input_shape)
+        name = choices.get(key)
+        if name not in candidates:
+            name = _select(layer, candidates, input_shape, num_repeats,
+                           verbose)
+            choices[key] = name
+            changed = True
+        layer.convolution = candidates[name]
+        result[layer] = name
+    if cache and changed:
+        _save_cache(cache, choices)
+    return result
+
+
+def _select(layer, candidates, input_shape, num_repeats, verbose):
+    rng = np.random.RandomState(0)
+    input = rng.randn(*input_shape).astype(theano.config.floatX)
+    reference = reference_name = None
+    best, best_time = None, np.inf
+    for name, convolution in candidates.items():
+        try:
+            elapsed, output = _benchmark(layer, convolution, input,
+                                         num_repeats)
+        except Exception as e:
+            if verbose:
+                print("%s: %s failed (%s)" % (layer, name, e))
+            continue
+        if reference is None:
+            reference, reference_name = output, name
+        elif (output.shape != reference.shape or
+              not np.allclose(output, reference, rtol=1e-3, atol=1e-3)):
+            warnings.warn("%s gives results different from %s for layer %r, "
+                          "skipping it" % (name, reference_name, layer))
+            continue
+        if verbose:
+            print("%s: %s took %.3f ms" % (layer, name, elapsed * 1000))
+        if elapsed < best_time:
+            best, best_time = name, elapsed
+    if best is None:
+        raise RuntimeError("no convolution implementation could be run for "
+                           "layer %r" % layer)
+    return best
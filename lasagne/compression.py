@@ -0,0 +1,410 @@
+"""
+Functions to compress the parameters of trained networks.
+
+Magnitude pruning zeroes the weights of smallest magnitude, either at once or
+gradually following a sparsity schedule, interleaved with further training:
+
+.. autosummary::
+    :nosignatures:
+
+    prune_by_magnitude
+    polynomial_sparsity
+    mask_updates
+
+Pruned :class:`DenseLayer` weights can be moved to a
+:class:`SparseDenseLayer` to skip the zeros at inference time.
+
+Low-rank factorization replaces the weight matrix of dense layers by the
+product of two thinner matrices, obtained from its truncated singular value
+decomposition:
+
+.. autosummary::
+    :nosignatures:
+
+    low_rank_factorize
+
+Examples
+--------
+>>> import theano
+>>> import theano.tensor as T
+>>> from lasagne.layers import InputLayer, DenseLayer, get_output
+>>> from lasagne.layers import get_all_params
+>>> from lasagne.updates import sgd
+>>> from lasagne.compression import (prune_by_magnitude,
+...                                  polynomial_sparsity, mask_updates)
+>>> l_in = InputLayer((None, 20))
+>>> l_out = DenseLayer(l_in, num_units=10)
+>>> x = T.matrix('x')
+>>> loss = get_output(l_out, x).mean()
+>>> masks = prune_by_magnitude(l_out, 0)
+>>> updates = sgd(loss, get_all_params(l_out), learning_rate=0.1)
+>>> train_fn = theano.function([x], loss,
+...                            updates=mask_updates(updates, masks))
+>>> for epoch in range(10):
+...     # ... train for an epoch with train_fn ...
+...     sparsity = polynomial_sparsity(epoch, 0.9, begin_step=0, end_step=5)
+...     masks = prune_by_magnitude(l_out, sparsity, masks=masks)
+>>> float((l_out.W.get_value() == 0).mean())
+0.9
+"""
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse
+import theano
+
+from . import utils
+from .layers import DenseLayer, NINLayer
+from .layers import get_all_layers, get_all_params, get_all_param_values
+from .layers import set_all_param_values
+
+
+__all__ = [
+    "prune_by_magnitude",
+    "polynomial_sparsity",
+    "mask_updates",
+    "low_rank_factorize",
+]
+
+
+def prune_by_magnitude(layer_or_layers, sparsity, scope='param', masks=None,
+                       **tags):
+    """
+    Zeroes the parameters of smallest magnitude in a network.
+
+    The parameter values are obtained with
+    :func:`lasagne.layers.get_all_param_values` and written back with
+    :func:`lasagne.layers.set_all_param_values`. Entries that are already
+    zero count as pruned, so calling this function with an increasing
+    `sparsity` prunes a network gradually.
+
+    Parameters
+    ----------
+    layer_or_layers : Layer or list
+        The :class:`Layer` instance for which to prune the parameters, or a
+        list of :class:`Layer` instances.
+
+    sparsity : float
+        The fraction of entries to set to zero, between 0 and 1.
+
+    scope : {'param', 'global'}
+        Whether to prune each parameter to the given sparsity, or to prune
+        the entries of smallest magnitude among all parameters, leaving
+        parameters of larger magnitude denser.
+
+    masks : dict or None
+        The masks returned by a previous call, to be updated in place instead
+        of creating new ones. Pass them to keep functions compiled with
+        :func:`mask_updates` in sync with the pruning.
+
+    **tags (optional)
+        Tags selecting the parameters to prune, as for
+        :func:`lasagne.layers.get_all_params`. Defaults to the
+        ``regularizable`` parameters, i.e., the weights but not the biases.
+
+    Returns
+    -------
+    OrderedDict
+        A dictionary mapping each pruned dense parameter to a shared variable
+        of ones and zeros marking its remaining entries. Parameters stored as
+        sparse matrices (see :class:`SparseDenseLayer`) are pruned but have
+        no mask, since their zeros are not stored.
+
+    Raises
+    ------
+    ValueError
+        If `sparsity` is not between 0 and 1 or `scope` is unknown.
+    """
+    if not 0 <= sparsity <= 1:
+        raise ValueError("sparsity must be between 0 and 1, got %r"
+                         % (sparsity, ))
+    if scope not in ('param', 'global'):
+        raise ValueError("scope must be 'param' or 'global', got %r"
+                         % (scope, ))
+    if not tags:
+        tags = dict(regularizable=True)
+    params = get_all_params(layer_or_layers, **tags)
+    values = get_all_param_values(layer_or_layers, **tags)
+
+    # the stored entries of each value; implicit zeros of sparse matrices
+    # have a magnitude of zero and are always pruned first
+    entries = [v.data if scipy.sparse.issparse(v) else v.ravel()
+               for v in values]
+    sizes = [int(np.prod(v.shape)) for v in values]
+    if scope == 'param':
+        keeps = [_keep_largest(e, s, sparsity)
+                 for e, s in zip(entries, sizes)]
+    else:
+        keep = _keep_largest(np.concatenate(entries), sum(sizes), sparsity)
+        keeps = np.split(keep, np.cumsum([len(e) for e in entries])[:-1])
+
+    new_values = []
+    masks = OrderedDict() if masks is None else masks
+    for param, value, keep in zip(params, values, keeps):
+        if scipy.sparse.issparse(value):
+            value = value.copy()
+            value.data *= keep
+            value.eliminate_zeros()
+        else:
+            keep = keep.reshape(value.shape).astype(value.dtype)
+            value = value * keep
+            if param in masks:
+                masks[param].set_value(keep)
+            else:
+                masks[param] = theano.shared(
+                        keep, broadcastable=param.broadcastable,
+                        name=None if param.name is None
+                        else param.name + '_mask')
+        new_values.append(value)
+    set_all_param_values(layer_or_layers, new_values, **tags)
+    return masks
+
+
+def _keep_largest(entries, size, sparsity):
+    # boolean mask of the stored entries to keep, such that `sparsity` of
+    # `size` entries (including the unstored ones) are zero
+    num_pruned = int(round(sparsity * size)) - (size - len(entries))
+    keep = np.ones(len(entries), dtype=bool)
+    if num_pruned >= len(entries):
+        keep[:] = False
+    elif num_pruned > 0:
+        keep[np.argpartition(np.abs(entries), num_pruned - 1)
+             [:num_pruned]] = False
+    return keep
+
+
+def polynomial_sparsity(step, final_sparsity, begin_step, end_step,
+                        initial_sparsity=0., power=3):
+    """
+    Gradual pruning schedule of Zhu and Gupta [1]_.
+
+    The sparsity rises from `initial_sparsity` at `begin_step` to
+    `final_sparsity` at `end_step`, following a polynomial that prunes
+    quickly at first and slows down as fewer weights remain:
+
+    .. math:: s_t = s_f + (s_i - s_f) \\left(1 - \\frac{t - t_0}{t_1 - t_0}
+              \\right)^p
+
+    Parameters
+    ----------
+    step : int
+        The current training step or epoch.
+
+    final_sparsity : float
+        The sparsity to reach at `end_step` and keep afterwards.
+
+    begin_step : int
+        The step to start pruning at; the sparsity is `initial_sparsity`
+        before.
+
+    end_step : int
+        The step at which `final_sparsity` is reached.
+
+    initial_sparsity : float
+        The sparsity at `begin_step`.
+
+    power : float
+        The exponent of the polynomial.
+
+    Returns
+    -------
+    float
+        The sparsity for the given step, to be passed to
+        :func:`prune_by_magnitude`.
+
+    References
+    ----------
+    .. [1] Zhu, M., & Gupta, S. (2017):
+           To prune, or not to prune: exploring the efficacy of pruning for
+           model compression. arXiv preprint arXiv:1710.01878.
+    """
+    if end_step <= begin_step:
+        raise ValueError("end_step must be larger than begin_step")
+    progress = min(max(step - begin_step, 0), end_step - begin_step)
+    progress /= float(end_step - begin_step)
+    return (final_sparsity +
+            (initial_sparsity - final_sparsity) * (1 - progress) ** power)
+
+
+def mask_updates(updates, masks):
+    """
+    Keeps pruned parameters at zero during training.
+
+    Multiplies the update of each masked parameter with its mask, so entries
+    pruned by :func:`prune_by_magnitude` stay zero. As the masks are shared
+    variables, pruning further with ``masks=masks`` takes effect without
+    recompiling the training function.
+
+    Parameters
+    ----------
+    updates : OrderedDict
+        A dictionary mapping parameters to update expressions, as returned
+        by the functions of :mod:`lasagne.updates`.
+
+    masks : dict
+        The masks returned by :func:`prune_by_magnitude`.
+
+    Returns
+    -------
+    OrderedDict
+        A copy of `updates` with the updates of masked parameters masked.
+    """
+    updates = OrderedDict(updates)
+    for param, mask in masks.items():
+        if param in updates:
+            updates[param] = updates[param] * mask
+    return updates
+
+
+def low_rank_factorize(layer_or_layers, layers=None, rank=None, energy=None,
+                       flop_budget=None):
+    """
+    Replaces dense layers of a trained network by two thinner layers.
+
+    Each selected :class:`DenseLayer` or :class:`NINLayer` with weights ``W``
+    of shape ``(num_inputs, num_units)`` is replaced by two chained layers of
+    the same type: the first projects to `rank` units and has no biases and
+    no nonlinearity, the second has the original number of units, biases and
+    nonlinearity. Their weights are initialized from the truncated singular
+    value decomposition ``W ~ U[:, :r] S[:r] V[:r]``, splitting ``S``
+    evenly between both. This reduces the cost of the layer from
+    ``num_inputs * num_units`` to ``rank * (num_inputs + num_units)``
+    multiply-adds per example (or location).
+
+    The layers consuming the output of a replaced layer are rewired to the
+    new layers in place.
+
+    Parameters
+    ----------
+    layer_or_layers : Layer or list
+        The output layer or layers of the network.
+
+    layers : list or None
+        The layers to factorize. If ``None``, all layers of the network that
+        are exactly of type :class:`DenseLayer` or :class:`NINLayer` are
+        factorized.
+
+    rank : int, dict or None
+        The rank of the factorization.
+
+    energy : float, dict or None
+        Choose the smallest rank preserving this fraction of the squared
+        Frobenius norm of ``W``, i.e., of the sum of squared singular values.
+
+    flop_budget : float, dict or None
+        Choose the largest rank whose cost is at most this fraction of the
+        cost of the original layer.
+
+    Returns
+    -------
+    OrderedDict
+        A dictionary mapping each replaced layer to the new layer taking its
+        place, i.e., the second of the two new layers. Use it to retrieve the
+        new output layer if an output layer was replaced.
+
+    Raises
+    ------
+    ValueError
+        If no rank criterion is given for a layer.
+
+    Notes
+    -----
+    Each of `rank`, `energy` and `flop_budget` can be given as a dictionary
+    mapping layers to values, to choose the rank of each layer separately.
+    If several criteria are given for a layer, the smallest resulting rank
+    is used. Layers for which the chosen rank would not reduce the cost are
+    left unchanged.
+
+    The factorized network usually needs some fine-tuning to recover the
+    accuracy of the original one.
+
+    Examples
+    --------
+    >>> from lasagne.layers import InputLayer, DenseLayer, get_all_layers
+    >>> from lasagne.compression import low_rank_factorize
+    >>> l_in = InputLayer((None, 100))
+    >>> l_hid = DenseLayer(l_in, num_units=200)
+    >>> l_out = DenseLayer(l_hid, num_units=10)
+    >>> replaced = low_rank_factorize(l_out, layers=[l_hid], rank=20)
+    >>> [l.output_shape for l in get_all_layers(l_out)]
+    [(None, 100), (None, 20), (None, 200), (None, 10)]
+    """
+    all_layers = get_all_layers(layer_or_layers)
+    if layers is None:
+        layers = [l for l in all_layers if type(l) in (DenseLayer, NINLayer)]
+    else:
+        # replace in topological order, so each new layer can be built on
+        # the replacement of its incoming layer
+        order = dict((l, i) for i, l in enumerate(all_layers))
+        layers = sorted(layers, key=lambda l: order.get(l, len(order)))
+    replaced = OrderedDict()
+    for layer in layers:
+        if not isinstance(layer, (DenseLayer, NINLayer)):
+            raise TypeError("Can only factorize DenseLayer and NINLayer "
+                            "instances, got %s" % type(layer).__name__)
+        W = layer.W
+        W = W.get_value() if hasattr(W, 'get_value') else W.eval()
+        U, S, V = np.linalg.svd(W, full_matrices=False)
+        r = _select_rank(S, W.shape, _for_layer(rank, layer),
+                         _for_layer(energy, layer),
+                         _for_layer(flop_budget, layer))
+        if r is None:
+            raise ValueError("no rank, energy or flop_budget given for %r"
+                             % (layer.name or layer, ))
+        if r * sum(W.shape) >= W.size:
+            continue
+        S = np.sqrt(S[:r])
+        W1 = utils.floatX(U[:, :r] * S)
+        W2 = utils.floatX(S[:, np.newaxis] * V[:r])
+        incoming = layer.input_layers[0]
+        if incoming is None:
+            incoming = layer.input_shape
+        else:
+            incoming = replaced.get(incoming, incoming)
+        name = layer.name
+        factor_name = None if name is None else name + '_factor'
+        if isinstance(layer, DenseLayer):
+            l_factor = DenseLayer(incoming, r, W=W1, b=None,
+                                  nonlinearity=None,
+                                  num_leading_axes=layer.num_leading_axes,
+                                  name=factor_name)
+            l_new = DenseLayer(l_factor, layer.num_units, W=W2, b=layer.b,
+                               nonlinearity=layer.nonlinearity,
+                               num_leading_axes=-1, name=name)
+        else:
+            l_factor = NINLayer(incoming, r, W=W1, b=None,
+                                nonlinearity=None, name=factor_name)
+            l_new = NINLayer(l_factor, layer.num_units,
+                             untie_biases=layer.untie_biases, W=W2,
+                             b=layer.b, nonlinearity=layer.nonlinearity,
+                             name=name)
+        replaced[layer] = l_new
+
+    # rewire the consumers of replaced layers
+    for l in all_layers:
+        if l not in replaced and any(i in replaced for i in l.input_layers):
+            l.input_layers = tuple(replaced.get(i, i)
+                                   for i in l.input_layers)
+    return replaced
+
+
+def _for_layer(value, layer):
+    if isinstance(value, dict):
+        return value.get(layer)
+    return value
+
+
+def _select_rank(singular_values, shape, rank, energy, flop_budget):
+    # smallest rank satisfying all given criteria, or None if none is given
+    ranks = []
+    if rank is not None:
+        ranks.append(int(rank))
+    if energy is not None:
+        cumulative = np.cumsum(singular_values ** 2)
+        ranks.append(int(np.searchsorted(cumulative,
+                                         energy * cumulative[-1])) + 1)
+    if flop_budget is not None:
+        ranks.append(int(flop_budget * np.prod(shape) // sum(shape)))
+    if not ranks:
+        return None
+    return max(1, min(min(ranks), len(singular_values)))
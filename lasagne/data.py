@@ -0,0 +1,597 @@
+"""
+Tools to feed data to compiled training and evaluation functions.
+
+Passing numpy minibatches to a compiled function copies each of them to the
+device on every call. A :class:`SharedDataset` instead keeps a whole dataset
+in shared variables and compiles functions that only take the index of a
+minibatch, slicing it from the shared variables through ``givens``:
+
+.. autosummary::
+    :nosignatures:
+
+    SharedDataset
+
+When minibatches have to be prepared on the host, such as decoded from files
+or augmented, two functions prepare them in the background while the
+training thread runs the compiled function:
+
+.. autosummary::
+    :nosignatures:
+
+    prefetch
+    parallel_map
+
+Datasets too large for the memory can be read from memory-mapped arrays in
+large sequential chunks, shuffled within a buffer of several chunks:
+
+.. autosummary::
+    :nosignatures:
+
+    ChunkedReader
+
+Examples
+--------
+>>> import numpy as np
+>>> import theano
+>>> import theano.tensor as T
+>>> import lasagne
+>>> from lasagne.data import SharedDataset
+>>> l_in = lasagne.layers.InputLayer((None, 1, 8, 8))
+>>> l_out = lasagne.layers.DenseLayer(
+...     l_in, num_units=10, nonlinearity=lasagne.nonlinearities.softmax)
+>>> targets = T.ivector('targets')
+>>> loss = lasagne.objectives.categorical_crossentropy(
+...     lasagne.layers.get_output(l_out), targets).mean()
+>>> params = lasagne.layers.get_all_params(l_out, trainable=True)
+>>> updates = lasagne.updates.sgd(loss, params, learning_rate=0.1)
+
+Images can be stored as bytes, taking a quarter of the memory of floats,
+and scaled to floats in the compiled function. Targets stored with a
+different integer type are cast to that of the target variable:
+
+>>> images = np.random.randint(256, size=(100, 1, 8, 8)).astype(np.uint8)
+>>> labels = np.random.randint(10, size=100).astype(np.uint8)
+>>> train_data = SharedDataset([images, labels], batch_size=32,
+...                            scale=[1 / 255., None])
+>>> train_fn = train_data.function([l_in.input_var, targets], loss,
+...                                updates=updates, shuffled=True)
+>>> train_data.num_batches
+4
+>>> train_data.shuffle()
+>>> losses = [train_fn(index) for index in range(train_data.num_batches)]
+
+Any iterator over minibatches can be run in a background thread, keeping the
+next minibatches ready:
+
+>>> from lasagne.data import prefetch
+>>> def iterate_minibatches(X, y, batch_size):
+...     for start in range(0, len(X), batch_size):
+...         yield X[start:start + batch_size], y[start:start + batch_size]
+>>> X = np.random.randn(100, 1, 8, 8).astype(theano.config.floatX)
+>>> y = np.random.randint(10, size=100).astype(np.int32)
+>>> for inputs, targets in prefetch(iterate_minibatches(X, y, 32)):
+...     pass
+"""
+from collections import OrderedDict, deque
+import itertools
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import threading
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+from .random import get_rng
+from .utils import as_tuple
+
+
+__all__ = [
+    "SharedDataset",
+    "prefetch",
+    "parallel_map",
+    "ChunkedReader",
+]
+
+
+class SharedDataset(object):
+    """
+    A dataset held in shared variables, sliced into minibatches inside
+    compiled functions.
+
+    Parameters
+    ----------
+    arrays : list of numpy arrays
+        The arrays of the dataset, such as the inputs and the targets, all
+        with the same number of examples in their first dimension.
+    batch_size : int
+        The number of examples per minibatch. The last minibatch holds the
+        remaining examples if their number is not a multiple of it.
+    scale : scalar, list of scalars or ``None``
+        If given for an array, the array is converted to
+        ``theano.config.floatX`` and multiplied by the scale in the compiled
+        function. This allows to store images as ``uint8``, for example.
+    name : string or None
+        An optional name, used as a prefix for the names of the shared
+        variables.
+
+    Attributes
+    ----------
+    variables : list of Theano shared variables
+        The shared variables holding the arrays.
+    order : Theano shared variable
+        The order of the examples used by shuffled functions, see
+        :meth:`shuffle`.
+    index : Theano scalar variable
+        The minibatch index taken by the compiled functions.
+    """
+    def __init__(self, arrays, batch_size, scale=None, name=None):
+        arrays = [np.asarray(array) for array in arrays]
+        self.batch_size = batch_size
+        self.scales = as_tuple(scale, len(arrays))
+        prefix = "" if name is None else name + "."
+        self.variables = [theano.shared(array, name="%sdata%d" % (prefix, i))
+                          for i, array in enumerate(arrays)]
+        self.order = theano.shared(np.arange(0, dtype='int64'),
+                                   name=prefix + "order")
+        self.index = T.lscalar(prefix + "batch_index")
+        self.set_arrays(arrays)
+
+    def __len__(self):
+        return self._num_examples
+
+    @property
+    def num_batches(self):
+        """The number of minibatches, including a final partial one."""
+        return -(-len(self) // self.batch_size)
+
+    def set_arrays(self, arrays):
+        """
+        Replaces the arrays of the dataset.
+
+        The new arrays must have the same data types as the old ones, but
+        may hold a different number of examples. Functions compiled before
+        use the new arrays, so they can be used to iterate over a dataset
+        too large for the device, one part at a time. Resets the order of
+        the examples.
+
+        Parameters
+        ----------
+        arrays : list of numpy arrays
+            The new arrays, in the order given to the constructor.
+        """
+        arrays = [np.asarray(array) for array in arrays]
+        if len(arrays) != len(self.variables):
+            raise ValueError("expected %d arrays, got %d"
+                             % (len(self.variables), len(arrays)))
+        lengths = set(len(array) for array in arrays)
+        if len(lengths) != 1:
+            raise ValueError("all arrays must have the same length, got %r"
+                             % [len(array) for array in arrays])
+        for var, array in zip(self.variables, arrays):
+            var.set_value(array, borrow=True)
+        self._num_examples = lengths.pop()
+        self.order.set_value(np.arange(self._num_examples, dtype='int64'))
+
+    def shuffle(self, rng=None):
+        """
+        Draws a new random order of the examples for shuffled functions.
+
+        Only the permutation is transferred to the device, not the data.
+
+        Parameters
+        ----------
+        rng : :class:`numpy.random.RandomState` or None
+            The random number generator to use. Defaults to the one returned
+            by :func:`lasagne.random.get_rng`.
+        """
+        if rng is None:
+            rng = get_rng()
+        self.order.set_value(rng.permutation(len(self)).astype('int64'))
+
+    def batch(self, index, shuffled=False):
+        """
+        Returns expressions for a minibatch of each array.
+
+        Parameters
+        ----------
+        index : Theano integer scalar
+            The index of the minibatch.
+        shuffled : bool
+            If ``True``, takes the examples in the order drawn by
+            :meth:`shuffle`. Otherwise, takes consecutive examples.
+
+        Returns
+        -------
+        list of Theano expressions
+            The minibatches of all arrays, converted and scaled as given to
+            the constructor.
+        """
+        rows = slice(index * self.batch_size, (index + 1) * self.batch_size)
+        if shuffled:
+            rows = self.order[rows]
+        batches = []
+        for var, scale in zip(self.variables, self.scales):
+            batch = var[rows]
+            if scale is not None:
+                batch = (T.cast(batch, theano.config.floatX) *
+                         np.asarray(scale, theano.config.floatX))
+            batches.append(batch)
+        return batches
+
+    def function(self, inputs, outputs=None, updates=None, shuffled=False,
+                 **kwargs):
+        """
+        Compiles a function taking only the index of a minibatch.
+
+        Parameters
+        ----------
+        inputs : list of Theano variables
+            The variables to substitute with minibatches of the arrays, in
+            the order given to the constructor. Minibatches are cast to the
+            data types of these variables if needed.
+        outputs : Theano expression or list of Theano expressions
+            The outputs of the compiled function, see
+            :func:`theano.function`.
+        updates : dict or None
+            The updates of the compiled function, such as returned by the
+            functions of :mod:`lasagne.updates`.
+        shuffled : bool
+            If ``True``, minibatches are taken in the order drawn by
+            :meth:`shuffle`, such as for training. Otherwise, they are taken
+            in the order of the arrays, such as for evaluation.
+        **kwargs
+            Any additional keyword arguments are passed on to
+            :func:`theano.function`.
+
+        Returns
+        -------
+        callable
+            The compiled function, taking the index of a minibatch.
+        """
+        inputs = list(inputs)
+        if len(inputs) != len(self.variables):
+            raise ValueError("expected %d input variables, got %d"
+                             % (len(self.variables), len(inputs)))
+        # only substitute the variables used, which theano.function requires
+        expressions = list(updates.values()) if updates else []
+        if outputs is not None:
+            expressions += (list(outputs) if isinstance(outputs, (list, tuple))
+                            else [outputs])
+        used = set(theano.gof.graph.inputs(expressions))
+        givens = OrderedDict()
+        for var, batch in zip(inputs, self.batch(self.index, shuffled)):
+            if var not in used:
+                continue
+            if batch.dtype != var.dtype:
+                batch = T.cast(batch, var.dtype)
+            givens[var] = T.patternbroadcast(batch, var.broadcastable)
+        return theano.function([self.index], outputs, updates=updates,
+                               givens=givens, **kwargs)
+
+
+class _Buffers(object):
+    """
+    A ring of preallocated arrays that minibatches are copied into, so no
+    memory is allocated per minibatch once the ring is filled.
+    """
+    def __init__(self, size):
+        self.slots = [None] * size
+        self.position = 0
+
+    def fill(self, item):
+        arrays = item if isinstance(item, (tuple, list)) else (item, )
+        slot = self.slots[self.position]
+        if slot is None or len(slot) != len(arrays):
+            slot = self.slots[self.position] = [None] * len(arrays)
+        result = []
+        for i, array in enumerate(arrays):
+            if not isinstance(array, np.ndarray):
+                result.append(array)
+                continue
+            buf = slot[i]
+            if (buf is None or buf.shape != array.shape or
+                    buf.dtype != array.dtype):
+                buf = slot[i] = np.empty_like(array)
+            np.copyto(buf, array)
+            result.append(buf)
+        self.position = (self.position + 1) % len(self.slots)
+        if isinstance(item, (tuple, list)):
+            return type(item)(result)
+        return result[0]
+
+
+class _Failure(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_END = object()
+
+
+def prefetch(iterable, num_prefetch=2, reuse_buffers=False):
+    """
+    Iterates over an iterable in a background thread.
+
+    The items are produced by a separate thread while the caller processes
+    the previous ones, and passed through a queue of bounded size. They are
+    yielded in their original order. Exceptions raised by the iterable are
+    raised in the caller.
+
+    Parameters
+    ----------
+    iterable : iterable
+        The iterable to prefetch, such as a generator of minibatches. The
+        work it does must release the GIL to run concurrently with the
+        caller, as numpy and file reads mostly do.
+    num_prefetch : int
+        The maximum number of items produced ahead of the caller.
+    reuse_buffers : bool
+        If ``True``, the numpy arrays of each item (an array, or a tuple or
+        list containing arrays) are copied into a ring of
+        ``2 * num_prefetch + 3`` preallocated arrays by the background
+        thread, so that no memory is allocated per item. The arrays yielded
+        are then overwritten after the caller has advanced
+        ``num_prefetch + 2`` more items, so they must be consumed (e.g.,
+        passed to a compiled function) before that.
+
+    Returns
+    -------
+    generator
+        A generator yielding the items of `iterable`.
+
+    Notes
+    -----
+    Closing the generator before the end (e.g., by breaking out of a loop
+    over it) stops the background thread after its current item, and closes
+    `iterable` if it is a generator.
+    """
+    items = queue.Queue(maxsize=num_prefetch)
+    # while the caller holds an item and receives the next num_prefetch + 1
+    # ones, up to num_prefetch + 1 further items are queued or being filled
+    buffers = _Buffers(2 * num_prefetch + 3) if reuse_buffers else None
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if buffers is not None:
+                    item = buffers.fill(item)
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            # includes KeyboardInterrupt and SystemExit, which would
+            # otherwise leave the caller waiting for an item forever
+            put(_Failure(e))
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def consume():
+        thread = threading.Thread(target=produce)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = items.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exception
+                yield item
+        finally:
+            stop.set()
+
+    return consume()
+
+
+def _call(func, item, seed, index):
+    if seed is None:
+        return func(item)
+    return func(item, np.random.RandomState([seed, index]))
+
+
+def parallel_map(func, iterable, num_workers=2, num_prefetch=2,
+                 processes=False, seed=None, reuse_buffers=False):
+    """
+    Applies a function to the items of an iterable in worker threads or
+    processes.
+
+    The results are yielded in the order of the items, so an iteration is
+    reproducible regardless of the number of workers and the time each item
+    takes. At most ``num_workers + num_prefetch`` items are in progress or
+    waiting ahead of the caller at any time.
+
+    Parameters
+    ----------
+    func : callable
+        The function to apply to each item, such as one loading and
+        augmenting a minibatch given the indices of its examples. With
+        ``processes=True``, it must be picklable, i.e., defined at module
+        level.
+    iterable : iterable
+        The items to process, such as the index arrays of all minibatches
+        of an epoch. It is consumed by a background thread.
+    num_workers : int
+        The number of worker threads or processes.
+    num_prefetch : int
+        The maximum number of results computed ahead of the caller.
+    processes : bool
+        If ``True``, uses worker processes instead of threads, for functions
+        that do not release the GIL. Items and results are then pickled.
+    seed : int or None
+        If given, `func` is called with a second argument, a
+        :class:`numpy.random.RandomState` seeded by `seed` and the position
+        of the item. Random augmentations drawn from it are then the same
+        for any number of workers.
+    reuse_buffers : bool
+        If ``True``, the arrays of the results are copied into a ring of
+        preallocated arrays, see :func:`prefetch`.
+
+    Returns
+    -------
+    generator
+        A generator yielding the results of `func` for each item.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from lasagne.data import parallel_map
+    >>> def load(indices, rng):
+    ...     return indices * 2 + rng.randint(2)
+    >>> batches = [np.arange(i, i + 4) for i in range(0, 16, 4)]
+    >>> first = [b.tolist() for b in parallel_map(load, batches, seed=1)]
+    >>> again = parallel_map(load, batches, num_workers=4, seed=1)
+    >>> first == [b.tolist() for b in again]
+    True
+    """
+    def results():
+        pool = (Pool if processes else ThreadPool)(num_workers)
+        pending = deque()
+        try:
+            for index, item in enumerate(iterable):
+                pending.append(pool.apply_async(_call,
+                                                (func, item, seed, index)))
+                if len(pending) >= num_workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+
+    return prefetch(results(), num_prefetch, reuse_buffers)
+
+
+class ChunkedReader(object):
+    """
+    Iterates over minibatches of arrays too large for the memory, such as
+    :class:`numpy.memmap` arrays on disk.
+
+    The examples are divided into chunks of consecutive examples. An epoch
+    reads the chunks in a random order, each with a single sequential read,
+    and fills a shuffle buffer with `buffer_chunks` of them. The examples in
+    the buffer, plus those left over from the previous buffer, are shuffled
+    and yielded as minibatches. Reads go through a background thread that
+    stays up to `readahead` chunks ahead of the minibatches consumed.
+
+    Parameters
+    ----------
+    arrays : list of array-likes, or list of lists of array-likes
+        The arrays of the dataset, such as the inputs and the targets, all
+        with the same number of examples in their first dimension. They only
+        need to support slicing of the first dimension, like
+        :class:`numpy.memmap` arrays, arrays loaded with
+        ``numpy.load(..., mmap_mode='r')`` or HDF5 datasets. A dataset
+        stored in several shards is given as one list of arrays per shard.
+    batch_size : int
+        The number of examples per minibatch. The last minibatch of an epoch
+        holds the remaining examples if their number is not a multiple of
+        it.
+    chunk_size : int
+        The number of consecutive examples per read.
+    buffer_chunks : int
+        The number of chunks shuffled together. Larger buffers mix the
+        examples better and take more memory.
+    shuffle : bool
+        If ``False``, yields the examples in their original order.
+    readahead : int
+        The maximum number of chunks read ahead of the minibatches consumed.
+    rng : :class:`numpy.random.RandomState` or None
+        The random number generator for shuffling. Defaults to the one
+        returned by :func:`lasagne.random.get_rng`.
+
+    Examples
+    --------
+    >>> import os
+    >>> import tempfile
+    >>> import numpy as np
+    >>> from lasagne.data import ChunkedReader
+    >>> path = os.path.join(tempfile.mkdtemp(), 'inputs.npy')
+    >>> np.save(path, np.random.randn(1000, 20).astype(np.float16))
+    >>> inputs = np.load(path, mmap_mode='r')
+    >>> targets = np.random.randint(10, size=1000).astype(np.int32)
+    >>> reader = ChunkedReader([inputs, targets], batch_size=64,
+    ...                        chunk_size=100, buffer_chunks=4)
+    >>> reader.num_batches
+    16
+    >>> for X, y in reader:
+    ...     pass
+    >>> X.shape, X.dtype
+    ((40, 20), dtype('float16'))
+    """
+    def __init__(self, arrays, batch_size, chunk_size=1024, buffer_chunks=16,
+                 shuffle=True, readahead=4, rng=None):
+        arrays = list(arrays)
+        if arrays and not isinstance(arrays[0], (list, tuple)):
+            arrays = [arrays]
+        self.shards = [list(shard) for shard in arrays]
+        for shard in self.shards:
+            lengths = set(len(array) for array in shard)
+            if len(lengths) != 1 or len(shard) != len(self.shards[0]):
+                raise ValueError("each shard must hold one array per input "
+                                 "with the same length, got lengths %r"
+                                 % [len(array) for array in shard])
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.shuffle = shuffle
+        self.readahead = readahead
+        self.rng = rng
+        self.chunks = [(shard, start, min(start + chunk_size, len(arrays[0])))
+                       for shard, arrays in enumerate(self.shards)
+                       for start in range(0, len(arrays[0]), chunk_size)]
+
+    def __len__(self):
+        return sum(len(shard[0]) for shard in self.shards)
+
+    @property
+    def num_batches(self):
+        """The number of minibatches per epoch."""
+        return -(-len(self) // self.batch_size)
+
+    def _read_chunks(self, order):
+        for i in order:
+            shard, start, stop = self.chunks[i]
+            yield [np.array(array[start:stop]) for array in self.shards[shard]]
+
+    def __iter__(self):
+        rng = self.rng if self.rng is not None else get_rng()
+        order = np.arange(len(self.chunks))
+        if self.shuffle:
+            rng.shuffle(order)
+        chunks = prefetch(self._read_chunks(order), self.readahead)
+        leftover = None
+        while True:
+            buffer = list(itertools.islice(chunks, self.buffer_chunks))
+            if not buffer:
+                # the examples left over form a last, smaller minibatch
+                if leftover is not None:
+                    yield tuple(leftover)
+                return
+            if leftover is not None:
+                buffer.insert(0, leftover)
+            pool = [np.concatenate(parts) for parts in zip(*buffer)]
+            if self.shuffle:
+                permutation = rng.permutation(len(pool[0]))
+                pool = [array[permutation] for array in pool]
+            size = len(pool[0])
+            end = size - size % self.batch_size
+            for start in range(0, end, self.batch_size):
+                yield tuple(array[start:start + self.batch_size]
+                            for array in pool)
+            leftover = [array[end:] for array in pool] if end < size else None
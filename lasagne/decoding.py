@@ -0,0 +1,327 @@
+"""
+Functions to generate sequences from trained recurrent networks one step at
+a time.
+
+Running a full-sequence :class:`lasagne.layers.RNNLayer` again for every new
+token costs :math:`O(T^2)` step computations for a sequence of length
+:math:`T`. The :class:`StepDecoder` instead compiles a single step of the
+recurrence once and carries the states of the step layer across calls, so
+that generating a sequence costs :math:`O(T)` steps.
+
+.. autosummary::
+    :nosignatures:
+
+    StepDecoder
+
+Examples
+--------
+Assuming a language model built from an embedding, an LSTM and a softmax
+output layer:
+
+>>> import numpy as np
+>>> from lasagne.layers import *
+>>> from lasagne.nonlinearities import softmax
+>>> vocab, num_units = 20, 8
+>>> l_in = InputLayer((None, None), dtype='int32')
+>>> l_emb = EmbeddingLayer(l_in, vocab, 5)
+>>> l_rec = RNNLayer(l_emb, LSTMStep((None, 5), num_units), in_order="NTD",
+...                  out_order="NTD")
+>>> l_flat = ReshapeLayer(l_rec, (-1, num_units))
+>>> l_out = DenseLayer(l_flat, vocab, nonlinearity=softmax)
+
+The decoder reuses the same layers (and thus the same parameters) for
+generating, replacing the input of the output layer with the step output:
+
+>>> from lasagne.decoding import StepDecoder
+>>> decoder = StepDecoder(l_rec, l_emb, l_out)
+>>> start = np.zeros(3, dtype='int32')
+>>> tokens, scores = decoder.greedy(start, max_length=4)
+>>> tokens.shape
+(3, 4)
+>>> tokens, scores = decoder.beam_search(start, beam_size=2, max_length=4)
+>>> tokens.shape
+(3, 2, 4)
+"""
+
+import numpy as np
+
+import theano
+import theano.tensor as T
+
+from .layers import helper
+from .layers.input import InputLayer
+
+
+__all__ = [
+    "StepDecoder",
+]
+
+
+class StepDecoder(object):
+    """
+    Incremental greedy and beam-search decoder for a recurrent layer.
+
+    A single step of the recurrence is compiled once into a function mapping
+    the previous tokens and states to the log-probabilities of the next token
+    and the new states. The states are kept on the host as numpy arrays in
+    buffers allocated once per call, and beams are reordered with
+    :func:`numpy.take` instead of Python loops.
+
+    Parameters
+    ----------
+    recurrence : :class:`lasagne.layers.RecurrenceLayer` instance
+        The recurrent layer to decode with. Its `in_to_hid`, step and
+        `hid_to_out` layers are used for each step, see
+        :meth:`lasagne.layers.RecurrenceLayer.get_step_outputs_for`.
+
+    embedding : a :class:`Layer` instance
+        The layer turning a vector of token ids into the input of the
+        recurrence at a single step, such as an
+        :class:`lasagne.layers.EmbeddingLayer`. The network below this layer
+        must have a single :class:`lasagne.layers.InputLayer`, which will be
+        fed with the token ids.
+
+    output : a :class:`Layer` instance
+        The layer computing the distribution over the next token from the
+        output of a single step, such as a
+        :class:`lasagne.layers.DenseLayer`. Its first input layer is replaced
+        by the step output of the recurrence.
+
+    output_index : int (default: 0)
+        Which output of the recurrence (after `hid_to_out`) is fed to the
+        `output` layer.
+
+    probabilities : bool (default: True)
+        If ``True``, the `output` layer computes probabilities (e.g. it ends
+        in a softmax), whose logarithm is used for scoring. If ``False``, it
+        computes unnormalized log-probabilities, which are normalized with a
+        log-softmax.
+    """
+    def __init__(self, recurrence, embedding, output, output_index=0,
+                 probabilities=True):
+        self.recurrence = recurrence
+        self.embedding = embedding
+        self.output = output
+        self.output_index = output_index
+        self.probabilities = probabilities
+
+        input_layers = [l for l in helper.get_all_layers(embedding)
+                        if isinstance(l, InputLayer)]
+        if len(input_layers) != 1:
+            raise ValueError("The embedding must depend on a single "
+                             "InputLayer, but got %d." % len(input_layers))
+
+        tokens = T.ivector("tokens")
+        batch_size = T.iscalar("batch_size")
+        inits = recurrence.get_step_inits(batch_size)
+        states = [T.TensorType(i.dtype, (False,) * i.ndim)("state%d" % n)
+                  for n, i in enumerate(inits)]
+
+        x = helper.get_output(embedding, {input_layers[0]: tokens},
+                              deterministic=True)
+        outputs, new_states = recurrence.get_step_outputs_for(
+            (x, ), states, deterministic=True)
+        scores = helper.get_output(
+            output, {output.input_layers[0]: outputs[output_index]},
+            deterministic=True)
+        if probabilities:
+            log_probs = T.log(scores)
+        else:
+            scores = scores - scores.max(axis=-1, keepdims=True)
+            log_probs = scores - T.log(T.exp(scores).sum(axis=-1,
+                                                         keepdims=True))
+
+        self._init_fn = theano.function([batch_size], inits)
+        self._step_fn = theano.function([tokens] + states,
+                                        [log_probs] + list(new_states))
+
+    def init_states(self, batch_size):
+        """
+        Computes the initial states of the recurrence.
+
+        Parameters
+        ----------
+        batch_size : int
+            The number of sequences to decode in parallel.
+
+        Returns
+        -------
+        list of numpy arrays
+            The initial states, each with `batch_size` rows.
+        """
+        return self._init_fn(batch_size)
+
+    def step(self, tokens, states):
+        """
+        Performs a single step of the recurrence.
+
+        Parameters
+        ----------
+        tokens : numpy array of int
+            A vector of the previous token for each sequence.
+
+        states : list of numpy arrays
+            The states of the previous step, one row per sequence.
+
+        Returns
+        -------
+        log_probs : numpy array
+            A matrix of the log-probabilities of the next token.
+
+        states : list of numpy arrays
+            The new states.
+        """
+        outputs = self._step_fn(np.asarray(tokens, dtype=np.int32), *states)
+        return outputs[0], outputs[1:]
+
+    def greedy(self, start, max_length, eos=None, states=None):
+        """
+        Decodes by always choosing the most probable next token.
+
+        Parameters
+        ----------
+        start : numpy array of int
+            A vector of the first input token for each sequence.
+
+        max_length : int
+            The maximum number of tokens to generate.
+
+        eos : int or None (default: None)
+            The token ending a sequence. Sequences that have produced it keep
+            emitting it, and decoding stops early once all of them have. If
+            ``None``, always `max_length` tokens are generated.
+
+        states : list of numpy arrays or None (default: None)
+            The initial states, one row per sequence, e.g. as produced by an
+            encoder. If ``None``, the initial states of the step layer are
+            used.
+
+        Returns
+        -------
+        tokens : numpy array of int
+            A ``(batch_size, max_length)`` matrix of the generated tokens.
+
+        scores : numpy array
+            The summed log-probabilities of the generated sequences.
+        """
+        start = np.asarray(start, dtype=np.int32)
+        batch_size = len(start)
+        if states is None:
+            states = self.init_states(batch_size)
+        tokens = np.empty((batch_size, max_length), dtype=np.int32)
+        if eos is not None:
+            tokens.fill(eos)
+        scores = np.zeros(batch_size, dtype=theano.config.floatX)
+        finished = np.zeros(batch_size, dtype=bool)
+        rows = np.arange(batch_size)
+        prev = start
+        for t in range(max_length):
+            log_probs, states = self.step(prev, states)
+            prev = log_probs.argmax(axis=1).astype(np.int32)
+            if eos is not None:
+                prev[finished] = eos
+            scores += np.where(finished, 0, log_probs[rows, prev])
+            tokens[:, t] = prev
+            if eos is not None:
+                finished |= prev == eos
+                if finished.all():
+                    break
+        return tokens, scores
+
+    def beam_search(self, start, beam_size, max_length, eos=None,
+                    states=None):
+        """
+        Decodes by keeping the `beam_size` most probable partial sequences.
+
+        Parameters
+        ----------
+        start : numpy array of int
+            A vector of the first input token for each sequence.
+
+        beam_size : int
+            The number of hypotheses kept per sequence.
+
+        max_length : int
+            The maximum number of tokens to generate.
+
+        eos : int or None (default: None)
+            The token ending a hypothesis. Finished hypotheses keep their
+            score and are padded with `eos`, and decoding stops early once all
+            hypotheses have finished. If ``None``, always `max_length` tokens
+            are generated.
+
+        states : list of numpy arrays or None (default: None)
+            The initial states, one row per sequence, e.g. as produced by an
+            encoder. They are repeated for each hypothesis of a sequence. If
+            ``None``, the initial states of the step layer are used.
+
+        Returns
+        -------
+        tokens : numpy array of int
+            A ``(batch_size, beam_size, max_length)`` tensor of the generated
+            hypotheses, best first.
+
+        scores : numpy array
+            A ``(batch_size, beam_size)`` matrix of the summed
+            log-probabilities of the hypotheses.
+        """
+        start = np.asarray(start, dtype=np.int32)
+        batch_size = len(start)
+        k = beam_size
+        n = batch_size * k
+        if states is None:
+            states = self.init_states(n)
+        else:
+            states = [np.repeat(s, k, axis=0) for s in states]
+        # preallocated beam state, reused across steps
+        buffers = [np.empty_like(s) for s in states]
+        tokens = np.empty((max_length, batch_size, k), dtype=np.int32)
+        backptr = np.zeros((max_length, batch_size, k), dtype=np.int64)
+        scores = np.full((batch_size, k), -np.inf,
+                         dtype=theano.config.floatX)
+        scores[:, 0] = 0
+        finished = np.zeros((batch_size, k), dtype=bool)
+        offsets = (np.arange(batch_size) * k)[:, None]
+        prev = np.repeat(start, k)
+        length = max_length
+        for t in range(max_length):
+            log_probs, states = self.step(prev, states)
+            num_tokens = log_probs.shape[1]
+            log_probs = log_probs.reshape(batch_size, k, num_tokens)
+            if eos is not None and finished.any():
+                # finished hypotheses can only be continued by eos, for free
+                log_probs[finished] = -np.inf
+                log_probs[finished, eos] = 0
+            candidates = (scores[:, :, None] + log_probs).reshape(
+                batch_size, k * num_tokens)
+            # partial selection of the k best candidates, then sort those
+            best = np.argpartition(-candidates, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(candidates, best, axis=1),
+                               axis=1, kind='stable')
+            best = np.take_along_axis(best, order, axis=1)
+            scores = np.take_along_axis(candidates, best, axis=1)
+            beams = best // num_tokens
+            prev = (best % num_tokens).astype(np.int32)
+            tokens[t] = prev
+            backptr[t] = beams
+            # reorder the states of all hypotheses with a single take each
+            index = (offsets + beams).ravel()
+            for s, buf in zip(states, buffers):
+                np.take(s, index, axis=0, out=buf)
+            states = buffers
+            prev = prev.ravel()
+            if eos is not None:
+                finished = np.take_along_axis(finished, beams, axis=1)
+                finished |= tokens[t] == eos
+                if finished.all():
+                    length = t + 1
+                    break
+        # follow the back pointers to recover the hypotheses
+        result = np.empty((batch_size, k, max_length), dtype=np.int32)
+        if eos is not None:
+            result.fill(eos)
+        beams = np.tile(np.arange(k), (batch_size, 1))
+        for t in range(length - 1, -1, -1):
+            result[:, :, t] = np.take_along_axis(tokens[t], beams, axis=1)
+            beams = np.take_along_axis(backptr[t], beams, axis=1)
+        return result, scores
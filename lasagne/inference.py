@@ -0,0 +1,575 @@
+"""
+Functions to run trained networks with NumPy only.
+
+:func:`export` walks the layers of a network and converts each of them into
+a small NumPy operation holding plain arrays of the current parameter values.
+The resulting :class:`NumpyNetwork` computes the deterministic output of the
+network (as with ``get_output(network, deterministic=True)``) without
+compiling anything: matrix products and convolutions are done with
+:func:`numpy.dot` and :func:`numpy.matmul`, which call into BLAS, and the
+intermediate results are written into buffers that are allocated on the first
+call and reused as long as the input shapes do not change.
+
+A :class:`NumpyNetwork` can be pickled. It is defined in the separate
+:mod:`lasagne_numpy` module, which only depends on NumPy, so loading it
+neither imports Theano nor compiles anything: serving replicas do not need
+Theano or a C compiler.
+
+The weights of dense and convolution layers can be quantized to int8 on
+export (see the `quantize` and `calibration` arguments of :func:`export`),
+which shrinks them by a factor of four (eight for float64 networks).
+
+.. autosummary::
+    :nosignatures:
+
+    export
+    NumpyNetwork
+    register_converter
+
+Examples
+--------
+>>> import numpy as np
+>>> from lasagne.layers import InputLayer, DenseLayer, get_output
+>>> from lasagne.nonlinearities import softmax
+>>> l_in = InputLayer((None, 10))
+>>> l_hid = DenseLayer(l_in, num_units=20)
+>>> l_out = DenseLayer(l_hid, num_units=3, nonlinearity=softmax)
+>>> from lasagne.inference import export
+>>> network = export(l_out)
+>>> x = np.random.rand(5, 10)
+>>> y = network(x)
+>>> np.allclose(y, get_output(l_out, x, deterministic=True).eval())
+True
+
+The following layers are supported: :class:`DenseLayer`, :class:`NINLayer`,
+:class:`Conv1DLayer`, :class:`Conv2DLayer`, :class:`Conv3DLayer`,
+:class:`TransposedConv2DLayer`, :class:`DilatedConv2DLayer`, the pooling
+and upscaling layers, :class:`GlobalPoolLayer`, :class:`BatchNormLayer`,
+the shape and merge layers, :class:`EmbeddingLayer`,
+:class:`NonlinearityLayer`, :class:`LogitsLayer` (which outputs the logits),
+:class:`BiasLayer`, :class:`ScaleLayer`, the rectifier layers, the noise
+layers (which do nothing at inference), :class:`IndexLayer` and
+:class:`RecurrenceLayer` with the step layers of
+:mod:`lasagne.layers.recurrent_new`. Other layers can be supported with
+:func:`register_converter`.
+"""
+
+import numpy as np
+
+import theano
+import theano.tensor as T
+
+from lasagne_numpy import (NumpyNetwork, _AdaptiveSoftmax, _BatchNorm, _Concat,
+                           _Conv, _Dense, _Dimshuffle, _Elemwise,
+                           _ElemwiseMerge, _Embedding, _EmbeddingBag, _Flatten,
+                           _GRUStep, _GlobalPool, _Identity, _Index, _LSTMStep,
+                           _LeakyElu, _LeakyRectify, _Linear, _NIN,
+                           _Nonlinearity, _PReLU, _Pad, _PixelShuffle, _Pool,
+                           _RWAStep, _Recurrence, _Reshape, _ScaledTanH,
+                           _Slice, _SparseDense, _StandardStep,
+                           _TransposedConv, _Upscale, _elu, _identity,
+                           _rectify, _sigmoid, _softmax, _softplus, _tanh)
+
+from . import nonlinearities
+from . import layers
+from .layers import helper
+from .layers.conv import BaseConvLayer
+
+
+__all__ = [
+    "export",
+    "NumpyNetwork",
+    "register_converter",
+]
+
+
+_converters = {}
+
+
+def register_converter(layer_class):
+    """
+    Decorator registering a converter from a layer class to a NumPy operation.
+
+    The converter is called with a layer instance and must return a callable
+    taking the tuple of input arrays of the layer and returning the tuple of
+    its output arrays. Converters are looked up along the method resolution
+    order of a layer's class, so a converter also applies to subclasses that
+    have no converter of their own.
+
+    Parameters
+    ----------
+    layer_class : class
+        The :class:`lasagne.layers.Layer` subclass to convert.
+
+    Returns
+    -------
+    callable
+        A decorator registering the converter function.
+
+    Examples
+    --------
+    >>> from lasagne.layers import Layer
+    >>> class DoubleLayer(Layer):
+    ...     def get_outputs_for(self, inputs, **kwargs):
+    ...         return inputs[0] * 2,
+    >>> @register_converter(DoubleLayer)
+    ... def convert_double(layer):
+    ...     return lambda inputs: (inputs[0] * 2,)
+    """
+    def decorator(converter):
+        _converters[layer_class] = converter
+        return converter
+    return decorator
+
+
+def _convert(layer):
+    for cls in type(layer).__mro__:
+        if cls in _converters:
+            return _converters[cls](layer)
+    raise NotImplementedError("Cannot export %s to NumPy, no converter is "
+                              "registered for it." % type(layer).__name__)
+
+
+def _value(param):
+    # current value of a shared variable or parameter expression
+    if param is None:
+        return None
+    if hasattr(param, 'get_value'):
+        return np.array(param.get_value())
+    if isinstance(param, T.Variable):
+        return np.array(param.eval())
+    return np.array(param)
+
+
+def _shared_pattern(param, shared_axes, ndim):
+    # reshape a parameter to broadcast over the shared axes of an input
+    axes = iter(range(param.ndim))
+    shape = [1 if axis in shared_axes else param.shape[next(axes)]
+             for axis in range(ndim)]
+    return param.reshape(shape)
+
+
+def export(layer_or_layers, input_layers=None, quantize=False,
+           calibration=None):
+    """
+    Exports a network to a :class:`NumpyNetwork`.
+
+    The current parameter values are copied, later changes to the shared
+    variables of the network are not reflected in the exported network.
+
+    Parameters
+    ----------
+    layer_or_layers : Layer or list
+        The :class:`Layer` instance whose output is to be computed, or a list
+        of :class:`Layer` instances.
+
+    input_layers : list of Layer or None
+        The layers whose outputs are given as inputs, in the order the
+        exported network expects them. Defaults to all
+        :class:`InputLayer` instances of the network, in the order of
+        :func:`lasagne.layers.get_all_layers`.
+
+    quantize : bool or list of Layer
+        Whether to quantize the weights of the :class:`DenseLayer`,
+        :class:`NINLayer`, :class:`Conv1DLayer`, :class:`Conv2DLayer` and
+        :class:`DilatedConv2DLayer` instances of the network to int8, or a
+        list of the layers to quantize. Weights are quantized symmetrically
+        with one scale per output unit or filter, computed from their maximum
+        absolute value.
+
+    calibration : iterable or None
+        Batches of inputs to calibrate the quantized layers with, each batch
+        being an array or a list with one array per input layer. The batches
+        are run through :func:`lasagne.layers.get_output` (with
+        ``deterministic=True``) to find the range of the inputs of each
+        quantized layer. Calibrated layers quantize their inputs to int8 as
+        well and accumulate the products in int32; without calibration, the
+        int8 weights are dequantized and the products accumulate in floating
+        point.
+
+    Returns
+    -------
+    :class:`NumpyNetwork`
+        The exported network.
+
+    Raises
+    ------
+    NotImplementedError
+        If a layer or one of its options cannot be exported, or if a layer
+        listed in `quantize` cannot be quantized.
+
+    Notes
+    -----
+    Inputs of calibrated layers outside the range seen during calibration are
+    clipped. The calibration batches should thus cover the inputs the network
+    will be used on.
+    """
+    if isinstance(layer_or_layers, (list, tuple)):
+        output_layers = list(layer_or_layers)
+    else:
+        output_layers = [layer_or_layers]
+    all_layers = helper.get_all_layers(output_layers, input_layers)
+    if input_layers is None:
+        input_layers = [l for l in all_layers
+                        if isinstance(l, layers.InputLayer)]
+    input_dtypes = [getattr(getattr(l, 'input_var', None), 'dtype', None)
+                    for l in input_layers]
+    nodes = dict((l, i) for i, l in enumerate(input_layers))
+    program = []
+    quantized = []
+    for layer in all_layers:
+        if layer in nodes:
+            continue
+        if isinstance(layer, layers.InputLayer):
+            raise ValueError("The input layer %r is not listed in "
+                             "`input_layers`." % layer)
+        if any(l is None for l in layer.input_layers):
+            raise ValueError("Cannot export the free-floating layer %r. "
+                             "Please add it to `input_layers`." % layer)
+        op = _convert(layer)
+        if quantize is True:
+            if isinstance(op, _Linear):
+                quantized.append((layer, op))
+        elif quantize and layer in quantize:
+            if not isinstance(op, _Linear):
+                raise NotImplementedError("Cannot quantize %s."
+                                          % type(layer).__name__)
+            quantized.append((layer, op))
+        program.append((op, [nodes[l] for l in layer.input_layers]))
+        nodes[layer] = len(nodes)
+    if calibration is not None and quantized:
+        input_scales = _calibrate([l for l, _ in quantized], input_layers,
+                                  input_dtypes, calibration)
+    else:
+        input_scales = [None] * len(quantized)
+    for (_, op), input_scale in zip(quantized, input_scales):
+        op.quantize(input_scale)
+    return NumpyNetwork(input_dtypes, program,
+                        [nodes[l] for l in output_layers])
+
+
+def _calibrate(quantized_layers, input_layers, input_dtypes, batches):
+    # scale mapping the maximum absolute input of each layer to 127
+    variables = []
+    for layer, dtype in zip(input_layers, input_dtypes):
+        if isinstance(layer, layers.InputLayer):
+            variables.append(layer.input_var)
+        else:
+            ndim = len(layer.output_shape)
+            variables.append(T.TensorType(dtype or theano.config.floatX,
+                                          (False, ) * ndim)())
+    outputs = helper.get_outputs([l.input_layers[0] for l in quantized_layers],
+                                 dict(zip(input_layers, variables)),
+                                 deterministic=True)
+    fn = theano.function(variables, [abs(o[0]).max() for o in outputs],
+                         on_unused_input='ignore')
+    maxima = np.zeros(len(quantized_layers))
+    for batch in batches:
+        if not isinstance(batch, (list, tuple)):
+            batch = [batch]
+        np.maximum(maxima, fn(*batch), out=maxima)
+    maxima[maxima == 0] = 1
+    return list(maxima / 127.)
+
+
+_nonlinearities = {
+    nonlinearities.sigmoid: _sigmoid,
+    nonlinearities.softmax: _softmax,
+    nonlinearities.tanh: _tanh,
+    nonlinearities.rectify: _rectify,
+    nonlinearities.elu: _elu,
+    nonlinearities.softplus: _softplus,
+    nonlinearities.linear: _identity,
+}
+
+
+def _nonlinearity(f):
+    if f is None:
+        return _identity
+    if isinstance(f, nonlinearities.ScaledTanH):
+        return _ScaledTanH(f.scale_in, f.scale_out)
+    if isinstance(f, nonlinearities.LeakyRectify):
+        return _LeakyRectify(_value(f.leakiness))
+    if isinstance(f, nonlinearities.LeakyElu):
+        return _LeakyElu(_value(f.leakiness))
+    try:
+        return _nonlinearities[f]
+    except (KeyError, TypeError):
+        raise NotImplementedError("Cannot export the nonlinearity %r to "
+                                  "NumPy." % (f, ))
+
+
+# Converters
+
+@register_converter(layers.DenseLayer)
+def _convert_dense(layer):
+    return _Dense(_value(layer.W), _value(layer.b),
+                  _nonlinearity(layer.nonlinearity), layer.num_leading_axes)
+
+
+@register_converter(layers.SparseDenseLayer)
+def _convert_sparse_dense(layer):
+    return _SparseDense(layer.W.get_value(), _value(layer.b),
+                        _nonlinearity(layer.nonlinearity),
+                        layer.num_leading_axes)
+
+
+@register_converter(layers.SampledSoftmaxLayer)
+def _convert_sampled_softmax(layer):
+    return _Dense(_value(layer.W).T, _value(layer.b), _softmax, 1)
+
+
+@register_converter(layers.AdaptiveSoftmaxLayer)
+def _convert_adaptive_softmax(layer):
+    return _AdaptiveSoftmax(_value(layer.W_head), _value(layer.b_head),
+                            [_value(W) for W in layer.W_proj],
+                            [_value(W) for W in layer.W_tail],
+                            list(layer.cutoffs))
+
+
+@register_converter(layers.NINLayer)
+def _convert_nin(layer):
+    return _NIN(_value(layer.W), _value(layer.b),
+                _nonlinearity(layer.nonlinearity))
+
+
+def _conv_pad(pad, filter_size, dilation):
+    if pad == 'full':
+        return tuple((k - 1) * d for k, d in zip(filter_size, dilation))
+    elif pad == 'same':
+        return tuple((k - 1) * d // 2 for k, d in zip(filter_size, dilation))
+    return pad
+
+
+@register_converter(BaseConvLayer)
+def _convert_conv(layer):
+    if type(layer).convolve not in (layers.Conv1DLayer.convolve,
+                                    layers.Conv2DLayer.convolve,
+                                    layers.Conv3DLayer.convolve):
+        raise NotImplementedError("Cannot export %s to NumPy."
+                                  % type(layer).__name__)
+    W = _value(layer.W)
+    if layer.flip_filters:
+        W = W[(Ellipsis, ) + (slice(None, None, -1), ) * layer.n]
+    dilation = (1, ) * layer.n
+    return _Conv(W, _value(layer.b), _nonlinearity(layer.nonlinearity),
+                 layer.stride, _conv_pad(layer.pad, layer.filter_size,
+                                         dilation), dilation,
+                 layer.num_groups)
+
+
+@register_converter(layers.DilatedConv2DLayer)
+def _convert_dilated_conv(layer):
+    W = _value(layer.W).transpose(1, 0, 2, 3)
+    if layer.flip_filters:
+        W = W[..., ::-1, ::-1]
+    return _Conv(W, _value(layer.b), _nonlinearity(layer.nonlinearity),
+                 (1, 1), _conv_pad(layer.pad, layer.filter_size,
+                                   layer.dilation), layer.dilation)
+
+
+@register_converter(layers.TransposedConv2DLayer)
+def _convert_transposed_conv(layer):
+    if isinstance(layer.output_size, T.Variable):
+        raise NotImplementedError("Cannot export a TransposedConv2DLayer "
+                                  "with a symbolic output_size to NumPy.")
+    W = _value(layer.W)
+    if not layer.flip_filters:
+        W = W[..., ::-1, ::-1]
+    return _TransposedConv(W, _value(layer.b),
+                           _nonlinearity(layer.nonlinearity), layer.stride,
+                           _conv_pad(layer.crop, layer.filter_size, (1, 1)),
+                           layer.output_size)
+
+
+@register_converter(layers.Pool1DLayer)
+@register_converter(layers.Pool2DLayer)
+@register_converter(layers.Pool3DLayer)
+def _convert_pool(layer):
+    return _Pool(layer.pool_size, layer.stride, layer.pad,
+                 layer.ignore_border, layer.mode)
+
+
+@register_converter(layers.GlobalPoolLayer)
+def _convert_global_pool(layer):
+    functions = {T.mean: np.mean, T.max: np.max, T.min: np.min,
+                 T.sum: np.sum}
+    try:
+        return _GlobalPool(functions[layer.pool_function])
+    except KeyError:
+        raise NotImplementedError("Cannot export the pool function %r to "
+                                  "NumPy." % layer.pool_function)
+
+
+@register_converter(layers.Upscale1DLayer)
+@register_converter(layers.Upscale2DLayer)
+@register_converter(layers.Upscale3DLayer)
+def _convert_upscale(layer):
+    return _Upscale(layer.scale_factor, layer.mode)
+
+
+@register_converter(layers.PixelShuffleLayer)
+def _convert_pixel_shuffle(layer):
+    return _PixelShuffle(layer.scale_factor)
+
+
+@register_converter(layers.BatchNormLayer)
+def _convert_batch_norm(layer):
+    ndim = len(layer.input_shape)
+    inv_std = _value(layer.inv_std)
+    gamma = 1 if layer.gamma is None else _value(layer.gamma)
+    beta = 0 if layer.beta is None else _value(layer.beta)
+    scale = gamma * inv_std
+    shift = beta - _value(layer.mean) * scale
+    return _BatchNorm(_shared_pattern(scale, layer.axes, ndim),
+                      _shared_pattern(shift, layer.axes, ndim))
+
+
+@register_converter(layers.BiasLayer)
+def _convert_bias(layer):
+    if layer.b is None:
+        return _Identity()
+    b = _shared_pattern(_value(layer.b), layer.shared_axes,
+                        len(layer.input_shape))
+    return _Elemwise(np.add, b)
+
+
+@register_converter(layers.ScaleLayer)
+def _convert_scale(layer):
+    scales = _shared_pattern(_value(layer.scales), layer.shared_axes,
+                             len(layer.input_shape))
+    return _Elemwise(np.multiply, scales)
+
+
+@register_converter(layers.ParametricRectifierLayer)
+def _convert_prelu(layer):
+    return _PReLU(_shared_pattern(_value(layer.alpha), layer.shared_axes,
+                                  len(layer.input_shape)))
+
+
+@register_converter(layers.RandomizedRectifierLayer)
+def _convert_rrelu(layer):
+    alpha = (_value(layer.upper) + _value(layer.lower)) / 2.0
+    return _PReLU(alpha)
+
+
+@register_converter(layers.NonlinearityLayer)
+def _convert_nonlinearity(layer):
+    return _Nonlinearity(_nonlinearity(layer.nonlinearity))
+
+
+@register_converter(layers.LogitsLayer)
+@register_converter(layers.DropoutLayer)
+@register_converter(layers.GaussianNoiseLayer)
+def _convert_noise(layer):
+    return _Identity()
+
+
+@register_converter(layers.FlattenLayer)
+def _convert_flatten(layer):
+    return _Flatten(layer.outdim)
+
+
+@register_converter(layers.ReshapeLayer)
+def _convert_reshape(layer):
+    if any(isinstance(s, T.Variable) for s in layer.shape):
+        raise NotImplementedError("Cannot export a ReshapeLayer with a "
+                                  "symbolic shape to NumPy.")
+    return _Reshape(layer.shape)
+
+
+@register_converter(layers.DimshuffleLayer)
+def _convert_dimshuffle(layer):
+    return _Dimshuffle(layer.pattern)
+
+
+@register_converter(layers.PadLayer)
+def _convert_pad(layer):
+    return _Pad(layer.width, layer.val, layer.batch_ndim)
+
+
+@register_converter(layers.SliceLayer)
+def _convert_slice(layer):
+    return _Slice(layer.slice, layer.axis)
+
+
+@register_converter(layers.ConcatLayer)
+def _convert_concat(layer):
+    return _Concat(layer.axis, layer.cropping)
+
+
+@register_converter(layers.ElemwiseMergeLayer)
+def _convert_elemwise_merge(layer):
+    functions = {T.add: np.add, T.mul: np.multiply, T.maximum: np.maximum,
+                 T.minimum: np.minimum, T.sub: np.subtract}
+    try:
+        function = functions[layer.merge_function]
+    except KeyError:
+        raise NotImplementedError("Cannot export the merge function %r to "
+                                  "NumPy." % layer.merge_function)
+    return _ElemwiseMerge(function, getattr(layer, 'coeffs', None),
+                          layer.cropping)
+
+
+@register_converter(layers.EmbeddingLayer)
+def _convert_embedding(layer):
+    W = _value(layer.W)
+    if layer.zero_out:
+        W = np.concatenate((np.zeros((layer.zero_out, ) + W.shape[1:],
+                                     W.dtype), W))
+    return _Embedding(W)
+
+
+@register_converter(layers.EmbeddingBagLayer)
+def _convert_embedding_bag(layer):
+    return _EmbeddingBag(_value(layer.W), layer.mode, layer.offsets,
+                         layer.mask)
+
+
+@register_converter(layers.IndexLayer)
+def _convert_index(layer):
+    return _Index(layer.indexes)
+
+
+@register_converter(layers.RecurrenceLayer)
+def _convert_recurrence(layer):
+    if layer.mask:
+        raise NotImplementedError("Cannot export a RecurrenceLayer with "
+                                  "a mask_input to NumPy.")
+    step = layer.inner_layers["step"]
+    in_to_hid = layer.inner_layers.get("in_to_hid")
+    hid_to_out = layer.inner_layers.get("hid_to_out")
+    return _Recurrence(
+        _convert(step), [np.array(i.eval()) for i in step.get_inits((1, ))],
+        None if in_to_hid is None else export(in_to_hid),
+        None if hid_to_out is None else export(hid_to_out),
+        layer.pre_compute_input, layer.pass_raw_and_computed, layer.in_order,
+        layer.out_order, layer.backwards, layer.only_return_final)
+
+
+@register_converter(layers.StandardStep)
+def _convert_standard_step(layer):
+    return _StandardStep(_value(layer.W), _value(layer.b),
+                         _nonlinearity(layer.f), layer.pre_compute_input)
+
+
+@register_converter(layers.GRUStep)
+def _convert_gru_step(layer):
+    return _GRUStep(_value(layer.W), _nonlinearity(layer.f),
+                    _nonlinearity(layer.g))
+
+
+@register_converter(layers.LSTMStep)
+def _convert_lstm_step(layer):
+    if layer.W_peep is not None:
+        raise NotImplementedError("Cannot export an LSTMStep with peepholes "
+                                  "to NumPy.")
+    return _LSTMStep(_value(layer.W), _value(layer.b),
+                     _nonlinearity(layer.f), _nonlinearity(layer.g),
+                     layer.pre_compute_input)
+
+
+@register_converter(layers.RWAStep)
+def _convert_rwa_step(layer):
+    return _RWAStep(_value(layer.W), _nonlinearity(layer.f),
+                    _nonlinearity(layer.g))
@@ -11,7 +11,7 @@ Examples
 
 import numpy as np
 
-from .utils import floatX
+from .utils import floatX, as_tuple
 from .random import get_rng
 
 
@@ -121,6 +121,12 @@ class Glorot(Initializer):
         For a :class:`lasagne.layers.cuda_convnet.Conv2DCCLayer` constructed
         with ``dimshuffle=False``, `c01b` must be set to ``True`` to compute
         the correct fan-in and fan-out.
+    num_groups : int
+        For the weights of a grouped convolution, the number of groups. Each
+        input channel only feeds into the ``num_filters // num_groups``
+        filters of its group, so the fan-out is divided by `num_groups`.
+        Convolutional layers with `num_groups` set this automatically for a
+        Glorot initializer left at ``num_groups=1``.
 
     References
     ----------
@@ -149,13 +155,14 @@ class Glorot(Initializer):
     GlorotNormal  : Shortcut with Gaussian initializer.
     GlorotUniform : Shortcut with uniform initializer.
     """
-    def __init__(self, initializer, gain=1.0, c01b=False):
+    def __init__(self, initializer, gain=1.0, c01b=False, num_groups=1):
         if gain == 'relu':
             gain = np.sqrt(2)
 
         self.initializer = initializer
         self.gain = gain
         self.c01b = c01b
+        self.num_groups = num_groups
 
     def sample(self, shape):
         if self.c01b:
@@ -171,6 +178,7 @@ class Glorot(Initializer):
                     "This initializer only works with shapes of length >= 2")
 
             n1, n2 = shape[:2]
+            n1 //= self.num_groups
             receptive_field_size = np.prod(shape[2:])
 
         std = self.gain * np.sqrt(2.0 / ((n1 + n2) * receptive_field_size))
@@ -182,8 +190,8 @@ class GlorotNormal(Glorot):
 
     See :class:`Glorot` for a description of the parameters.
     """
-    def __init__(self, gain=1.0, c01b=False):
-        super(GlorotNormal, self).__init__(Normal, gain, c01b)
+    def __init__(self, gain=1.0, c01b=False, num_groups=1):
+        super(GlorotNormal, self).__init__(Normal, gain, c01b, num_groups)
 
 
 class GlorotUniform(Glorot):
@@ -191,8 +199,8 @@ class GlorotUniform(Glorot):
 
     See :class:`Glorot` for a description of the parameters.
     """
-    def __init__(self, gain=1.0, c01b=False):
-        super(GlorotUniform, self).__init__(Uniform, gain, c01b)
+    def __init__(self, gain=1.0, c01b=False, num_groups=1):
+        super(GlorotUniform, self).__init__(Uniform, gain, c01b, num_groups)
 
 
 class He(Initializer):
@@ -365,3 +373,44 @@ class Orthogonal(Initializer):
         q = u if u.shape == flat_shape else v
         q = q.reshape(shape)
         return floatX(self.gain * q)
+
+
+class ICNR(Initializer):
+    """Initialize filters of a subpixel convolution to nearest-neighbour
+    upscaling.
+
+    ICNR initialization [1]_ for a convolution followed by a
+    :class:`lasagne.layers.PixelShuffleLayer`: Samples the filters for
+    ``num_filters / (r*r)`` output channels with another initializer, and
+    repeats each of them for the ``r*r`` consecutive channels that are
+    shuffled into the same output channel. The initial output of the pixel
+    shuffle is thus a nearest-neighbour upscaling of a convolution, which
+    avoids checkerboard artifacts.
+
+    Parameters
+    ----------
+    scale_factor : integer or iterable
+        The scale factor of the pixel shuffle. If an integer, it is promoted
+        to a square scale factor region.
+    initializer : Initializer
+        The initializer to sample the distinct filters with.
+
+    References
+    ----------
+    .. [1] Aitken, A., Ledig, C., Theis, L., Caballero, J., Wang, Z., Shi, W.
+           (2017): Checkerboard artifact free sub-pixel convolution: A note on
+           sub-pixel convolution, resize convolution and convolution resize.
+           https://arxiv.org/abs/1707.02937
+    """
+    def __init__(self, scale_factor=2, initializer=GlorotUniform()):
+        self.scale_factor = as_tuple(scale_factor, 2)
+        self.initializer = initializer
+
+    def sample(self, shape):
+        repeats = self.scale_factor[0] * self.scale_factor[1]
+        if len(shape) < 2 or shape[0] % repeats:
+            raise RuntimeError("ICNR needs a shape of length 2 or more whose "
+                               "first dimension is divisible by %d, got %r"
+                               % (repeats, shape))
+        sample = self.initializer((shape[0] // repeats, ) + tuple(shape[1:]))
+        return floatX(np.repeat(sample, repeats, axis=0))
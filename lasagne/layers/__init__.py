@@ -10,6 +10,8 @@ from .shape import *
 from .merge import *
 from .normalization import *
 from .embedding import *
+from .softmax import *
+from .sparse import *
 # from .recurrent import *
 from .recurrent_new import *
 from .special import *
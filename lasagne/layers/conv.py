@@ -1,3 +1,5 @@
+import copy
+
 import theano.tensor as T
 
 from .. import init
@@ -11,9 +13,12 @@ from .base import Layer
 __all__ = [
     "Conv1DLayer",
     "Conv2DLayer",
+    "Conv3DLayer",
     "TransposedConv2DLayer",
     "Deconv2DLayer",
     "DilatedConv2DLayer",
+    "DepthwiseConv2DLayer",
+    "SeparableConv2DLayer",
 ]
 
 
@@ -159,7 +164,7 @@ class BaseConvLayer(Layer):
     stride=1, pad=0, untie_biases=False,
     W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
     nonlinearity=lasagne.nonlinearities.rectify, flip_filters=True,
-    n=None, **kwargs)
+    n=None, num_groups=1, **kwargs)
 
     Convolutional layer base class
 
@@ -221,7 +226,8 @@ class BaseConvLayer(Layer):
     W : Theano shared variable, expression, numpy array or callable
         Initial value, expression or initializer for the weights.
         These should be a tensor of 2+`n` dimensions with shape
-        ``(num_filters, num_input_channels, <n spatial dimensions>)``.
+        ``(num_filters, num_input_channels // num_groups,
+        <n spatial dimensions>)``.
         See :func:`lasagne.utils.create_param` for more information.
 
     b : Theano shared variable, expression, numpy array, callable or ``None``
@@ -248,6 +254,14 @@ class BaseConvLayer(Layer):
         dimensions of each feature map and each convolutional filter). If
         ``None``, will be inferred from the input shape.
 
+    num_groups : int (default: 1)
+        The number of groups the input channels and filters are divided
+        into. Each group of ``num_filters // num_groups`` filters only sees
+        its group of ``num_input_channels // num_groups`` input channels, as
+        in ResNeXt. Both numbers must be divisible by `num_groups`. A
+        :class:`lasagne.init.Glorot` initializer for `W` computes its fan-out
+        per group, see its `num_groups` argument.
+
     **kwargs
         Any additional keyword arguments are passed to the `Layer` superclass.
 
@@ -263,7 +277,7 @@ class BaseConvLayer(Layer):
                  untie_biases=False,
                  W=init.GlorotUniform(), b=init.Constant(0.),
                  nonlinearity=nonlinearities.rectify, flip_filters=True,
-                 n=None, **kwargs):
+                 n=None, num_groups=1, **kwargs):
         super(BaseConvLayer, self).__init__(incoming, **kwargs)
         if nonlinearity is None:
             self.nonlinearity = nonlinearities.identity
@@ -284,6 +298,21 @@ class BaseConvLayer(Layer):
         self.stride = as_tuple(stride, n, int)
         self.untie_biases = untie_biases
 
+        self.num_groups = num_groups
+        if num_groups != 1:
+            num_input_channels = self.input_shape[1]
+            if num_input_channels is None:
+                raise ValueError("num_groups=%d requires a known number of "
+                                 "input channels" % num_groups)
+            num_group_filters = self.get_W_shape()[0]
+            if (num_group_filters % num_groups or
+                    num_input_channels % num_groups):
+                raise ValueError("the number of filters (%d) and of input "
+                                 "channels (%d) must be divisible by "
+                                 "num_groups=%d" % (num_group_filters,
+                                                    num_input_channels,
+                                                    num_groups))
+
         if pad == 'same':
             if any(s % 2 == 0 for s in self.filter_size):
                 raise NotImplementedError(
@@ -295,6 +324,11 @@ class BaseConvLayer(Layer):
         else:
             self.pad = as_tuple(pad, n, int)
 
+        if (num_groups != 1 and isinstance(W, init.Glorot) and
+                W.num_groups == 1):
+            # each input channel only feeds the filters of its group
+            W = copy.copy(W)
+            W.num_groups = num_groups
         self.W = self.add_param(W, self.get_W_shape(), name="W")
         if b is None:
             self.b = None
@@ -315,6 +349,8 @@ class BaseConvLayer(Layer):
             The shape of the weight matrix.
         """
         num_input_channels = self.input_shapes[0][1]
+        if self.num_groups != 1:
+            num_input_channels //= self.num_groups
         return (self.num_filters, num_input_channels) + self.filter_size
 
     def get_output_shapes_for(self, input_shapes):
@@ -369,7 +405,7 @@ class Conv1DLayer(BaseConvLayer):
     pad=0, untie_biases=False, W=lasagne.init.GlorotUniform(),
     b=lasagne.init.Constant(0.), nonlinearity=lasagne.nonlinearities.rectify,
     flip_filters=True, convolution=lasagne.theano_extensions.conv.conv1d_mc0,
-    **kwargs)
+    num_groups=1, **kwargs)
 
     1D convolutional layer
 
@@ -425,7 +461,7 @@ class Conv1DLayer(BaseConvLayer):
     W : Theano shared variable, expression, numpy array or callable
         Initial value, expression or initializer for the weights.
         These should be a 3D tensor with shape
-        ``(num_filters, num_input_channels, filter_length)``.
+        ``(num_filters, num_input_channels // num_groups, filter_length)``.
         See :func:`lasagne.utils.create_param` for more information.
 
     b : Theano shared variable, expression, numpy array, callable or ``None``
@@ -454,6 +490,12 @@ class Conv1DLayer(BaseConvLayer):
         features a 2D convolution implementation. Usually it should be fine
         to leave this at the default value. Note that not all implementations
         support all settings for `pad` and `subsample`.
+        :func:`lasagne.autotune.autotune` can select the fastest one.
+
+    num_groups : int (default: 1)
+        The number of groups for a grouped convolution, see
+        :class:`BaseConvLayer`. Supported by the ``conv1d_mc0`` and
+        ``conv1d_mc1`` implementations.
 
     **kwargs
         Any additional keyword arguments are passed to the `Layer` superclass.
@@ -470,20 +512,24 @@ class Conv1DLayer(BaseConvLayer):
                  pad=0, untie_biases=False,
                  W=init.GlorotUniform(), b=init.Constant(0.),
                  nonlinearity=nonlinearities.rectify, flip_filters=True,
-                 convolution=conv.conv1d_mc0, **kwargs):
+                 convolution=conv.conv1d_mc0, num_groups=1, **kwargs):
         super(Conv1DLayer, self).__init__(incoming, num_filters, filter_size,
                                           stride, pad, untie_biases, W, b,
                                           nonlinearity, flip_filters, n=1,
-                                          **kwargs)
+                                          num_groups=num_groups, **kwargs)
         self.convolution = convolution
 
     def convolve(self, x, **kwargs):
         border_mode = 'half' if self.pad == 'same' else self.pad
+        extra_kwargs = {}
+        if self.num_groups != 1:
+            extra_kwargs['num_groups'] = self.num_groups
         conved = self.convolution(x, self.W,
                                   self.input_shape, self.get_W_shape(),
                                   subsample=self.stride,
                                   border_mode=border_mode,
-                                  filter_flip=self.flip_filters)
+                                  filter_flip=self.flip_filters,
+                                  **extra_kwargs)
         return conved
 
 
@@ -493,7 +539,7 @@ class Conv2DLayer(BaseConvLayer):
     stride=(1, 1), pad=0, untie_biases=False,
     W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
     nonlinearity=lasagne.nonlinearities.rectify, flip_filters=True,
-    convolution=theano.tensor.nnet.conv2d, **kwargs)
+    convolution=theano.tensor.nnet.conv2d, num_groups=1, **kwargs)
 
     2D convolutional layer
 
@@ -553,7 +599,8 @@ class Conv2DLayer(BaseConvLayer):
     W : Theano shared variable, expression, numpy array or callable
         Initial value, expression or initializer for the weights.
         These should be a 4D tensor with shape
-        ``(num_filters, num_input_channels, filter_rows, filter_columns)``.
+        ``(num_filters, num_input_channels // num_groups, filter_rows,
+        filter_columns)``.
         See :func:`lasagne.utils.create_param` for more information.
 
     b : Theano shared variable, expression, numpy array, callable or ``None``
@@ -577,7 +624,17 @@ class Conv2DLayer(BaseConvLayer):
 
     convolution : callable
         The convolution implementation to use. Usually it should be fine to
-        leave this at the default value.
+        leave this at the default value. For large filters,
+        `lasagne.theano_extensions.conv.conv2d_fft` may be faster, and for
+        3x3 filters with unit stride,
+        `lasagne.theano_extensions.conv.conv2d_winograd`.
+        :func:`lasagne.autotune.autotune` can select the fastest one.
+
+    num_groups : int (default: 1)
+        The number of groups for a grouped convolution, see
+        :class:`BaseConvLayer`. All groups are computed by a single
+        convolution call, which requires an implementation accepting the
+        ``num_groups`` argument of :func:`theano.tensor.nnet.conv2d`.
 
     **kwargs
         Any additional keyword arguments are passed to the `Layer` superclass.
@@ -594,23 +651,163 @@ class Conv2DLayer(BaseConvLayer):
                  pad=0, untie_biases=False,
                  W=init.GlorotUniform(), b=init.Constant(0.),
                  nonlinearity=nonlinearities.rectify, flip_filters=True,
-                 convolution=T.nnet.conv2d, **kwargs):
+                 convolution=T.nnet.conv2d, num_groups=1, **kwargs):
         super(Conv2DLayer, self).__init__(incoming, num_filters, filter_size,
                                           stride, pad, untie_biases, W, b,
                                           nonlinearity, flip_filters, n=2,
-                                          **kwargs)
+                                          num_groups=num_groups, **kwargs)
         self.convolution = convolution
 
     def convolve(self, x, **kwargs):
         border_mode = 'half' if self.pad == 'same' else self.pad
+        extra_kwargs = {}
+        if self.num_groups != 1:
+            extra_kwargs['num_groups'] = self.num_groups
         conved = self.convolution(x, self.W,
                                   self.input_shape, self.get_W_shape(),
                                   subsample=self.stride,
                                   border_mode=border_mode,
-                                  filter_flip=self.flip_filters)
+                                  filter_flip=self.flip_filters,
+                                  **extra_kwargs)
         return conved
 
-# TODO: add Conv3DLayer
+
+class Conv3DLayer(BaseConvLayer):
+    """
+    lasagne.layers.Conv3DLayer(incoming, num_filters, filter_size,
+    stride=(1, 1, 1), pad=0, untie_biases=False,
+    W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
+    nonlinearity=lasagne.nonlinearities.rectify, flip_filters=True,
+    convolution=theano.tensor.nnet.conv3d, num_groups=1, **kwargs)
+
+    3D convolutional layer
+
+    Performs a 3D convolution on its input and optionally adds a bias and
+    applies an elementwise nonlinearity.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape. The
+        output of this layer should be a 5D tensor, with shape ``(batch_size,
+        num_input_channels, input_depth, input_rows, input_columns)``.
+
+    num_filters : int
+        The number of learnable convolutional filters this layer has.
+
+    filter_size : int or iterable of int
+        An integer or a 3-element tuple specifying the size of the filters.
+
+    stride : int or iterable of int
+        An integer or a 3-element tuple specifying the stride of the
+        convolution operation.
+
+    pad : int, iterable of int, 'full', 'same' or 'valid' (default: 0)
+        By default, the convolution is only computed where the input and the
+        filter fully overlap (a valid convolution). When ``stride=1``, this
+        yields an output that is smaller than the input by ``filter_size - 1``.
+        The `pad` argument allows you to implicitly pad the input with zeros,
+        extending the output size.
+
+        A single integer results in symmetric zero-padding of the given size on
+        all borders, a tuple of three integers allows different symmetric
+        padding per dimension.
+
+        ``'full'`` pads with one less than the filter size on both sides. This
+        is equivalent to computing the convolution wherever the input and the
+        filter overlap by at least one position.
+
+        ``'same'`` pads with half the filter size (rounded down) on both sides.
+        When ``stride=1`` this results in an output size equal to the input
+        size. Even filter size is not supported.
+
+        ``'valid'`` is an alias for ``0`` (no padding / a valid convolution).
+
+        Note that ``'full'`` and ``'same'`` can be faster than equivalent
+        integer values due to optimizations by Theano.
+
+    untie_biases : bool (default: False)
+        If ``False``, the layer will have a bias parameter for each channel,
+        which is shared across all positions in this channel. As a result, the
+        `b` attribute will be a vector (1D).
+
+        If True, the layer will have separate bias parameters for each
+        position in each channel. As a result, the `b` attribute will be a
+        4D tensor.
+
+    W : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the weights.
+        These should be a 5D tensor with shape
+        ``(num_filters, num_input_channels // num_groups, filter_depth,
+        filter_rows, filter_columns)``.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    b : Theano shared variable, expression, numpy array, callable or ``None``
+        Initial value, expression or initializer for the biases. If set to
+        ``None``, the layer will have no biases. Otherwise, biases should be
+        a 1D array with shape ``(num_filters,)`` if `untied_biases` is set to
+        ``False``. If it is set to ``True``, its shape should be
+        ``(num_filters, output_depth, output_rows, output_columns)`` instead.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    nonlinearity : callable or None
+        The nonlinearity that is applied to the layer activations. If None
+        is provided, the layer will be linear.
+
+    flip_filters : bool (default: True)
+        Whether to flip the filters before sliding them over the input,
+        performing a convolution (this is the default), or not to flip them and
+        perform a correlation. Note that
+        :class:`lasagne.layers.dnn.Conv3DDNNLayer` does not flip by default --
+        take care when using weights learned with that layer.
+
+    convolution : callable
+        The convolution implementation to use. Usually it should be fine to
+        leave this at the default value, :func:`theano.tensor.nnet.conv3d`.
+        On the CPU, Theano replaces it with a gemm-based correlation
+        (``Corr3dMM``) that expands the input into columns (im2col), so the
+        layer does not require cuDNN.
+
+    num_groups : int (default: 1)
+        The number of groups for a grouped convolution, see
+        :class:`BaseConvLayer`. All groups are computed by a single
+        convolution call, which requires an implementation accepting the
+        ``num_groups`` argument of :func:`theano.tensor.nnet.conv3d`.
+
+    **kwargs
+        Any additional keyword arguments are passed to the `Layer` superclass.
+
+    Attributes
+    ----------
+    W : Theano shared variable or expression
+        Variable or expression representing the filter weights.
+
+    b : Theano shared variable or expression
+        Variable or expression representing the biases.
+    """
+    def __init__(self, incoming, num_filters, filter_size,
+                 stride=(1, 1, 1), pad=0, untie_biases=False,
+                 W=init.GlorotUniform(), b=init.Constant(0.),
+                 nonlinearity=nonlinearities.rectify, flip_filters=True,
+                 convolution=T.nnet.conv3d, num_groups=1, **kwargs):
+        super(Conv3DLayer, self).__init__(incoming, num_filters, filter_size,
+                                          stride, pad, untie_biases, W, b,
+                                          nonlinearity, flip_filters, n=3,
+                                          num_groups=num_groups, **kwargs)
+        self.convolution = convolution
+
+    def convolve(self, x, **kwargs):
+        border_mode = 'half' if self.pad == 'same' else self.pad
+        extra_kwargs = {}
+        if self.num_groups != 1:
+            extra_kwargs['num_groups'] = self.num_groups
+        conved = self.convolution(x, self.W,
+                                  self.input_shape, self.get_W_shape(),
+                                  subsample=self.stride,
+                                  border_mode=border_mode,
+                                  filter_flip=self.flip_filters,
+                                  **extra_kwargs)
+        return conved
 
 
 class TransposedConv2DLayer(BaseConvLayer):
@@ -763,6 +960,9 @@ class TransposedConv2DLayer(BaseConvLayer):
         # rename self.pad to self.crop:
         self.crop = self.pad
         del self.pad
+        if self.num_groups != 1:
+            raise NotImplementedError(
+                "TransposedConv2DLayer does not support num_groups.")
 
     def get_W_shape(self):
         num_input_channels = self.input_shape[1]
@@ -811,7 +1011,9 @@ class DilatedConv2DLayer(BaseConvLayer):
     lasagne.layers.DilatedConv2DLayer(incoming, num_filters, filter_size,
     dilation=(1, 1), pad=0, untie_biases=False,
     W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
-    nonlinearity=lasagne.nonlinearities.rectify, flip_filters=False, **kwargs)
+    nonlinearity=lasagne.nonlinearities.rectify, flip_filters=False,
+    implementation='gradweights', convolution=theano.tensor.nnet.conv2d,
+    **kwargs)
 
     2D dilated convolution layer
 
@@ -836,10 +1038,12 @@ class DilatedConv2DLayer(BaseConvLayer):
         filters. A factor of :math:`x` corresponds to :math:`x - 1` zeros
         inserted between adjacent filter elements.
 
-    pad : int, iterable of int, or 'valid' (default: 0)
-        The amount of implicit zero padding of the input.
-        This implementation does not support padding, the argument is provided
-        for compatibility to other convolutional layers only.
+    pad : int, iterable of int, 'full', 'same' or 'valid' (default: 0)
+        The amount of implicit zero padding of the input, see
+        :class:`Conv2DLayer`, where ``'full'`` and ``'same'`` refer to the
+        size of the dilated filters. ``'same'`` keeps the size of the input,
+        as needed for stacks of dilated convolutions.
+        Only the ``'space_to_batch'`` implementation supports padding.
 
     untie_biases : bool (default: False)
         If ``False``, the layer will have a bias parameter for each channel,
@@ -874,8 +1078,14 @@ class DilatedConv2DLayer(BaseConvLayer):
         Whether to flip the filters before sliding them over the input,
         performing a convolution, or not to flip them and perform a
         correlation (this is the default).
-        This implementation does not support flipped filters, the argument is
-        provided for compatibility to other convolutional layers only.
+        Only the ``'space_to_batch'`` implementation supports flipped filters.
+
+    implementation : {'gradweights', 'space_to_batch'}
+        How to compute the dilated convolution, see the notes below.
+
+    convolution : callable
+        The convolution implementation used by the ``'space_to_batch'``
+        implementation, as for :class:`Conv2DLayer`.
 
     **kwargs
         Any additional keyword arguments are passed to the `Layer` superclass.
@@ -890,11 +1100,19 @@ class DilatedConv2DLayer(BaseConvLayer):
 
     Notes
     -----
-    The dilated convolution is implemented as the backward pass of a
-    convolution wrt. weights, passing the filters as the output gradient.
-    It can be thought of as dilating the filters (by adding ``dilation - 1``
-    zeros between adjacent filter elements) and cross-correlating them with the
-    input. See [1]_ for more background.
+    The ``'gradweights'`` implementation computes the dilated convolution as
+    the backward pass of a convolution wrt. weights, passing the filters as
+    the output gradient. It can be thought of as dilating the filters (by
+    adding ``dilation - 1`` zeros between adjacent filter elements) and
+    cross-correlating them with the input. See [1]_ for more background.
+
+    The ``'space_to_batch'`` implementation splits the padded input into
+    ``dilation[0] * dilation[1]`` subsampled maps, one per phase of the
+    dilation, stacked along the batch axis. The dilated convolution becomes
+    a regular convolution of these smaller maps with the undilated filters,
+    computed by a single call of `convolution`, and the results are
+    interleaved again. This supports padding and flipped filters and is
+    usually faster on CPU, especially for large dilations.
 
     References
     ----------
@@ -906,19 +1124,30 @@ class DilatedConv2DLayer(BaseConvLayer):
                  pad=0, untie_biases=False,
                  W=init.GlorotUniform(), b=init.Constant(0.),
                  nonlinearity=nonlinearities.rectify, flip_filters=False,
+                 implementation='gradweights', convolution=T.nnet.conv2d,
                  **kwargs):
         self.dilation = as_tuple(dilation, 2, int)
+        if implementation not in ('gradweights', 'space_to_batch'):
+            raise ValueError("implementation must be 'gradweights' or "
+                             "'space_to_batch', got %r" % (implementation,))
+        self.implementation = implementation
+        self.convolution = convolution
         super(DilatedConv2DLayer, self).__init__(
             incoming, num_filters, filter_size, 1, pad,
             untie_biases, W, b, nonlinearity, flip_filters, n=2, **kwargs)
         # remove self.stride:
         del self.stride
+        if self.num_groups != 1:
+            raise NotImplementedError(
+                "DilatedConv2DLayer does not support num_groups.")
+        if implementation == 'space_to_batch':
+            return
         # require valid convolution
         if self.pad != (0, 0):
             raise NotImplementedError(
                 "DilatedConv2DLayer requires pad=0 / (0,0) / 'valid', but "
-                "got %r. For a padded dilated convolution, add a PadLayer."
-                % (pad,))
+                "got %r. For a padded dilated convolution, add a PadLayer "
+                "or use implementation='space_to_batch'." % (pad,))
         # require unflipped filters
         if self.flip_filters:
             raise NotImplementedError(
@@ -932,13 +1161,16 @@ class DilatedConv2DLayer(BaseConvLayer):
     def get_output_shapes_for(self, input_shapes):
         input_shape = input_shapes[0]
         batch_size = input_shape[0]
+        pad = self.pad if isinstance(self.pad, tuple) else (self.pad,) * 2
         return ((batch_size, self.num_filters) +
-                tuple(conv_output_length(x, (kernel-1) * dilate + 1, 1, 0)
-                      for x, kernel, dilate
+                tuple(conv_output_length(x, (kernel-1) * dilate + 1, 1, p)
+                      for x, kernel, dilate, p
                       in zip(input_shape[2:], self.filter_size,
-                             self.dilation))),
+                             self.dilation, pad))),
 
     def convolve(self, x, **kwargs):
+        if self.implementation == 'space_to_batch':
+            return self._convolve_space_to_batch(x)
         # we perform a convolution backward pass wrt weights,
         # passing kernels as output gradient
         imshp = self.input_shape
@@ -955,3 +1187,303 @@ class DilatedConv2DLayer(BaseConvLayer):
             output_size = self.get_output_shape_for(x.shape)[2:]
         conved = op(x.transpose(1, 0, 2, 3), self.W, output_size)
         return conved.transpose(1, 0, 2, 3)
+
+    def _convolve_space_to_batch(self, x):
+        if self.pad == 'same':
+            pad = tuple((k - 1) * d // 2
+                        for k, d in zip(self.filter_size, self.dilation))
+        elif self.pad == 'full':
+            pad = tuple((k - 1) * d
+                        for k, d in zip(self.filter_size, self.dilation))
+        else:
+            pad = self.pad
+        batch_size, channels = x.shape[0], x.shape[1]
+        dh, dw = self.dilation
+        out_rows, out_cols = self.get_output_shape_for(x.shape)[2:]
+
+        # zero-pad, with extra zeros up to a multiple of the dilation
+        rows = (x.shape[2] + 2 * pad[0] + dh - 1) // dh
+        cols = (x.shape[3] + 2 * pad[1] + dw - 1) // dw
+        padded = T.zeros((batch_size, channels, rows * dh, cols * dw),
+                         x.dtype)
+        padded = T.set_subtensor(padded[:, :, pad[0]:pad[0] + x.shape[2],
+                                        pad[1]:pad[1] + x.shape[3]], x)
+
+        # move the phases of the dilation into the batch axis
+        phases = padded.reshape((batch_size, channels, rows, dh, cols, dw))
+        phases = phases.dimshuffle(3, 5, 0, 1, 2, 4).reshape(
+                (dh * dw * batch_size, channels, rows, cols))
+        image_shape = None
+        if None not in self.input_shape:
+            image_shape = ((dh * dw * self.input_shape[0],
+                            self.input_shape[1]) +
+                           tuple(-(-(s + 2 * p) // d) for s, p, d in
+                                 zip(self.input_shape[2:], pad,
+                                     self.dilation)))
+        W_shape = self.get_W_shape()
+        conved = self.convolution(phases, self.W.dimshuffle(1, 0, 2, 3),
+                                  image_shape,
+                                  (W_shape[1], W_shape[0]) + W_shape[2:],
+                                  filter_flip=self.flip_filters)
+
+        # interleave the results of the phases again
+        conved = conved.reshape((dh, dw, batch_size, self.num_filters,
+                                 conved.shape[2], conved.shape[3]))
+        conved = conved.dimshuffle(2, 3, 4, 0, 5, 1)
+        conved = conved.reshape((batch_size, self.num_filters,
+                                 conved.shape[2] * dh, conved.shape[4] * dw))
+        return conved[:, :, :out_rows, :out_cols]
+
+
+class DepthwiseConv2DLayer(Conv2DLayer):
+    """
+    lasagne.layers.DepthwiseConv2DLayer(incoming, filter_size,
+    depth_multiplier=1, stride=(1, 1), pad=0, untie_biases=False,
+    W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
+    nonlinearity=lasagne.nonlinearities.rectify, flip_filters=True,
+    convolution=theano.tensor.nnet.conv2d, **kwargs)
+
+    2D depthwise convolutional layer
+
+    Convolves each input channel separately with `depth_multiplier` filters
+    of its own, then optionally adds a bias and applies an elementwise
+    nonlinearity. This is a :class:`Conv2DLayer` with `num_groups` equal to
+    the number of input channels, so all channels are convolved in a single
+    grouped convolution.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape. The
+        output of this layer should be a 4D tensor, with shape
+        ``(batch_size, num_input_channels, input_rows, input_columns)``.
+        The number of input channels must be known.
+
+    filter_size : int or iterable of int
+        An integer or a 2-element tuple specifying the size of the filters.
+
+    depth_multiplier : int (default: 1)
+        The number of filters per input channel. The layer has
+        ``num_input_channels * depth_multiplier`` output channels, with the
+        outputs of the filters for the first input channel coming first.
+
+    stride : int or iterable of int
+        An integer or a 2-element tuple specifying the stride of the
+        convolution operation.
+
+    pad : int, iterable of int, 'full', 'same' or 'valid' (default: 0)
+        The padding, see :class:`Conv2DLayer`.
+
+    untie_biases : bool (default: False)
+        If ``False``, the layer will have a bias parameter for each channel,
+        which is shared across all positions in this channel. As a result, the
+        `b` attribute will be a vector (1D).
+
+        If True, the layer will have separate bias parameters for each
+        position in each channel. As a result, the `b` attribute will be a
+        3D tensor.
+
+    W : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the weights.
+        These should be a 4D tensor with shape
+        ``(num_input_channels * depth_multiplier, 1, filter_rows,
+        filter_columns)``.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    b : Theano shared variable, expression, numpy array, callable or ``None``
+        Initial value, expression or initializer for the biases. If set to
+        ``None``, the layer will have no biases. Otherwise, biases should be
+        a 1D array with shape ``(num_input_channels * depth_multiplier,)`` if
+        `untied_biases` is set to ``False``. If it is set to ``True``, its
+        shape should be ``(num_input_channels * depth_multiplier,
+        output_rows, output_columns)`` instead.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    nonlinearity : callable or None
+        The nonlinearity that is applied to the layer activations. If None
+        is provided, the layer will be linear.
+
+    flip_filters : bool (default: True)
+        Whether to flip the filters before sliding them over the input,
+        performing a convolution (this is the default), or not to flip them and
+        perform a correlation.
+
+    convolution : callable
+        The convolution implementation to use. It must accept the
+        ``num_groups`` keyword argument of :func:`theano.tensor.nnet.conv2d`.
+
+    **kwargs
+        Any additional keyword arguments are passed to the `Layer` superclass.
+
+    Attributes
+    ----------
+    W : Theano shared variable or expression
+        Variable or expression representing the filter weights.
+
+    b : Theano shared variable or expression
+        Variable or expression representing the biases.
+    """
+    def __init__(self, incoming, filter_size, depth_multiplier=1,
+                 stride=(1, 1), pad=0, untie_biases=False,
+                 W=init.GlorotUniform(), b=init.Constant(0.),
+                 nonlinearity=nonlinearities.rectify, flip_filters=True,
+                 convolution=T.nnet.conv2d, **kwargs):
+        if isinstance(incoming, tuple):
+            input_shape = incoming
+        else:
+            input_shape = incoming.output_shape
+        if len(input_shape) != 4 or input_shape[1] is None:
+            raise ValueError("A DepthwiseConv2DLayer requires a 4D input "
+                             "with a known number of channels, got input "
+                             "shape %r" % (input_shape,))
+        self.depth_multiplier = depth_multiplier
+        super(DepthwiseConv2DLayer, self).__init__(
+            incoming, input_shape[1] * depth_multiplier, filter_size,
+            stride, pad, untie_biases, W, b, nonlinearity, flip_filters,
+            convolution, num_groups=input_shape[1], **kwargs)
+
+
+class SeparableConv2DLayer(BaseConvLayer):
+    """
+    lasagne.layers.SeparableConv2DLayer(incoming, num_filters, filter_size,
+    depth_multiplier=1, stride=(1, 1), pad=0, untie_biases=False,
+    W=lasagne.init.GlorotUniform(), W_pointwise=lasagne.init.GlorotUniform(),
+    b=lasagne.init.Constant(0.), nonlinearity=lasagne.nonlinearities.rectify,
+    flip_filters=True, convolution=theano.tensor.nnet.conv2d, **kwargs)
+
+    2D depthwise separable convolutional layer
+
+    Performs a depthwise convolution as :class:`DepthwiseConv2DLayer`,
+    followed by a pointwise (1x1) convolution mixing the channels, then
+    optionally adds a bias and applies an elementwise nonlinearity. This
+    approximates a :class:`Conv2DLayer` with far fewer parameters and
+    operations. The `num_groups` attribute gives the number of groups of the
+    depthwise convolution, i.e., the number of input channels.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape. The
+        output of this layer should be a 4D tensor, with shape
+        ``(batch_size, num_input_channels, input_rows, input_columns)``.
+        The number of input channels must be known.
+
+    num_filters : int
+        The number of pointwise filters, i.e., of output channels.
+
+    filter_size : int or iterable of int
+        An integer or a 2-element tuple specifying the size of the depthwise
+        filters.
+
+    depth_multiplier : int (default: 1)
+        The number of depthwise filters per input channel.
+
+    stride : int or iterable of int
+        An integer or a 2-element tuple specifying the stride of the
+        depthwise convolution.
+
+    pad : int, iterable of int, 'full', 'same' or 'valid' (default: 0)
+        The padding of the depthwise convolution, see :class:`Conv2DLayer`.
+
+    untie_biases : bool (default: False)
+        If ``False``, the layer will have a bias parameter for each channel,
+        which is shared across all positions in this channel. As a result, the
+        `b` attribute will be a vector (1D).
+
+        If True, the layer will have separate bias parameters for each
+        position in each channel. As a result, the `b` attribute will be a
+        3D tensor.
+
+    W : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the depthwise weights,
+        see :class:`DepthwiseConv2DLayer`.
+
+    W_pointwise : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the pointwise weights.
+        These should be a 4D tensor with shape ``(num_filters,
+        num_input_channels * depth_multiplier, 1, 1)``.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    b : Theano shared variable, expression, numpy array, callable or ``None``
+        Initial value, expression or initializer for the biases. If set to
+        ``None``, the layer will have no biases. Otherwise, biases should be
+        a 1D array with shape ``(num_filters,)`` if `untied_biases` is set to
+        ``False``. If it is set to ``True``, its shape should be
+        ``(num_filters, output_rows, output_columns)`` instead.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    nonlinearity : callable or None
+        The nonlinearity that is applied to the layer activations. If None
+        is provided, the layer will be linear.
+
+    flip_filters : bool (default: True)
+        Whether to flip the depthwise filters before sliding them over the
+        input, performing a convolution (this is the default), or not to flip
+        them and perform a correlation.
+
+    convolution : callable
+        The convolution implementation to use. It must accept the
+        ``num_groups`` keyword argument of :func:`theano.tensor.nnet.conv2d`.
+
+    **kwargs
+        Any additional keyword arguments are passed to the `Layer` superclass.
+
+    Attributes
+    ----------
+    W : Theano shared variable or expression
+        Variable or expression representing the depthwise filter weights.
+
+    W_pointwise : Theano shared variable or expression
+        Variable or expression representing the pointwise filter weights.
+
+    b : Theano shared variable or expression
+        Variable or expression representing the biases.
+    """
+    def __init__(self, incoming, num_filters, filter_size,
+                 depth_multiplier=1, stride=(1, 1), pad=0, untie_biases=False,
+                 W=init.GlorotUniform(), W_pointwise=init.GlorotUniform(),
+                 b=init.Constant(0.), nonlinearity=nonlinearities.rectify,
+                 flip_filters=True, convolution=T.nnet.conv2d, **kwargs):
+        if isinstance(incoming, tuple):
+            input_shape = incoming
+        else:
+            input_shape = incoming.output_shape
+        if len(input_shape) != 4 or input_shape[1] is None:
+            raise ValueError("A SeparableConv2DLayer requires a 4D input "
+                             "with a known number of channels, got input "
+                             "shape %r" % (input_shape,))
+        self.depth_multiplier = depth_multiplier
+        super(SeparableConv2DLayer, self).__init__(
+            incoming, num_filters, filter_size, stride, pad, untie_biases, W,
+            b, nonlinearity, flip_filters, n=2, num_groups=input_shape[1],
+            **kwargs)
+        self.W_pointwise = self.add_param(
+            W_pointwise, self.get_W_pointwise_shape(), name="W_pointwise")
+        self.convolution = convolution
+
+    def get_W_shape(self):
+        return (self.input_shape[1] * self.depth_multiplier, 1) + \
+            self.filter_size
+
+    def get_W_pointwise_shape(self):
+        """Get the shape of the pointwise weight matrix `W_pointwise`.
+
+        Returns
+        -------
+        tuple of int
+            The shape of the pointwise weight matrix.
+        """
+        return (self.num_filters, self.get_W_shape()[0], 1, 1)
+
+    def convolve(self, x, **kwargs):
+        border_mode = 'half' if self.pad == 'same' else self.pad
+        depthwise = self.convolution(x, self.W,
+                                     self.input_shape, self.get_W_shape(),
+                                     subsample=self.stride,
+                                     border_mode=border_mode,
+                                     filter_flip=self.flip_filters,
+                                     num_groups=self.num_groups)
+        depthwise_shape = ((self.input_shape[0], self.get_W_shape()[0]) +
+                           self.output_shape[2:])
+        return self.convolution(depthwise, self.W_pointwise,
+                                depthwise_shape, self.get_W_pointwise_shape())
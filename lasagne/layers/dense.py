@@ -1,4 +1,5 @@
 import numpy as np
+import theano.sparse
 import theano.tensor as T
 
 from .. import init
@@ -71,6 +72,15 @@ class DenseLayer(Layer):
     (None, 10, 50)
     >>> DenseLayer(l_in, num_units=50, num_leading_axes=-1).output_shape
     (None, 10, 20, 50)
+
+    The input can also be a sparse matrix, such as a batch of bag-of-words
+    vectors. For CSR matrices, only the rows of `W` matching nonzero columns
+    of the input are read, and only these rows receive a gradient, which
+    :func:`lasagne.updates.sgd` applies as a sparse update.
+
+    >>> l_in = InputLayer((None, 1000000), sparse='csr')
+    >>> DenseLayer(l_in, num_units=50).output_shape
+    (None, 50)
     """
     def __init__(self, incoming, num_units, W=init.GlorotUniform(),
                  b=init.Constant(0.), nonlinearity=nonlinearities.rectify,
@@ -120,12 +130,27 @@ class DenseLayer(Layer):
             # flatten trailing axes (into (n+1)-tensor for num_leading_axes=n)
             x = x.flatten(num_leading_axes + 1)
 
-        activation = T.dot(x, self.W)
+        if isinstance(x, theano.sparse.SparseVariable):
+            activation = _sparse_dot(x, self.W)
+        else:
+            activation = T.dot(x, self.W)
         if self.b is not None:
             activation = activation + self.b
         return self.nonlinearity(activation),
 
 
+def _sparse_dot(x, W):
+    # product of a sparse matrix with W; for CSR matrices, only the rows of W
+    # matching nonzero columns of x are read and receive a gradient
+    if x.format != 'csr':
+        return theano.sparse.structured_dot(x, W)
+    data, indices, indptr, shape = theano.sparse.csm_properties(x)
+    rows, columns = T.extra_ops.Unique(return_inverse=True)(indices)
+    x = theano.sparse.CSR(data, columns, indptr,
+                          T.stack([shape[0], rows.shape[0]]))
+    return theano.sparse.structured_dot(x, W[rows])
+
+
 class NINLayer(Layer):
     """
     lasagne.layers.NINLayer(incoming, num_units, untie_biases=False,
@@ -6,7 +6,8 @@ from .base import Layer
 
 
 __all__ = [
-    "EmbeddingLayer"
+    "EmbeddingLayer",
+    "EmbeddingBagLayer",
 ]
 
 
@@ -80,3 +81,132 @@ class EmbeddingLayer(Layer):
             W = T.concatenate((T.zeros((self.zero_out, self.output_size)),
                                self.W), axis=0)
         return tuple(W[i] for i in inputs)
+
+
+class EmbeddingBagLayer(Layer):
+    """
+    lasagne.layers.EmbeddingBagLayer(incoming, input_size, output_size,
+    mode='mean', offsets=None, mask_input=None, W=lasagne.init.Normal(),
+    **kwargs)
+
+    A layer pooling the embeddings of bags of ids.
+
+    Computes the sum, mean or maximum of the embeddings of each bag directly,
+    without an intermediate tensor holding the embeddings of all padded
+    positions (except for ``mode='max'``, see the notes). The bags are given
+    either as a flat vector of ids with the offsets at which each bag starts,
+    or as a padded matrix of ids with a mask.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding the ids, or the expected input shape. This is an
+        integer vector of the concatenated bags if `offsets` is given, and an
+        integer matrix of shape ``(num_bags, max_bag_size)`` otherwise.
+
+    input_size: int
+        The number of different embeddings.
+
+    output_size : int
+        The size of each embedding.
+
+    mode : {'sum', 'mean', 'max'}
+        How to pool the embeddings of a bag. Empty bags give zeros.
+
+    offsets : a :class:`Layer` instance, a tuple or None
+        The layer feeding an integer vector with the position in the ids at
+        which each bag starts, or its expected shape. The first offset must
+        be zero.
+
+    mask_input : a :class:`Layer` instance, a tuple or None
+        The layer feeding a matrix of the shape of the padded ids, nonzero
+        where an id belongs to its bag, or its expected shape. If neither
+        `offsets` nor `mask_input` is given, all ids of each row are used.
+
+    W : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the embedding matrix.
+        This should be a matrix with shape ``(input_size, output_size)``.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    Examples
+    --------
+    >>> from lasagne.layers import EmbeddingBagLayer, InputLayer, get_output
+    >>> import theano
+    >>> l_ids = InputLayer((None, ), dtype='int32')
+    >>> l_offsets = InputLayer((None, ), dtype='int32')
+    >>> W = np.arange(3*2).reshape((3, 2)).astype('float32')
+    >>> l1 = EmbeddingBagLayer(l_ids, input_size=3, output_size=2,
+    ...                        mode='sum', offsets=l_offsets, W=W)
+    >>> output = get_output(l1)
+    >>> f = theano.function([l_ids.input_var, l_offsets.input_var], output)
+    >>> f(np.array([0, 2, 1, 1, 2], 'int32'), np.array([0, 2], 'int32'))
+    array([[ 4.,  6.],
+           [ 8., 11.]], dtype=float32)
+
+    Notes
+    -----
+    The gradient with respect to `W` only increments the rows of the ids in
+    the batch, which :func:`lasagne.updates.sgd` applies as a sparse update.
+
+    For ``mode='max'``, the embeddings are scattered into a tensor of shape
+    ``(num_bags, max_bag_size, output_size)`` before taking the maximum.
+    """
+    def __init__(self, incoming, input_size, output_size, mode='mean',
+                 offsets=None, mask_input=None, W=init.Normal(), **kwargs):
+        if mode not in ('sum', 'mean', 'max'):
+            raise ValueError("mode must be 'sum', 'mean' or 'max', got %r"
+                             % (mode, ))
+        if offsets is not None and mask_input is not None:
+            raise ValueError("cannot give both offsets and mask_input")
+        incoming = (incoming, )
+        if offsets is not None:
+            incoming += (offsets, )
+        if mask_input is not None:
+            incoming += (mask_input, )
+        super(EmbeddingBagLayer, self).__init__(incoming, max_inputs=2,
+                                                **kwargs)
+        self.input_size = input_size
+        self.output_size = output_size
+        self.mode = mode
+        self.offsets = offsets is not None
+        self.mask = mask_input is not None
+        self.W = self.add_param(W, (input_size, output_size), name="W")
+
+    def get_output_shapes_for(self, input_shapes):
+        num_bags = input_shapes[1 if self.offsets else 0][0]
+        return (num_bags, self.output_size),
+
+    def get_outputs_for(self, inputs, **kwargs):
+        ids = inputs[0]
+        if self.offsets:
+            offsets = inputs[1]
+            num_bags = offsets.shape[0]
+            # bag of each id: count the offsets up to its position
+            bags = T.inc_subtensor(
+                T.zeros((ids.shape[0] + 1, ), 'int64')[offsets[1:]],
+                1)[:-1].cumsum()
+            positions = T.arange(ids.shape[0]) - offsets[bags]
+            max_size = T.max(T.concatenate([offsets[1:], ids.shape[:1]]) -
+                             offsets)
+        else:
+            num_bags, max_size = ids.shape[0], ids.shape[1]
+            indices = T.arange(ids.size)
+            if self.mask:
+                indices = inputs[1].flatten().nonzero()[0]
+            ids = ids.flatten()[indices]
+            bags = indices // max_size
+            positions = indices % max_size
+        embeddings = self.W[ids]
+
+        counts = T.inc_subtensor(T.zeros((num_bags, ), 'int64')[bags], 1)
+        if self.mode == 'max':
+            padded = T.alloc(np.array(-np.inf, dtype=embeddings.dtype),
+                             num_bags, max_size, self.output_size)
+            padded = T.set_subtensor(padded[bags, positions], embeddings)
+            pooled = T.switch(counts[:, None] > 0, padded.max(axis=1), 0)
+        else:
+            pooled = T.zeros((num_bags, self.output_size), embeddings.dtype)
+            pooled = T.inc_subtensor(pooled[bags], embeddings)
+            if self.mode == 'mean':
+                pooled /= T.maximum(counts, 1)[:, None].astype(pooled.dtype)
+        return pooled,
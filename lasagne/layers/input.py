@@ -1,6 +1,7 @@
 from collections import OrderedDict
 
 import theano
+import theano.sparse
 import theano.tensor as T
 
 from .base import Layer
@@ -27,10 +28,16 @@ class InputLayer(Layer):
         A variable representing a network input. If it is not provided, a
         variable will be created.
 
+    sparse : {'csr', 'csc'} or `None` (default: `None`)
+        If given, the created variable is a :mod:`theano.sparse` matrix of
+        this format instead of a dense tensor. Only two-dimensional shapes
+        are supported.
+
     Raises
     ------
     ValueError
-        If the dimension of `input_var` is not equal to `len(shape)`
+        If the dimension of `input_var` is not equal to `len(shape)`, or if
+        a sparse input is requested for a shape that is not two-dimensional
 
     Notes
     -----
@@ -44,8 +51,15 @@ class InputLayer(Layer):
     --------
     >>> from lasagne.layers import InputLayer
     >>> l_in = InputLayer((100, 20))
+
+    A batch of sparse bag-of-words vectors:
+
+    >>> l_in = InputLayer((None, 1000000), sparse='csr')
+    >>> l_in.input_var.format
+    'csr'
     """
-    def __init__(self, shape, input_var=None, name=None, dtype=None, **kwargs):
+    def __init__(self, shape, input_var=None, name=None, dtype=None,
+                 sparse=None, **kwargs):
         self.shape = tuple(shape)
         if any(d is not None and d <= 0 for d in self.shape):
             raise ValueError(("Cannot create InputLayer with a non-positive "
@@ -53,7 +67,14 @@ class InputLayer(Layer):
                              (self.shape, name))
 
         ndim = len(self.shape)
-        if input_var is None:
+        if input_var is None and sparse is not None:
+            if ndim != 2:
+                raise ValueError("sparse inputs must be two-dimensional, got "
+                                 "shape %r" % (self.shape, ))
+            dtype = theano.config.floatX if dtype is None else dtype
+            var_name = ("%s.input" % name) if name is not None else "input"
+            input_var = theano.sparse.matrix(sparse, var_name, dtype)
+        elif input_var is None:
             # create the right TensorType for the given dimensionality/shape
             dtype = theano.config.floatX if dtype is None else dtype
             input_var_type = T.TensorType(dtype, [s == 1 for s in self.shape])
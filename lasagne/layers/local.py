@@ -1,3 +1,4 @@
+import numpy as np
 import theano.tensor as T
 
 from .. import init
@@ -17,7 +18,7 @@ class LocallyConnected2DLayer(Conv2DLayer):
     stride=(1, 1), pad='same', untie_biases=False,
     W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
     nonlinearity=lasagne.nonlinearities.rectify, flip_filters=True,
-    channelwise=False, **kwargs)
+    channelwise=False, implementation='shift', **kwargs)
 
     2D locally connected layer
 
@@ -93,6 +94,16 @@ class LocallyConnected2DLayer(Conv2DLayer):
         In this case, the number of output channels (i.e. number of filters)
         should be equal to the number of input channels.
 
+    implementation : {'shift', 'im2col'} (default: 'shift')
+        How to compute the output. ``'shift'`` adds up the products of the
+        filter weights with shifted versions of the input, building a graph
+        that grows with the filter size. ``'im2col'`` gathers all input
+        patches with a single indexing operation and multiplies them with the
+        weights in a single batched matrix product over the output
+        positions, which compiles faster and usually runs faster, especially
+        in the backward pass, but needs memory for ``filter_rows *
+        filter_columns`` copies of the input.
+
     **kwargs
         Any additional keyword arguments are passed to the `Layer` superclass.
 
@@ -106,8 +117,6 @@ class LocallyConnected2DLayer(Conv2DLayer):
 
     Notes
     -----
-    This implementation computes the output tensor by iterating over the filter
-    weights and multiplying them with shifted versions of the input tensor.
     This implementation assumes no stride, 'same' padding and no dilation.
 
     Raises
@@ -120,8 +129,12 @@ class LocallyConnected2DLayer(Conv2DLayer):
                  pad='same', untie_biases=False,
                  W=init.GlorotUniform(), b=init.Constant(0.),
                  nonlinearity=nonlinearities.rectify, flip_filters=True,
-                 channelwise=False, **kwargs):
+                 channelwise=False, implementation='shift', **kwargs):
         self.channelwise = channelwise
+        if implementation not in ('shift', 'im2col'):
+            raise ValueError("implementation must be 'shift' or 'im2col', "
+                             "got %r" % (implementation,))
+        self.implementation = implementation
         super(LocallyConnected2DLayer, self).__init__(
             incoming, num_filters, filter_size, stride=stride, pad=pad,
             untie_biases=untie_biases, W=W, b=b, nonlinearity=nonlinearity,
@@ -157,6 +170,8 @@ class LocallyConnected2DLayer(Conv2DLayer):
                    self.filter_size + output_shape[-2:]
 
     def convolve(self, input, **kwargs):
+        if self.implementation == 'im2col':
+            return self._convolve_im2col(input)
         output_shape = self.output_shape
 
         # start with ii == jj == 0 case to initialize tensor
@@ -200,3 +215,48 @@ class LocallyConnected2DLayer(Conv2DLayer):
                 conved = T.inc_subtensor(
                     conved[:, :, output_h_slice, output_w_slice], inc)
         return conved
+
+    def _im2col_indices(self):
+        # indices into the flattened input of the (channels, filter_rows,
+        # filter_columns) patch at each output position, pointing to one
+        # past the end for positions in the zero padding
+        channels, rows, cols = self.input_shape[1:]
+        filter_rows, filter_cols = self.filter_size
+        i, j, c, di, dj = np.ix_(np.arange(rows), np.arange(cols),
+                                 np.arange(channels), np.arange(filter_rows),
+                                 np.arange(filter_cols))
+        i = i + di - filter_rows // 2
+        j = j + dj - filter_cols // 2
+        indices = (c * rows + i) * cols + j
+        valid = (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+        return np.where(valid, indices, channels * rows * cols).ravel()
+
+    def _convolve_im2col(self, input):
+        channels, rows, cols = self.input_shape[1:]
+        filter_rows, filter_cols = self.filter_size
+        patch_size = filter_rows * filter_cols
+        W = self.W
+        if self.flip_filters:
+            W = W[(slice(None),) * (W.ndim - 4) + (slice(None, None, -1),) * 2]
+
+        # (channels * rows * cols + 1, batch), with a final row of zeros
+        columns = input.reshape((input.shape[0], -1)).T
+        columns = T.concatenate([columns, T.zeros_like(columns[:1])])
+        patches = columns[self._im2col_indices()]
+
+        if self.channelwise:
+            # one product per output position and channel
+            patches = patches.reshape((rows * cols * channels, patch_size,
+                                       -1))
+            W = W.dimshuffle(3, 4, 0, 'x', 1, 2).reshape(
+                    (rows * cols * channels, 1, patch_size))
+        else:
+            # one product per output position, over the whole patch
+            patches = patches.reshape((rows * cols, channels * patch_size,
+                                       -1))
+            W = W.dimshuffle(4, 5, 0, 1, 2, 3).reshape(
+                    (rows * cols, self.num_filters, channels * patch_size))
+        conved = T.batched_dot(W, patches)
+        conved = conved.reshape((rows * cols, self.num_filters, -1))
+        return conved.dimshuffle(2, 1, 0).reshape(
+                (input.shape[0], self.num_filters, rows, cols))
@@ -2,9 +2,7 @@ import theano
 import theano.tensor as T
 
 from .base import Layer
-from ..random import get_rng
-
-from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
+from ..random import create_streams
 
 
 __all__ = [
@@ -71,7 +69,7 @@ class DropoutLayer(Layer):
     def __init__(self, incoming, p=0.5, rescale=True, shared_axes=(),
                  **kwargs):
         super(DropoutLayer, self).__init__(incoming, **kwargs)
-        self._srng = RandomStreams(get_rng().randint(1, 2147462579))
+        self._srng = create_streams(self.name)
         self.p = p
         self.rescale = rescale
         self.shared_axes = tuple(shared_axes)
@@ -79,7 +77,7 @@ class DropoutLayer(Layer):
     def get_outputs_for(self, inputs, deterministic=False, **kwargs):
         x = inputs[0]
         if deterministic or self.p == 0:
-            return x
+            return (x, )
         else:
             # Using theano constant to prevent upcasting
             one = T.constant(1)
@@ -194,7 +192,7 @@ class GaussianNoiseLayer(Layer):
     """
     def __init__(self, incoming, sigma=0.1, **kwargs):
         super(GaussianNoiseLayer, self).__init__(incoming, **kwargs)
-        self._srng = RandomStreams(get_rng().randint(1, 2147462579))
+        self._srng = create_streams(self.name)
         self.sigma = sigma
 
     def get_outputs_for(self, inputs, deterministic=False, **kwargs):
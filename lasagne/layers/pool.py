@@ -6,11 +6,15 @@ from ..utils import as_tuple
 __all__ = [
     "MaxPool1DLayer",
     "MaxPool2DLayer",
+    "MaxPool3DLayer",
     "Pool1DLayer",
     "Pool2DLayer",
+    "Pool3DLayer",
     "Upscale1DLayer",
     "Upscale2DLayer",
     "Upscale3DLayer",
+    "PixelShuffleLayer",
+    "pixel_shuffle_upsample",
     "FeaturePoolLayer",
     "FeatureWTALayer",
     "GlobalPoolLayer",
@@ -284,6 +288,107 @@ class Pool2DLayer(Layer):
         return pooled,
 
 
+class Pool3DLayer(Layer):
+    """
+    3D pooling layer
+
+    Performs 3D mean or max-pooling over the three trailing axes
+    of a 5D input tensor.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or tuple
+        The layer feeding into this layer, or the expected input shape.
+
+    pool_size : integer or iterable
+        The length of the pooling region in each dimension.  If an integer, it
+        is promoted to a cubic pooling region. If an iterable, it should have
+        three elements.
+
+    stride : integer, iterable or ``None``
+        The strides between sucessive pooling regions in each dimension.
+        If ``None`` then ``stride = pool_size``.
+
+    pad : integer or iterable
+        Number of elements to be added on each side of the input
+        in each dimension. Each value must be less than
+        the corresponding stride.
+
+    ignore_border : bool
+        If ``True``, partial pooling regions will be ignored.
+        Must be ``True`` if ``pad != (0, 0, 0)``.
+
+    mode : {'max', 'average_inc_pad', 'average_exc_pad'}
+        Pooling mode: max-pooling or mean-pooling including/excluding zeros
+        from partially padded pooling regions. Default is 'max'.
+
+    **kwargs
+        Any additional keyword arguments are passed to the :class:`Layer`
+        superclass.
+
+    See Also
+    --------
+    MaxPool3DLayer : Shortcut for max pooling layer.
+
+    Notes
+    -----
+    The value used to pad the input is chosen to be less than
+    the minimum of the input, so that the output of each pooling region
+    always corresponds to some element in the unpadded input region.
+
+    Unlike :class:`lasagne.layers.dnn.Pool3DDNNLayer`, this layer does not
+    require cuDNN; Theano runs it on the CPU or replaces it with a cuDNN
+    implementation when compiling for a GPU.
+    """
+
+    def __init__(self, incoming, pool_size, stride=None, pad=(0, 0, 0),
+                 ignore_border=True, mode='max', **kwargs):
+        super(Pool3DLayer, self).__init__(incoming, **kwargs)
+
+        self.pool_size = as_tuple(pool_size, 3)
+
+        if len(self.input_shape) != 5:
+            raise ValueError("Tried to create a 3D pooling layer with "
+                             "input shape %r. Expected 5 input dimensions "
+                             "(batchsize, channels, 3 spatial dimensions)."
+                             % (self.input_shape,))
+
+        if stride is None:
+            self.stride = self.pool_size
+        else:
+            self.stride = as_tuple(stride, 3)
+
+        self.pad = as_tuple(pad, 3)
+
+        self.ignore_border = ignore_border
+        self.mode = mode
+
+    def get_output_shapes_for(self, input_shapes):
+        input_shape = input_shapes[0]
+        output_shape = list(input_shape)  # copy / convert to mutable list
+
+        for axis in range(3):
+            output_shape[2 + axis] = pool_output_length(
+                input_shape[2 + axis],
+                pool_size=self.pool_size[axis],
+                stride=self.stride[axis],
+                pad=self.pad[axis],
+                ignore_border=self.ignore_border,
+            )
+
+        return tuple(output_shape),
+
+    def get_outputs_for(self, inputs, **kwargs):
+        pooled = T.signal.pool.pool_3d(inputs[0],
+                                       ws=self.pool_size,
+                                       stride=self.stride,
+                                       ignore_border=self.ignore_border,
+                                       pad=self.pad,
+                                       mode=self.mode,
+                                       )
+        return pooled,
+
+
 class MaxPool1DLayer(Pool1DLayer):
     """
     1D max-pooling layer
@@ -389,8 +494,58 @@ class MaxPool2DLayer(Pool2DLayer):
                                              mode='max',
                                              **kwargs)
 
+
+class MaxPool3DLayer(Pool3DLayer):
+    """
+    3D max-pooling layer
+
+    Performs 3D max-pooling over the three trailing axes of a 5D input tensor.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or tuple
+        The layer feeding into this layer, or the expected input shape.
+
+    pool_size : integer or iterable
+        The length of the pooling region in each dimension.  If an integer, it
+        is promoted to a cubic pooling region. If an iterable, it should have
+        three elements.
+
+    stride : integer, iterable or ``None``
+        The strides between sucessive pooling regions in each dimension.
+        If ``None`` then ``stride = pool_size``.
+
+    pad : integer or iterable
+        Number of elements to be added on each side of the input
+        in each dimension. Each value must be less than
+        the corresponding stride.
+
+    ignore_border : bool
+        If ``True``, partial pooling regions will be ignored.
+        Must be ``True`` if ``pad != (0, 0, 0)``.
+
+    **kwargs
+        Any additional keyword arguments are passed to the :class:`Layer`
+        superclass.
+
+    Notes
+    -----
+    The value used to pad the input is chosen to be less than
+    the minimum of the input, so that the output of each pooling region
+    always corresponds to some element in the unpadded input region.
+    """
+
+    def __init__(self, incoming, pool_size, stride=None, pad=(0, 0, 0),
+                 ignore_border=True, **kwargs):
+        super(MaxPool3DLayer, self).__init__(incoming,
+                                             pool_size,
+                                             stride,
+                                             pad,
+                                             ignore_border,
+                                             mode='max',
+                                             **kwargs)
+
 # TODO: add reshape-based implementation to MaxPool*DLayer
-# TODO: add MaxPool3DLayer
 
 
 class Upscale1DLayer(Layer):
@@ -594,6 +749,156 @@ class Upscale3DLayer(Layer):
         return upscaled,
 
 
+class PixelShuffleLayer(Layer):
+    """
+    2D pixel shuffle layer
+
+    Rearranges the channels of a 4D input tensor into blocks of the two
+    trailing axes, from shape ``(N, C*r*r, H, W)`` to ``(N, C, H*r, W*r)``
+    for a scale factor ``r`` [1]_. Channel ``c*r*r + i*r + j`` of the input
+    is placed at row offset ``i`` and column offset ``j`` of the blocks of
+    output channel ``c``. Preceded by a convolution, this upscales feature
+    maps with filters learned for each subpixel position, while computing
+    the convolution at the low resolution.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or tuple
+        The layer feeding into this layer, or the expected input shape.
+
+    scale_factor : integer or iterable
+        The scale factor in each dimension. If an integer, it is promoted to
+        a square scale factor region. If an iterable, it should have two
+        elements.
+
+    **kwargs
+        Any additional keyword arguments are passed to the :class:`Layer`
+        superclass.
+
+    See Also
+    --------
+    pixel_shuffle_upsample : Builds a convolution followed by a pixel shuffle
+
+    References
+    ----------
+    .. [1] Shi, W., Caballero, J., Huszar, F., Totz, J., Aitken, A. P.,
+           Bishop, R., Rueckert, D., Wang, Z. (2016):
+           Real-Time Single Image and Video Super-Resolution Using an
+           Efficient Sub-Pixel Convolutional Neural Network. CVPR 2016.
+           https://arxiv.org/abs/1609.05158
+    """
+
+    def __init__(self, incoming, scale_factor, **kwargs):
+        super(PixelShuffleLayer, self).__init__(incoming, **kwargs)
+
+        self.scale_factor = as_tuple(scale_factor, 2)
+
+        if self.scale_factor[0] < 1 or self.scale_factor[1] < 1:
+            raise ValueError('Scale factor must be >= 1, not {0}'.format(
+                self.scale_factor))
+
+        if len(self.input_shape) != 4:
+            raise ValueError("Tried to create a PixelShuffleLayer with an "
+                             "input shape of %r, but it requires 4D input"
+                             % (self.input_shape, ))
+        num_channels = self.input_shape[1]
+        block = self.scale_factor[0] * self.scale_factor[1]
+        if num_channels is not None and num_channels % block:
+            raise ValueError("Number of input channels (%d) must be divisible "
+                             "by the product of the scale factor %r"
+                             % (num_channels, self.scale_factor))
+
+    def get_output_shapes_for(self, input_shapes):
+        input_shape = input_shapes[0]
+        a, b = self.scale_factor
+        output_shape = list(input_shape)  # copy / convert to mutable list
+        if output_shape[1] is not None:
+            output_shape[1] //= a * b
+        if output_shape[2] is not None:
+            output_shape[2] *= a
+        if output_shape[3] is not None:
+            output_shape[3] *= b
+        return tuple(output_shape),
+
+    def get_outputs_for(self, inputs, **kwargs):
+        x = inputs[0]
+        a, b = self.scale_factor
+        if a == b == 1:
+            return x,
+        N, C, H, W = x.shape
+        shuffled = x.reshape((N, C // (a * b), a, b, H, W))
+        shuffled = shuffled.dimshuffle(0, 1, 4, 2, 5, 3)
+        return shuffled.reshape((N, C // (a * b), H * a, W * b)),
+
+
+def pixel_shuffle_upsample(incoming, num_filters, scale_factor,
+                           filter_size=3, pad='same', W=None, **kwargs):
+    """
+    Convenience function to build a subpixel convolution upsampler.
+
+    Adds a :class:`Conv2DLayer` computing ``num_filters`` times the product
+    of the scale factor channels, followed by a :class:`PixelShuffleLayer`
+    rearranging them into `num_filters` channels upscaled by `scale_factor`.
+    By default, the filters are initialized with
+    :class:`lasagne.init.ICNR`, so the initial output is a nearest-neighbour
+    upscaling of the output of a convolution with `num_filters` filters,
+    free of the checkerboard artifacts of a random initialization [1]_.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        the layer feeding into this layer, or the expected input shape
+    num_filters : int
+        The number of channels of the upscaled output.
+    scale_factor : integer or iterable
+        The scale factor, as for :class:`PixelShuffleLayer`.
+    filter_size : int or iterable of int
+        The filter size of the convolution.
+    pad : int, iterable of int, 'full', 'same' or 'valid' (default: 'same')
+        The padding of the convolution.
+    W : Theano shared variable, expression, numpy array, callable or None
+        Initial value, expression or initializer for the weights of the
+        convolution. If ``None``, uses ``ICNR(scale_factor)``.
+    **kwargs
+        Any additional keyword arguments are passed on to the
+        :class:`Conv2DLayer` constructor. A `name` is given to the
+        convolution, and with ``'_shuffle'`` appended to the pixel shuffle.
+
+    Returns
+    -------
+    layer : :class:`PixelShuffleLayer` instance
+        The pixel shuffle layer stacked on the convolution.
+
+    Examples
+    --------
+    >>> from lasagne.layers import InputLayer, pixel_shuffle_upsample
+    >>> l_in = InputLayer((None, 16, 32, 32))
+    >>> l_up = pixel_shuffle_upsample(l_in, num_filters=8, scale_factor=2)
+    >>> l_up.output_shape
+    (None, 8, 64, 64)
+    >>> l_up.input_layers[0].num_filters
+    32
+
+    References
+    ----------
+    .. [1] Aitken, A., Ledig, C., Theis, L., Caballero, J., Wang, Z., Shi, W.
+           (2017): Checkerboard artifact free sub-pixel convolution: A note on
+           sub-pixel convolution, resize convolution and convolution resize.
+           https://arxiv.org/abs/1707.02937
+    """
+    from .conv import Conv2DLayer
+    from .. import init
+    scale_factor = as_tuple(scale_factor, 2)
+    if W is None:
+        W = init.ICNR(scale_factor)
+    name = kwargs.pop('name', None)
+    layer = Conv2DLayer(incoming, num_filters * scale_factor[0] *
+                        scale_factor[1], filter_size, pad=pad, W=W,
+                        name=name, **kwargs)
+    return PixelShuffleLayer(layer, scale_factor,
+                             name=name and name + '_shuffle')
+
+
 class FeaturePoolLayer(Layer):
     """
     lasagne.layers.FeaturePoolLayer(incoming, pool_size, axis=1,
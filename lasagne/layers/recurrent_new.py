@@ -59,6 +59,7 @@ import theano.tensor as T
 from .. import nonlinearities
 from .. import init
 from .. import utils
+from ..random import create_streams
 
 from .base import Layer, IndexLayer
 from .dense import DenseLayer
@@ -237,6 +238,12 @@ class RecurrenceLayer(Layer):
             inputs = tuple(i.dimshuffle(*((1, 0) + tuple(range(2, i.ndim))))
                            for i in inputs)
 
+        # Variational dropout masks are sampled once for the whole sequence
+        step_l = self.inner_layers["step"]
+        input_masks, hidden_mask = step_l.get_dropout_masks(inputs, **kwargs)
+        if input_masks is not None:
+            inputs = tuple(i * m for i, m in zip(inputs, input_masks))
+
         raw_inputs = inputs
         if self.pre_compute_input:
             layer = self.inner_layers["in_to_hid"]
@@ -253,11 +260,19 @@ class RecurrenceLayer(Layer):
         if self.pass_raw_and_computed:
             inputs = raw_inputs + inputs
         ns = tuple(i.shape[1] for i in inputs)
-        step_l = self.inner_layers["step"]
+        inits = step_l.get_inits(ns)
+        non_sequences = self.get_params()
+        if hidden_mask is not None:
+            # The mask is passed as the first non sequence
+            non_sequences = [hidden_mask] + non_sequences
+            mask_index = len(inputs) + len(inits)
 
         def step(*args):
+            step_kwargs = kwargs
+            if hidden_mask is not None:
+                step_kwargs = dict(kwargs, hidden_mask=args[mask_index])
             if self.pre_compute_input:
-                return step_l.get_outputs_for(args, **kwargs)
+                return step_l.get_outputs_for(args, **step_kwargs)
             else:
                 n = len(self.input_shapes)
                 raw_inputs = args[:n] if self.pass_raw_and_computed else ()
@@ -269,7 +284,7 @@ class RecurrenceLayer(Layer):
                 inputs = helper.get_outputs(layer, dict(zip(input_layers,
                                                             args[s1n:s2n])))
                 args = raw_inputs + inputs + args[s2n:]
-                return step_l.get_outputs_for(args, **kwargs)
+                return step_l.get_outputs_for(args, **step_kwargs)
         if self.unroll_scan:
             if self.gradient_steps != -1:
                 raise ValueError("unroll_scan does not support "
@@ -281,16 +296,16 @@ class RecurrenceLayer(Layer):
             outputs = utils.unroll_scan(
                 fn=step,
                 sequences=inputs,
-                outputs_info=step_l.get_inits(ns),
-                non_sequences=self.get_params(),
+                outputs_info=inits,
+                non_sequences=non_sequences,
                 go_backwards=self.backwards,
                 n_steps=n_steps)
         else:
             outputs, _ = theano.scan(
                 fn=step,
                 sequences=inputs,
-                outputs_info=step_l.get_inits(ns),
-                non_sequences=self.get_params(),
+                outputs_info=inits,
+                non_sequences=non_sequences,
                 go_backwards=self.backwards,
                 truncate_gradient=self.gradient_steps,
                 return_list=True,
@@ -299,11 +314,11 @@ class RecurrenceLayer(Layer):
         # If backwards reverse and if only_return_final index
         if self.backwards:
             if self.only_return_final:
-                outputs = (o[0] for o in outputs)
+                outputs = tuple(o[0] for o in outputs)
             else:
-                outputs = (o[::-1] for o in outputs)
+                outputs = tuple(o[::-1] for o in outputs)
         elif self.only_return_final:
-            outputs = (o[-1] for o in outputs)
+            outputs = tuple(o[-1] for o in outputs)
 
         # Correct order
         if self.out_order == "NTD" and not self.only_return_final:
@@ -318,6 +333,72 @@ class RecurrenceLayer(Layer):
                                                          outputs)))
         return outputs
 
+    def get_step_inits(self, batch_size):
+        """
+        Returns the initial states of the step layer for a given batch size.
+
+        Parameters
+        ----------
+        batch_size : int or Theano scalar
+            The number of sequences processed in parallel.
+
+        Returns
+        -------
+        list of Theano expressions
+            The initial states, as used for the ``outputs_info`` of the scan.
+        """
+        return self.inner_layers["step"].get_inits((batch_size, ))
+
+    def get_step_outputs_for(self, inputs, states, **kwargs):
+        """
+        Computes a single step of the recurrence, without looping over time.
+
+        The `inputs` are passed through the `in_to_hid` layer (if any) and
+        then, together with the `states` of the previous step, through the
+        step layer. This is the same computation performed inside the scan of
+        :meth:`get_outputs_for`, which makes it possible to run the recurrence
+        incrementally, e.g. for decoding one token at a time.
+
+        Parameters
+        ----------
+        inputs : tuple of Theano expressions
+            The inputs for the current step, in the loop shape of the layer
+            (i.e. without the time axis).
+
+        states : tuple of Theano expressions
+            The states of the previous step, as returned by
+            :meth:`get_step_inits` or a previous call to this method.
+
+        Returns
+        -------
+        outputs : tuple of Theano expressions
+            The outputs of the step after applying the `hid_to_out` layer.
+
+        states : tuple of Theano expressions
+            The new states of the recurrence.
+        """
+        inputs = tuple(inputs)
+        raw_inputs = inputs
+        layer = self.inner_layers.get("in_to_hid")
+        if layer is not None:
+            input_layers = (l for l in helper.get_all_layers(layer)
+                            if isinstance(l, InputLayer))
+            inputs = tuple(helper.get_outputs(layer, dict(zip(input_layers,
+                                                              inputs))))
+        if self.pass_raw_and_computed:
+            inputs = raw_inputs + inputs
+        step_l = self.inner_layers["step"]
+        states = tuple(step_l.get_outputs_for(inputs + tuple(states),
+                                              **kwargs))
+        outputs = states
+        layer = self.inner_layers.get("hid_to_out", None)
+        if layer:
+            output_layers = (l for l in helper.get_all_layers(layer)
+                             if isinstance(l, InputLayer))
+            outputs = tuple(helper.get_outputs(layer, dict(zip(output_layers,
+                                                               states))))
+        return outputs, states
+
     def get_loop_shapes(self, shapes, order=None):
         order = self.in_order if order is None else order
         shapes = utils.shape_to_tuple(shapes)
@@ -477,8 +558,32 @@ class AbstractStepLayer(Layer):
         Whether we should take gradients with respect to the
         initializations of the recurrence.
 
+    dropout_input : float or scalar tensor
+        The probability of dropping an input feature. The same dropout mask
+        is used for all steps of a sequence (variational dropout [1]_).
+
+    dropout_hidden : float or scalar tensor
+        The probability of dropping a unit of the hidden state before it is
+        multiplied with the recurrent weights. The same dropout mask is used
+        for all steps of a sequence.
+
     kwargs : dictionary
         Any extra parameters passed to :class:`lasagne.layers.Layer`
+
+    Notes
+    -----
+    The dropout masks are sampled once per batch before the loop, by
+    :meth:`get_dropout_masks`, and passed to the scan as non sequences. This
+    avoids sampling inside the scan, as happens when a
+    :class:`lasagne.layers.DropoutLayer` is part of the step function.
+    Dropout is disabled when passing ``deterministic=True`` to
+    :func:`lasagne.layers.get_output`.
+
+    References
+    ----------
+    .. [1] Gal, Yarin, and Zoubin Ghahramani (2016):
+           A Theoretically Grounded Application of Dropout in Recurrent
+           Neural Networks. NIPS 2016.
     """
 
     def __init__(self,
@@ -490,6 +595,8 @@ class AbstractStepLayer(Layer):
                  no_bias=False,
                  learn_init=True,
                  post_indexes=None,
+                 dropout_input=0.,
+                 dropout_hidden=0.,
                  **kwargs):
         super(AbstractStepLayer, self).__init__(incoming, **kwargs)
         self.num_x_to_h = num_x_to_h
@@ -499,6 +606,9 @@ class AbstractStepLayer(Layer):
         self.no_bias = no_bias
         self.learn_init = learn_init
         self.post_indexes = post_indexes
+        self.dropout_input = dropout_input
+        self.dropout_hidden = dropout_hidden
+        self._srng = create_streams(self.name)
         self.init = []
 
     def add_init_param(self, param, shape, name=None, f=None, **kwargs):
@@ -538,10 +648,55 @@ class AbstractStepLayer(Layer):
             inits.append(p)
         return inits
 
+    def get_dropout_masks(self, inputs, deterministic=False, **kwargs):
+        """
+        Samples the variational dropout masks for a batch of sequences.
+
+        Parameters
+        ----------
+        inputs : tuple of Theano expressions
+            The raw inputs of the recurrence in TND order.
+
+        deterministic : bool
+            If ``True`` no masks are sampled.
+
+        Returns
+        -------
+        input_masks : tuple of Theano expressions or None
+            One mask for each input, broadcastable across the time axis, or
+            ``None`` if there is no input dropout.
+
+        hidden_mask : Theano expression or None
+            The mask for the hidden state, of shape
+            ``(batch_size, num_units)``, or ``None`` if there is no hidden
+            dropout.
+        """
+        input_masks = hidden_mask = None
+        if deterministic:
+            return input_masks, hidden_mask
+        if self.dropout_input != 0:
+            input_masks = tuple(
+                T.shape_padleft(self._dropout_mask(i.shape[1:], i.dtype,
+                                                   self.dropout_input))
+                for i in inputs)
+        if self.dropout_hidden != 0:
+            num_units = utils.extract_clean_dims(self.init[0][1])
+            hidden_mask = self._dropout_mask((inputs[0].shape[1], ) +
+                                             num_units,
+                                             theano.config.floatX,
+                                             self.dropout_hidden)
+        return input_masks, hidden_mask
+
+    def _dropout_mask(self, shape, dtype, p):
+        # Using theano constant to prevent upcasting
+        retain_prob = T.constant(1) - p
+        mask = self._srng.binomial(shape, p=retain_prob, dtype=dtype)
+        return mask / T.cast(retain_prob, dtype)
+
     def get_output_shapes_for(self, input_shapes):
         raise NotImplementedError
 
-    def get_outputs_for(self, inputs, **kwargs):
+    def get_outputs_for(self, inputs, hidden_mask=None, **kwargs):
         raise NotImplementedError
 
 
@@ -616,9 +771,11 @@ class StandardStep(AbstractStepLayer):
         x_shape = input_shapes[0]
         return (x_shape[0], self.num_x_to_h),
 
-    def get_outputs_for(self, inputs, **kwargs):
+    def get_outputs_for(self, inputs, hidden_mask=None, **kwargs):
         x = inputs[0]
         h = inputs[1]
+        if hidden_mask is not None:
+            h = h * hidden_mask
         if self.pre_compute_input:
             # If we precompute the output this is only dot(h, w)
             return self.f(T.dot(h, self.W) + x),
@@ -692,12 +849,15 @@ class GRUStep(AbstractStepLayer):
         x_shape = input_shapes[0]
         return (x_shape[0], self.num_x_to_h // 3),
 
-    def get_outputs_for(self, inputs, **kwargs):
+    def get_outputs_for(self, inputs, hidden_mask=None, **kwargs):
         x = inputs[0]
         h = inputs[1]
         n = self.num_x_to_h // 3
         # If we precompute the output this is only dot(h, w)
-        a = T.dot(h, self.W)
+        if hidden_mask is not None:
+            a = T.dot(h * hidden_mask, self.W)
+        else:
+            a = T.dot(h, self.W)
         ru = self.g(a[:, :2*n] + x[:, :2*n])
         r = ru[:, :n]
         u = ru[:, n:]
@@ -815,11 +975,13 @@ class LSTMStep(AbstractStepLayer):
         return (x_shape[0], self.num_x_to_h // 4), \
                (x_shape[0], self.num_x_to_h // 4)
 
-    def get_outputs_for(self, inputs, **kwargs):
+    def get_outputs_for(self, inputs, hidden_mask=None, **kwargs):
         x = inputs[0]
         h = inputs[1]
         c = inputs[2]
         n = self.num_x_to_h // 4
+        if hidden_mask is not None:
+            h = h * hidden_mask
         if self.pre_compute_input:
             # If we precompute the output this is only dot(h, w)
             a = T.dot(h, self.W) + x
@@ -926,11 +1088,13 @@ class RWAStep(AbstractStepLayer):
                (x_shape[0], self.num_x_to_h // 3), \
                (x_shape[0], self.num_x_to_h // 3)
 
-    def get_outputs_for(self, inputs, **kwargs):
+    def get_outputs_for(self, inputs, hidden_mask=None, **kwargs):
         x = inputs[0]
         h = inputs[1]
         nt = inputs[2]
         dt = inputs[3]
+        if hidden_mask is not None:
+            h = h * hidden_mask
         # dimensionality
         n = self.num_x_to_h // 3
         # eq. 4 from the paper
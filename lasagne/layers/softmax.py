@@ -0,0 +1,322 @@
+import numpy as np
+import theano.tensor as T
+
+from .. import init
+
+from .base import Layer
+from ..random import create_streams
+
+
+__all__ = [
+    "SampledSoftmaxLayer",
+    "AdaptiveSoftmaxLayer",
+]
+
+
+def _crossentropy(logits, targets):
+    # fused softmax and cross-entropy; passing the bias explicitly keeps it
+    # valid for empty batches
+    bias = T.zeros((logits.shape[1], ), logits.dtype)
+    return T.nnet.crossentropy_softmax_1hot_with_bias(logits, bias,
+                                                      targets)[0]
+
+
+class SampledSoftmaxLayer(Layer):
+    """
+    lasagne.layers.SampledSoftmaxLayer(incoming, num_units, num_sampled,
+    W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
+    remove_accidental_hits=True, **kwargs)
+
+    A softmax output layer over a large number of classes, trained with a
+    sampled softmax loss.
+
+    The output of the layer is the full softmax over all classes, as for a
+    :class:`DenseLayer` with a softmax nonlinearity. For training,
+    :meth:`get_loss_for` computes the cross-entropy against the target class
+    and `num_sampled` negative classes only, drawn from a log-uniform
+    (Zipfian) distribution and shared by all examples of a batch [1]_.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape. The
+        input must be a matrix.
+
+    num_units : int
+        The number of classes.
+
+    num_sampled : int
+        The number of negative classes to sample per batch.
+
+    W : Theano shared variable, expression, numpy array or callable
+        Initial value, expression or initializer for the weights. These
+        should be a matrix with shape ``(num_units, num_inputs)``, i.e., the
+        transpose of the weights of a :class:`DenseLayer`, so the weights of
+        the sampled classes are gathered as rows.
+
+    b : Theano shared variable, expression, numpy array, callable or ``None``
+        Initial value, expression or initializer for the biases. If set to
+        ``None``, the layer will have no biases. Otherwise, biases should be
+        a 1D array with shape ``(num_units,)``.
+
+    remove_accidental_hits : bool
+        If ``True``, sampled classes equal to the target of an example are
+        not used as negatives for it.
+
+    Examples
+    --------
+    >>> import theano.tensor as T
+    >>> from lasagne.layers import InputLayer, DenseLayer, SampledSoftmaxLayer
+    >>> from lasagne.layers import get_output
+    >>> l_in = InputLayer((None, 50))
+    >>> l_hid = DenseLayer(l_in, num_units=32)
+    >>> l_out = SampledSoftmaxLayer(l_hid, num_units=100000, num_sampled=64)
+    >>> targets = T.ivector('targets')
+    >>> loss = l_out.get_loss_for(get_output(l_hid), targets).mean()
+    >>> probabilities = get_output(l_out, deterministic=True)
+
+    Notes
+    -----
+    The log-uniform distribution assigns class ``k`` the probability
+    ``log((k + 2) / (k + 1)) / log(num_units + 1)``, so classes should be
+    numbered by decreasing frequency. The logits are corrected by the log of
+    the expected number of times each class is sampled, which makes the loss
+    an estimate of the full softmax cross-entropy.
+
+    References
+    ----------
+    .. [1] Jean, S., Cho, K., Memisevic, R., & Bengio, Y. (2015):
+           On Using Very Large Target Vocabulary for Neural Machine
+           Translation. ACL 2015.
+    """
+    def __init__(self, incoming, num_units, num_sampled,
+                 W=init.GlorotUniform(), b=init.Constant(0.),
+                 remove_accidental_hits=True, **kwargs):
+        super(SampledSoftmaxLayer, self).__init__(incoming, **kwargs)
+        if len(self.input_shape) != 2:
+            raise ValueError("SampledSoftmaxLayer requires a matrix input, "
+                             "got shape %r" % (self.input_shape, ))
+        self._srng = create_streams(self.name)
+        self.num_units = num_units
+        self.num_sampled = num_sampled
+        self.remove_accidental_hits = remove_accidental_hits
+        num_inputs = self.input_shape[1]
+        self.W = self.add_param(W, (num_units, num_inputs), name="W")
+        if b is None:
+            self.b = None
+        else:
+            self.b = self.add_param(b, (num_units,), name="b",
+                                    regularizable=False)
+
+    def get_output_shapes_for(self, input_shapes):
+        return (input_shapes[0][0], self.num_units),
+
+    def _logits(self, x):
+        logits = T.dot(x, self.W.T)
+        return logits if self.b is None else logits + self.b
+
+    def get_outputs_for(self, inputs, **kwargs):
+        return T.nnet.softmax(self._logits(inputs[0])),
+
+    def _sample_classes(self):
+        # inverse transform sampling of the log-uniform distribution
+        u = self._srng.uniform((self.num_sampled, ), dtype='float64')
+        sampled = T.cast(T.exp(u * np.log(self.num_units + 1)) - 1, 'int64')
+        return T.minimum(sampled, self.num_units - 1)
+
+    def _log_expected_count(self, classes):
+        classes = T.cast(classes, 'float64')
+        log_prob = (T.log((classes + 2) / (classes + 1)) /
+                    np.log(self.num_units + 1))
+        return T.log(self.num_sampled * log_prob)
+
+    def get_loss_for(self, input, targets, deterministic=False, **kwargs):
+        """
+        Computes the cross-entropy loss of each example.
+
+        Parameters
+        ----------
+        input : Theano expression
+            The input of the layer, a matrix.
+
+        targets : Theano expression
+            The target class of each example, an integer vector.
+
+        deterministic : bool
+            If ``True``, computes the exact cross-entropy of the full
+            softmax instead of the sampled estimate.
+
+        Returns
+        -------
+        Theano expression
+            The loss of each example, a vector.
+        """
+        if deterministic:
+            return _crossentropy(self._logits(input), targets)
+        sampled = self._sample_classes()
+        # gather the weights of the targets and samples at once, so their
+        # gradient increments a single set of rows
+        num_targets = targets.shape[0]
+        classes = T.concatenate([T.cast(targets, 'int64'), sampled])
+        W = self.W[classes]
+        shift = -self._log_expected_count(classes).astype(input.dtype)
+        if self.b is not None:
+            shift += self.b[classes]
+        true_logits = ((input * W[:num_targets]).sum(axis=1) +
+                       shift[:num_targets])
+        sampled_logits = T.dot(input, W[num_targets:].T) + shift[num_targets:]
+        if self.remove_accidental_hits:
+            hits = T.eq(targets[:, None], sampled[None, :])
+            sampled_logits = T.switch(hits, np.float32(-1e30),
+                                      sampled_logits)
+        logits = T.concatenate([true_logits[:, None], sampled_logits],
+                               axis=1)
+        return _crossentropy(logits, T.zeros_like(targets))
+
+
+class AdaptiveSoftmaxLayer(Layer):
+    """
+    lasagne.layers.AdaptiveSoftmaxLayer(incoming, num_units, cutoffs,
+    div_value=4., W=lasagne.init.GlorotUniform(),
+    b=lasagne.init.Constant(0.), **kwargs)
+
+    A softmax output layer over a large number of classes, factorized into
+    frequency clusters.
+
+    Following [1]_, the classes below ``cutoffs[0]`` (the most frequent ones)
+    form the head, which also predicts one token per tail cluster. The tail
+    clusters span the classes from each cutoff to the next (and to
+    `num_units`), and are predicted from a projection of the input that
+    shrinks by `div_value` for each cluster. The probability of a tail class
+    is the probability of its cluster in the head times its probability
+    within the cluster.
+
+    The output of the layer is the full distribution over all classes. For
+    training, :meth:`get_loss_for` computes the exact cross-entropy while
+    evaluating each tail cluster only for the examples whose target lies in
+    it.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape. The
+        input must be a matrix.
+
+    num_units : int
+        The number of classes, numbered by decreasing frequency.
+
+    cutoffs : list of int
+        The increasing class indices at which each tail cluster starts.
+
+    div_value : float
+        The factor by which the projection size decreases for each cluster.
+
+    W : callable
+        Initializer for the weight matrices of the head, the projections
+        and the tail clusters.
+
+    b : callable or ``None``
+        Initializer for the biases of the head. If ``None``, the head has no
+        biases.
+
+    Examples
+    --------
+    >>> import theano.tensor as T
+    >>> from lasagne.layers import InputLayer, AdaptiveSoftmaxLayer
+    >>> from lasagne.layers import get_output
+    >>> l_in = InputLayer((None, 64))
+    >>> l_out = AdaptiveSoftmaxLayer(l_in, num_units=100000,
+    ...                              cutoffs=[2000, 20000])
+    >>> [W.get_value().shape for W in l_out.W_tail]
+    [(16, 18000), (4, 80000)]
+    >>> targets = T.ivector('targets')
+    >>> loss = l_out.get_loss_for(l_in.input_var, targets).mean()
+
+    References
+    ----------
+    .. [1] Grave, E., Joulin, A., Cisse, M., Grangier, D., & Jegou, H.
+           (2017): Efficient softmax approximation for GPUs. ICML 2017.
+    """
+    def __init__(self, incoming, num_units, cutoffs, div_value=4.,
+                 W=init.GlorotUniform(), b=init.Constant(0.), **kwargs):
+        super(AdaptiveSoftmaxLayer, self).__init__(incoming, **kwargs)
+        if len(self.input_shape) != 2:
+            raise ValueError("AdaptiveSoftmaxLayer requires a matrix input, "
+                             "got shape %r" % (self.input_shape, ))
+        cutoffs = list(cutoffs)
+        if (not cutoffs or cutoffs != sorted(set(cutoffs)) or
+                cutoffs[0] <= 0 or cutoffs[-1] >= num_units):
+            raise ValueError("cutoffs must be increasing and between 0 and "
+                             "num_units, got %r" % (cutoffs, ))
+        self.num_units = num_units
+        self.cutoffs = cutoffs
+        self.div_value = div_value
+        num_inputs = self.input_shape[1]
+        head_size = cutoffs[0] + len(cutoffs)
+        self.W_head = self.add_param(W, (num_inputs, head_size),
+                                     name="W_head")
+        if b is None:
+            self.b_head = None
+        else:
+            self.b_head = self.add_param(b, (head_size, ), name="b_head",
+                                         regularizable=False)
+        self.W_proj = []
+        self.W_tail = []
+        bounds = cutoffs + [num_units]
+        for i in range(len(cutoffs)):
+            proj_size = max(1, int(num_inputs // div_value ** (i + 1)))
+            self.W_proj.append(self.add_param(
+                    W, (num_inputs, proj_size), name="W_proj%d" % i))
+            self.W_tail.append(self.add_param(
+                    W, (proj_size, bounds[i + 1] - bounds[i]),
+                    name="W_tail%d" % i))
+
+    def get_output_shapes_for(self, input_shapes):
+        return (input_shapes[0][0], self.num_units),
+
+    def _head_logits(self, x):
+        logits = T.dot(x, self.W_head)
+        return logits if self.b_head is None else logits + self.b_head
+
+    def _tail_logits(self, x, i):
+        return T.dot(T.dot(x, self.W_proj[i]), self.W_tail[i])
+
+    def get_outputs_for(self, inputs, **kwargs):
+        x = inputs[0]
+        head = T.nnet.softmax(self._head_logits(x))
+        shortlist = self.cutoffs[0]
+        outputs = [head[:, :shortlist]]
+        for i in range(len(self.cutoffs)):
+            tail = T.nnet.softmax(self._tail_logits(x, i))
+            outputs.append(tail * head[:, shortlist + i, None])
+        return T.concatenate(outputs, axis=1),
+
+    def get_loss_for(self, input, targets, **kwargs):
+        """
+        Computes the cross-entropy loss of each example.
+
+        Parameters
+        ----------
+        input : Theano expression
+            The input of the layer, a matrix.
+
+        targets : Theano expression
+            The target class of each example, an integer vector.
+
+        Returns
+        -------
+        Theano expression
+            The loss of each example, a vector.
+        """
+        shortlist = self.cutoffs[0]
+        # the head predicts the shortlist classes and the tail clusters
+        cluster = T.sum(T.ge(targets[:, None], self.cutoffs), axis=1) - 1
+        head_targets = T.switch(T.lt(targets, shortlist), targets,
+                                shortlist + cluster)
+        loss = _crossentropy(self._head_logits(input), head_targets)
+        for i, start in enumerate(self.cutoffs):
+            rows = T.eq(cluster, i).nonzero()[0]
+            tail_loss = _crossentropy(self._tail_logits(input[rows], i),
+                                      targets[rows] - start)
+            loss = T.inc_subtensor(loss[rows], tail_loss)
+        return loss
@@ -0,0 +1,133 @@
+import numpy as np
+import scipy.sparse
+import theano
+import theano.sparse
+
+from .. import init
+from .. import nonlinearities
+
+from .dense import DenseLayer
+
+
+__all__ = [
+    "SparseDenseLayer",
+]
+
+
+class SparseDenseLayer(DenseLayer):
+    """
+    lasagne.layers.SparseDenseLayer(incoming, num_units,
+    W=lasagne.init.GlorotUniform(), b=lasagne.init.Constant(0.),
+    nonlinearity=lasagne.nonlinearities.rectify, num_leading_axes=1, **kwargs)
+
+    A fully connected layer with a sparse weight matrix.
+
+    Behaves like a :class:`DenseLayer`, but stores the weights as a
+    :mod:`theano.sparse` shared variable holding only the nonzero weights,
+    and computes the product with ``theano.sparse.structured_dot``. This
+    saves work when most weights are zero, such as after pruning them with
+    :func:`lasagne.compression.prune_by_magnitude`.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape
+
+    num_units : int
+        The number of units of the layer
+
+    W : Theano sparse shared variable, array, sparse matrix or callable
+        Initial value or initializer for the weights. These should be a
+        matrix with shape ``(num_inputs, num_units)``. Zero entries are not
+        stored, and stay zero during training.
+
+    b : Theano shared variable, expression, numpy array, callable or ``None``
+        Initial value, expression or initializer for the biases. If set to
+        ``None``, the layer will have no biases. Otherwise, biases should be
+        a 1D array with shape ``(num_units,)``.
+        See :func:`lasagne.utils.create_param` for more information.
+
+    nonlinearity : callable or None
+        The nonlinearity that is applied to the layer activations. If None
+        is provided, the layer will be linear.
+
+    num_leading_axes : int
+        Number of leading axes to distribute the dot product over. These axes
+        will be kept in the output tensor, remaining axes will be collapsed and
+        multiplied against the weight matrix. A negative number gives the
+        (negated) number of trailing axes to involve in the dot product.
+
+    Examples
+    --------
+    Prune a trained dense layer and replace it by a sparse one:
+
+    >>> from lasagne.layers import InputLayer, DenseLayer, SparseDenseLayer
+    >>> from lasagne.compression import prune_by_magnitude
+    >>> l_in = InputLayer((None, 100))
+    >>> l_dense = DenseLayer(l_in, num_units=50)
+    >>> masks = prune_by_magnitude(l_dense, 0.9)
+    >>> l_sparse = SparseDenseLayer(l_in, num_units=50,
+    ...                             W=l_dense.W.get_value(),
+    ...                             b=l_dense.b.get_value())
+    >>> l_sparse.density
+    0.1
+
+    Notes
+    -----
+    The weights are held in CSC format, which is the CSR format of their
+    transpose; ``structured_dot`` multiplies that transpose with the
+    transposed input. The gradient with respect to ``W`` is a sparse matrix
+    with the same sparsity pattern, so plain :func:`lasagne.updates.sgd`
+    keeps the weights sparse. Update rules keeping dense state per parameter,
+    such as momentum or Adam, are not supported for the sparse weights.
+
+    Whether the sparse product is faster than the dense one depends on the
+    density of ``W``, the batch size and the BLAS implementation; on CPUs the
+    forward pass typically only pays off below a density of about 10%, and
+    the gradient is slower than the dense one down to lower densities. See
+    ``benchmarks/sparse_dense.py`` to measure it for a given setting.
+    """
+    def __init__(self, incoming, num_units, W=init.GlorotUniform(),
+                 b=init.Constant(0.), nonlinearity=nonlinearities.rectify,
+                 num_leading_axes=1, **kwargs):
+        def sparse_W(shape):
+            value = W(shape) if callable(W) else W
+            if isinstance(value, theano.Variable):
+                return value
+            value = scipy.sparse.csc_matrix(value,
+                                            dtype=theano.config.floatX)
+            if value.shape != shape:
+                raise ValueError("cannot initialize parameter W: the "
+                                 "provided value has shape %s, should be %s"
+                                 % (value.shape, shape))
+            value.eliminate_zeros()
+            return theano.sparse.shared(value)
+        super(SparseDenseLayer, self).__init__(
+                incoming, num_units, W=sparse_W, b=b,
+                nonlinearity=nonlinearity, num_leading_axes=num_leading_axes,
+                **kwargs)
+
+    @property
+    def density(self):
+        """The fraction of weights that are stored."""
+        W = self.W.get_value()
+        return W.nnz / float(np.prod(W.shape))
+
+    def get_outputs_for(self, inputs, **kwargs):
+        x = inputs[0]
+        num_leading_axes = self.num_leading_axes
+        if num_leading_axes < 0:
+            num_leading_axes += x.ndim
+        if x.ndim > num_leading_axes + 1:
+            x = x.flatten(num_leading_axes + 1)
+        # structured_dot takes a matrix, with the sparse operand first
+        x2d = x if num_leading_axes == 1 else x.reshape((-1, x.shape[-1]))
+        activation = theano.sparse.structured_dot(
+                theano.sparse.transpose(self.W), x2d.T).T
+        if num_leading_axes != 1:
+            activation = activation.reshape(
+                    tuple(x.shape[i] for i in range(num_leading_axes)) +
+                    (self.num_units, ), ndim=num_leading_axes + 1)
+        if self.b is not None:
+            activation = activation + self.b
+        return self.nonlinearity(activation),
@@ -5,13 +5,13 @@ import numpy as np
 from .. import init
 from .. import nonlinearities
 from ..utils import as_tuple, floatX
-from ..random import get_rng
+from ..random import create_streams
 from .base import Layer
-from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
 
 
 __all__ = [
     "NonlinearityLayer",
+    "LogitsLayer",
     "BiasLayer",
     "ScaleLayer",
     "standardize",
@@ -52,6 +52,51 @@ class NonlinearityLayer(Layer):
         return self.nonlinearity(inputs[0]),
 
 
+class LogitsLayer(Layer):
+    """
+    lasagne.layers.LogitsLayer(incoming,
+    nonlinearity=lasagne.nonlinearities.softmax, **kwargs)
+
+    A layer marking its input as logits, applying the output nonlinearity
+    only when probabilities are asked for.
+
+    By default, the output is the input unchanged, to be passed to the
+    losses of :mod:`lasagne.objectives` computing the cross-entropy from
+    logits, such as :func:`categorical_crossentropy_logits`. Passing
+    ``probabilities=True`` to :func:`get_output` applies the nonlinearity.
+
+    Parameters
+    ----------
+    incoming : a :class:`Layer` instance or a tuple
+        The layer feeding into this layer, or the expected input shape
+
+    nonlinearity : callable
+        The nonlinearity turning logits into probabilities, usually
+        :func:`lasagne.nonlinearities.softmax` or
+        :func:`lasagne.nonlinearities.sigmoid`.
+
+    Examples
+    --------
+    >>> from lasagne.layers import InputLayer, DenseLayer, LogitsLayer
+    >>> from lasagne.layers import get_output
+    >>> l_in = InputLayer((None, 10))
+    >>> l_dense = DenseLayer(l_in, num_units=3, nonlinearity=None)
+    >>> l_out = LogitsLayer(l_dense)
+    >>> logits = get_output(l_out)
+    >>> probabilities = get_output(l_out, deterministic=True,
+    ...                            probabilities=True)
+    """
+    def __init__(self, incoming, nonlinearity=nonlinearities.softmax,
+                 **kwargs):
+        super(LogitsLayer, self).__init__(incoming, **kwargs)
+        self.nonlinearity = nonlinearity
+
+    def get_outputs_for(self, inputs, probabilities=False, **kwargs):
+        if probabilities:
+            return self.nonlinearity(inputs[0]),
+        return inputs[0],
+
+
 class BiasLayer(Layer):
     """
     lasagne.layers.BiasLayer(incoming, b=lasagne.init.Constant(0),
@@ -1085,7 +1130,7 @@ class RandomizedRectifierLayer(Layer):
     def __init__(self, incoming, lower=0.3, upper=0.8, shared_axes='auto',
                  **kwargs):
         super(RandomizedRectifierLayer, self).__init__(incoming, **kwargs)
-        self._srng = RandomStreams(get_rng().randint(1, 2147462579))
+        self._srng = create_streams(self.name)
         self.lower = lower
         self.upper = upper
 
@@ -0,0 +1,430 @@
+"""
+Streaming evaluation metrics, accumulated inside compiled Theano functions.
+
+Evaluating a network batch by batch usually means returning per-batch losses
+or predictions from a compiled function and summing them up in Python. The
+metrics in this module instead keep running sums, counts and histograms in
+shared variables, and provide the update expressions that add a batch to them.
+Passing those updates to :func:`theano.function` accumulates the metrics
+inside the compiled function, and only the final summary is read back.
+
+.. autosummary::
+    :nosignatures:
+
+    Metric
+    Mean
+    BinaryAccuracy
+    CategoricalAccuracy
+    ConfusionMatrix
+    AUC
+
+Examples
+--------
+>>> import numpy as np
+>>> import theano
+>>> import theano.tensor as T
+>>> from lasagne.layers import InputLayer, DenseLayer, get_output
+>>> from lasagne.nonlinearities import softmax
+>>> from lasagne.objectives import categorical_crossentropy
+>>> from lasagne.metrics import Mean, CategoricalAccuracy
+>>> l_in = InputLayer((None, 20))
+>>> l_out = DenseLayer(l_in, num_units=3, nonlinearity=softmax)
+>>> targets = T.ivector('targets')
+>>> predictions = get_output(l_out, deterministic=True)
+>>> loss = Mean()
+>>> accuracy = CategoricalAccuracy()
+>>> updates = loss.get_updates(categorical_crossentropy(predictions, targets))
+>>> updates.update(accuracy.get_updates(predictions, targets))
+>>> val_fn = theano.function([l_in.input_var, targets], [], updates=updates)
+
+Each call of ``val_fn`` now adds a batch to the metrics, which can be read
+at the end of the pass and reset for the next one:
+
+>>> x = np.random.randn(50, 20).astype(theano.config.floatX)
+>>> y = np.random.randint(3, size=50).astype('int32')
+>>> for start in range(0, 50, 10):
+...     _ = val_fn(x[start:start + 10], y[start:start + 10])
+>>> int(round(accuracy.get_value() * 50)) == np.sum(
+...     get_output(l_out, x).eval().argmax(axis=1) == y)
+True
+>>> accuracy.reset()
+>>> float(accuracy.get_value())
+nan
+"""
+from collections import OrderedDict
+
+import numpy as np
+import theano
+import theano.tensor as T
+
+from .objectives import align_targets, binary_accuracy, categorical_accuracy
+
+
+__all__ = [
+    "Metric",
+    "Mean",
+    "BinaryAccuracy",
+    "CategoricalAccuracy",
+    "ConfusionMatrix",
+    "AUC",
+]
+
+
+class Metric(object):
+    """
+    Base class for streaming metrics.
+
+    A metric holds its state in shared variables created with
+    :meth:`add_state`. Subclasses implement :meth:`get_updates`, returning
+    the update expressions accumulating a batch into the state, and
+    :meth:`result`, returning an expression for the summary computed from
+    the state.
+
+    Parameters
+    ----------
+    name : string or None
+        An optional name for the metric, used as a prefix for the names of
+        its shared variables.
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.state = OrderedDict()
+        self._result_fn = None
+
+    def add_state(self, name, shape=(), dtype=theano.config.floatX):
+        """
+        Creates a shared variable of zeros holding part of the state.
+
+        Parameters
+        ----------
+        name : string
+            The name of the variable.
+        shape : tuple of int
+            The shape of the variable.
+        dtype : string
+            The data type of the variable.
+
+        Returns
+        -------
+        Theano shared variable
+            The new variable.
+        """
+        if self.name is not None:
+            name = "%s.%s" % (self.name, name)
+        var = theano.shared(np.zeros(shape, dtype), name=name)
+        self.state[var] = (shape, dtype)
+        return var
+
+    def get_updates(self, *args, **kwargs):
+        """
+        Returns the update expressions adding a batch to the metric.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping each state variable to its update
+            expression, to be passed to :func:`theano.function`.
+        """
+        raise NotImplementedError
+
+    def result(self):
+        """
+        Returns an expression for the value of the metric.
+
+        Returns
+        -------
+        Theano expression
+            The value of the metric, computed from its state.
+        """
+        raise NotImplementedError
+
+    def get_value(self):
+        """
+        Computes the value of the metric from the accumulated state.
+
+        Only the result is transferred from the device, not the state. The
+        function computing it is compiled at the first call.
+
+        Returns
+        -------
+        numpy array
+            The value of the metric.
+        """
+        if self._result_fn is None:
+            self._result_fn = theano.function([], self.result())
+        return self._result_fn()
+
+    def reset(self):
+        """
+        Resets the state of the metric to zeros.
+        """
+        for var, (shape, dtype) in self.state.items():
+            var.set_value(np.zeros(shape, dtype))
+
+
+def _weights(values, mask):
+    if mask is None:
+        return T.ones_like(values, dtype=theano.config.floatX)
+    return T.cast(mask, theano.config.floatX)
+
+
+class Mean(Metric):
+    """
+    The mean of a set of values, such as the per-example losses.
+
+    Values are weighted by an optional mask, so sequences of different
+    lengths or padded batches can be averaged over their valid elements.
+    The value of an empty metric is NaN.
+
+    Parameters
+    ----------
+    name : string or None
+        An optional name for the metric.
+    """
+    def __init__(self, name=None):
+        super(Mean, self).__init__(name)
+        self.total = self.add_state("total")
+        self.count = self.add_state("count")
+
+    def get_updates(self, values, mask=None):
+        """
+        Returns the update expressions adding values to the mean.
+
+        Parameters
+        ----------
+        values : Theano expression
+            The values to add, of any shape.
+        mask : Theano expression or None
+            Optional weights of the same shape as `values`, usually in
+            {0, 1}.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping the state variables to their updates.
+        """
+        weights = _weights(values, mask)
+        values = T.cast(values, theano.config.floatX)
+        if mask is not None:
+            # masked entries may hold anything, including NaNs
+            values = T.switch(weights, values, 0)
+        return OrderedDict([
+            (self.total, self.total + (values * weights).sum()),
+            (self.count, self.count + weights.sum()),
+        ])
+
+    def result(self):
+        return self.total / self.count
+
+
+class BinaryAccuracy(Mean):
+    """
+    The fraction of correct binary predictions.
+
+    Parameters
+    ----------
+    threshold : scalar
+        The threshold at which predictions are considered positive, see
+        :func:`lasagne.objectives.binary_accuracy`.
+    name : string or None
+        An optional name for the metric.
+    """
+    def __init__(self, threshold=0.5, name=None):
+        super(BinaryAccuracy, self).__init__(name)
+        self.threshold = threshold
+
+    def get_updates(self, predictions, targets, mask=None):
+        """
+        Returns the update expressions adding a batch of predictions.
+
+        Parameters
+        ----------
+        predictions : Theano expression
+            Predictions in [0, 1], see
+            :func:`lasagne.objectives.binary_accuracy`.
+        targets : Theano expression
+            Targets in {0, 1}.
+        mask : Theano expression or None
+            Optional weights of the same shape as the accuracies.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping the state variables to their updates.
+        """
+        accuracy = binary_accuracy(predictions, targets, self.threshold)
+        return super(BinaryAccuracy, self).get_updates(accuracy, mask)
+
+
+class CategoricalAccuracy(Mean):
+    """
+    The fraction of correct (or top-k correct) categorical predictions.
+
+    Parameters
+    ----------
+    top_k : int
+        Counts a prediction as correct if the target class is among the
+        `top_k` most probable classes, see
+        :func:`lasagne.objectives.categorical_accuracy`.
+    name : string or None
+        An optional name for the metric.
+    """
+    def __init__(self, top_k=1, name=None):
+        super(CategoricalAccuracy, self).__init__(name)
+        self.top_k = top_k
+
+    def get_updates(self, predictions, targets, mask=None):
+        """
+        Returns the update expressions adding a batch of predictions.
+
+        Parameters
+        ----------
+        predictions : Theano expression
+            Class probabilities or scores in the last dimension.
+        targets : Theano expression
+            Integer class indices, or one-hot encodings of the same shape as
+            `predictions`.
+        mask : Theano expression or None
+            Optional weights with one entry per prediction.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping the state variables to their updates.
+        """
+        accuracy = categorical_accuracy(predictions, targets, self.top_k)
+        return super(CategoricalAccuracy, self).get_updates(accuracy, mask)
+
+
+class ConfusionMatrix(Metric):
+    """
+    The confusion matrix of categorical predictions.
+
+    The value is an integer matrix of shape ``(num_classes, num_classes)``
+    counting the examples of each target class (rows) assigned to each
+    predicted class (columns).
+
+    Parameters
+    ----------
+    num_classes : int
+        The number of classes.
+    name : string or None
+        An optional name for the metric.
+    """
+    def __init__(self, num_classes, name=None):
+        super(ConfusionMatrix, self).__init__(name)
+        self.num_classes = num_classes
+        self.counts = self.add_state("counts", (num_classes, num_classes),
+                                     'int64')
+
+    def get_updates(self, predictions, targets, mask=None):
+        """
+        Returns the update expressions adding a batch of predictions.
+
+        Parameters
+        ----------
+        predictions : Theano expression
+            Class probabilities or scores in the last dimension, or integer
+            predicted classes of the same shape as `targets`.
+        targets : Theano expression
+            Integer class indices, or one-hot encodings of the same shape as
+            `predictions`.
+        mask : Theano expression or None
+            Optional {0, 1} weights with one entry per prediction.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping the state variables to their updates.
+        """
+        if targets.ndim == predictions.ndim and targets.dtype.startswith(
+                'float'):
+            targets = T.argmax(targets, axis=-1)
+        if predictions.ndim == targets.ndim + 1:
+            predictions = T.argmax(predictions, axis=-1)
+        elif predictions.ndim != targets.ndim:
+            raise TypeError('rank mismatch between targets and predictions')
+        index = (T.cast(targets.flatten(), 'int64') * self.num_classes +
+                 T.cast(predictions.flatten(), 'int64'))
+        if mask is None:
+            weights = T.ones_like(index)
+        else:
+            weights = T.cast(mask.flatten(), 'int64')
+        counts = T.inc_subtensor(
+                T.zeros((self.num_classes ** 2, ), 'int64')[index], weights)
+        return OrderedDict([
+            (self.counts, self.counts + counts.reshape(self.counts.shape)),
+        ])
+
+    def result(self):
+        return self.counts
+
+
+class AUC(Metric):
+    """
+    The area under the ROC curve of binary predictions.
+
+    The predictions of the positive and negative examples are counted in
+    histograms of `num_bins` equal bins over [0, 1], and the area is
+    computed from those. Pairs of a positive and a negative example falling
+    in the same bin count as ties, so the result is exact when the
+    predictions take at most `num_bins` distinct values aligned with the
+    bins, and approximates the exact area to within the fraction of such
+    pairs otherwise.
+
+    Parameters
+    ----------
+    num_bins : int
+        The number of histogram bins.
+    name : string or None
+        An optional name for the metric.
+    """
+    def __init__(self, num_bins=200, name=None):
+        super(AUC, self).__init__(name)
+        self.num_bins = num_bins
+        self.positives = self.add_state("positives", (num_bins, ), 'int64')
+        self.negatives = self.add_state("negatives", (num_bins, ), 'int64')
+
+    def get_updates(self, predictions, targets, mask=None):
+        """
+        Returns the update expressions adding a batch of predictions.
+
+        Parameters
+        ----------
+        predictions : Theano expression
+            Predictions in [0, 1], giving the probability of the positive
+            class.
+        targets : Theano expression
+            Targets in {0, 1}.
+        mask : Theano expression or None
+            Optional {0, 1} weights of the same shape as `predictions`.
+
+        Returns
+        -------
+        OrderedDict
+            A dictionary mapping the state variables to their updates.
+        """
+        predictions, targets = align_targets(predictions, targets)
+        bins = T.cast(T.floor(predictions.flatten() * self.num_bins),
+                      'int64')
+        bins = T.clip(bins, 0, self.num_bins - 1)
+        positive = T.cast(T.neq(targets.flatten(), 0), 'int64')
+        if mask is None:
+            weights = T.ones_like(positive)
+        else:
+            weights = T.cast(mask.flatten(), 'int64')
+        hist = T.zeros((self.num_bins, ), 'int64')[bins]
+        return OrderedDict([
+            (self.positives,
+             self.positives + T.inc_subtensor(hist, positive * weights)),
+            (self.negatives,
+             self.negatives + T.inc_subtensor(hist, (1 - positive) * weights)),
+        ])
+
+    def result(self):
+        positives = T.cast(self.positives, 'float64')
+        negatives = T.cast(self.negatives, 'float64')
+        # number of positives in the bins above each bin
+        above = positives.sum() - T.extra_ops.cumsum(positives)
+        pairs = (negatives * (above + 0.5 * positives)).sum()
+        return pairs / (positives.sum() * negatives.sum())
@@ -14,6 +14,16 @@ predictions and targets:
     binary_hinge_loss
     multiclass_hinge_loss
 
+Two more compute the cross-entropy from the logits of a network, i.e., its
+output before the final sigmoid or softmax, which is both faster and
+numerically more stable:
+
+.. autosummary::
+    :nosignatures:
+
+    binary_crossentropy_logits
+    categorical_crossentropy_logits
+
 A convenience function aggregates such losses into a scalar expression
 suitable for differentiation:
 
@@ -73,6 +83,18 @@ without dropout or any other nondeterministic computation in between:
 >>> test_loss = aggregate(test_loss)
 
 This gives a loss expression good for monitoring validation error.
+
+To train on logits instead, end the network in a :class:`LogitsLayer`, which
+only applies the softmax when probabilities are asked for:
+
+>>> from lasagne.layers import LogitsLayer
+>>> from lasagne.objectives import categorical_crossentropy_logits
+>>> l_logits = DenseLayer(l_hid, num_units=3, nonlinearity=None)
+>>> l_out = LogitsLayer(l_logits, nonlinearity=softmax)
+>>> loss = categorical_crossentropy_logits(get_output(l_out, data), targets)
+>>> loss = aggregate(loss)
+>>> test_predictions = get_output(l_out, data, deterministic=True,
+...                               probabilities=True)
 """
 
 import theano.tensor
@@ -82,6 +104,8 @@ from .utils import as_theano_expression
 __all__ = [
     "binary_crossentropy",
     "categorical_crossentropy",
+    "binary_crossentropy_logits",
+    "categorical_crossentropy_logits",
     "squared_error",
     "aggregate",
     "binary_hinge_loss",
@@ -174,6 +198,91 @@ def categorical_crossentropy(predictions, targets):
     return theano.tensor.nnet.categorical_crossentropy(predictions, targets)
 
 
+def binary_crossentropy_logits(logits, targets, mask=None):
+    r"""Computes the binary cross-entropy between logits and targets.
+
+    .. math:: L = -t \log(\sigma(x)) - (1 - t) \log(1 - \sigma(x))
+
+    computed without forming :math:`\sigma(x)` as
+    :math:`\max(x, 0) - t x + \log(1 + \exp(-|x|))`.
+
+    Parameters
+    ----------
+    logits : Theano tensor
+        Log-odds predicted by a neural network, i.e., its output before a
+        sigmoid nonlinearity.
+    targets : Theano tensor
+        Targets in [0, 1], such as ground truth labels.
+    mask : Theano tensor, optional
+        If given, the loss is set to zero where the mask is zero, even if
+        the logits there are not finite.
+
+    Returns
+    -------
+    Theano tensor
+        An expression for the element-wise binary cross-entropy.
+    """
+    logits, targets = align_targets(logits, targets)
+    loss = (theano.tensor.maximum(logits, 0) - targets * logits +
+            theano.tensor.log1p(theano.tensor.exp(-abs(logits))))
+    if mask is not None:
+        loss = theano.tensor.switch(mask, loss, 0)
+    return loss
+
+
+def categorical_crossentropy_logits(logits, targets, mask=None):
+    r"""Computes the categorical cross-entropy between logits and targets.
+
+    .. math:: L_i = - \sum_j{t_{i,j} \log(\mathrm{softmax}(x_i)_j)}
+
+    Parameters
+    ----------
+    logits : Theano tensor
+        Unnormalized log-probabilities predicted by a neural network, i.e.,
+        its output before a softmax nonlinearity, with classes in the last
+        axis. Leading axes can hold data points and, e.g., time steps.
+    targets : Theano tensor
+        Either targets in [0, 1] matching the layout of `logits`, or a tensor
+        of int with one dimension less, giving the correct class index per
+        data point.
+    mask : Theano tensor, optional
+        If given, with the shape of the loss, the loss is set to zero where
+        the mask is zero, such as after the end of variable-length
+        sequences.
+
+    Returns
+    -------
+    Theano tensor
+        An expression for the item-wise categorical cross-entropy, with one
+        dimension less than `logits`.
+
+    Notes
+    -----
+    For integer targets, the log-softmax, the loss and its gradient are each
+    computed by a single fused Theano operation. Aggregate masked losses with
+    ``aggregate(loss, mask, mode='normalized_sum')`` to average over the
+    unmasked items only.
+    """
+    logits = as_theano_expression(logits)
+    targets = as_theano_expression(targets)
+    ndim = logits.ndim
+    if ndim > 2:
+        shape = logits.shape
+        logits = logits.reshape((-1, shape[-1]), ndim=2)
+    if targets.ndim == ndim - 1:
+        bias = theano.tensor.zeros((logits.shape[1], ), logits.dtype)
+        loss = theano.tensor.nnet.crossentropy_softmax_1hot_with_bias(
+                logits, bias, targets.flatten())[0]
+    else:
+        targets = targets.reshape(logits.shape, ndim=2)
+        loss = -(targets * theano.tensor.nnet.logsoftmax(logits)).sum(axis=1)
+    if ndim > 2:
+        loss = loss.reshape(shape[:-1], ndim=ndim - 1)
+    if mask is not None:
+        loss = theano.tensor.switch(mask, loss, 0)
+    return loss
+
+
 def squared_error(a, b):
     """Computes the element-wise squared difference between two tensors.
 
@@ -381,7 +490,7 @@ def categorical_accuracy(predictions, targets, top_k=1):
     Can be relaxed to allow matches among the top :math:`k` predictions:
 
     .. math::
-        L_i = \\mathbb{I}(t_i \\in \\operatorname{argsort}_c (-p_{i,c})_{:k})
+        L_i = \\mathbb{I}(|\\{c : p_{i,c} > p_{i,t_i}\\}| < k)
 
     Parameters
     ----------
@@ -408,6 +517,10 @@ def categorical_accuracy(predictions, targets, top_k=1):
     This objective function should never be used with a gradient calculation.
     It is intended as a convenience for validation and testing not training.
 
+    For ``top_k > 1``, the target class is counted as correct if fewer than
+    `top_k` classes have a larger probability, which avoids sorting the
+    predictions. Classes tied with the target are not counted against it.
+
     To obtain the average accuracy, call :func:`theano.tensor.mean()` on the
     result, passing ``dtype=theano.config.floatX`` to compute the mean on GPU.
     """
@@ -421,10 +534,10 @@ def categorical_accuracy(predictions, targets, top_k=1):
         top = theano.tensor.argmax(predictions, axis=-1)
         return theano.tensor.eq(top, targets)
     else:
-        # top-k accuracy
-        top = theano.tensor.argsort(predictions, axis=-1)
-        # (Theano cannot index with [..., -top_k:], we need to simulate that)
-        top = top[[slice(None) for _ in range(top.ndim - 1)] +
-                  [slice(-top_k, None)]]
-        targets = theano.tensor.shape_padaxis(targets, axis=-1)
-        return theano.tensor.any(theano.tensor.eq(top, targets), axis=-1)
+        # top-k accuracy: count the classes ranked above the target instead
+        # of sorting all of them
+        flat = predictions.reshape((-1, predictions.shape[-1]))
+        scores = flat[theano.tensor.arange(flat.shape[0]), targets.flatten()]
+        above = theano.tensor.gt(flat, scores[:, None]).sum(axis=-1)
+        return theano.tensor.lt(above, top_k).reshape(targets.shape,
+                                                      ndim=targets.ndim)
@@ -3,12 +3,37 @@ A module with a package-wide random number generator,
 used for weight initialization and seeding noise layers.
 This can be replaced by a :class:`numpy.random.RandomState` instance with a
 particular seed to facilitate reproducibility.
+
+Noise layers draw their samples from symbolic random streams created by
+:func:`create_streams`. The class of these streams can be chosen with
+:func:`set_streams`; it defaults to
+:class:`theano.sandbox.rng_mrg.MRG_RandomStreams`, which samples inside the
+compiled graph on both CPU and GPU. Layers with a name derive their seed from
+the package-level generator and their scoped name (see :func:`get_seed`), so
+the same network built in separate processes draws the same masks
+independently of the order in which its layers were created.
 """
 
+import zlib
+
 import numpy as np
 
+from theano.sandbox.rng_mrg import MRG_RandomStreams
+from theano.tensor.shared_randomstreams import RandomStreams
+
+
+# largest seed accepted by MRG_RandomStreams
+MAX_SEED = 2147462579
 
 _rng = np.random
+_base_seed = None
+_name_counts = {}
+_streams = MRG_RandomStreams
+
+_stream_classes = {
+    'mrg': MRG_RandomStreams,
+    'numpy': RandomStreams,
+}
 
 
 def get_rng():
@@ -32,5 +57,110 @@ def set_rng(new_rng):
     new_rng : ``numpy.random`` or a :class:`numpy.random.RandomState` instance
         The random number generator to use.
     """
-    global _rng
+    global _rng, _base_seed
     _rng = new_rng
+    _base_seed = _peek_seed(new_rng)
+    _name_counts.clear()
+
+
+def _peek_seed(rng):
+    # draw from a copy of the generator state, leaving the generator as is
+    peek = np.random.RandomState()
+    peek.set_state(rng.get_state())
+    return int(peek.randint(1, MAX_SEED))
+
+
+def get_streams():
+    """Get the class of random streams used by noise layers.
+
+    Returns
+    -------
+    class or callable
+        The class passed to the most recent call of :func:`set_streams`, or
+        :class:`theano.sandbox.rng_mrg.MRG_RandomStreams` if
+        :func:`set_streams` has never been called.
+    """
+    return _streams
+
+
+def set_streams(new_streams):
+    """Set the class of random streams used by noise layers.
+
+    Only layers created after this call are affected.
+
+    Parameters
+    ----------
+    new_streams : ``'mrg'``, ``'numpy'`` or a class
+        ``'mrg'`` selects :class:`theano.sandbox.rng_mrg.MRG_RandomStreams`,
+        which generates random numbers inside the compiled graph.
+        ``'numpy'`` selects
+        :class:`theano.tensor.shared_randomstreams.RandomStreams`, which
+        samples on the host with numpy. Any other class (or callable) must
+        accept an integer seed and provide the same sampling methods.
+    """
+    global _streams
+    if isinstance(new_streams, str):
+        try:
+            new_streams = _stream_classes[new_streams]
+        except KeyError:
+            raise ValueError("Unknown random streams %r, expected one of %s"
+                             % (new_streams, sorted(_stream_classes)))
+    _streams = new_streams
+
+
+def get_seed(name=None):
+    """Get a seed for the random streams of a layer.
+
+    Unnamed layers draw their seed from the package-level generator, so
+    their seeds depend on the order in which the layers are created. Named
+    layers combine the name with a base seed, which is derived from the state
+    the generator had when it was passed to :func:`set_rng` (or when the
+    first seed was requested) without consuming any numbers from it. Their
+    seeds thus only depend on the generator and the name.
+
+    So that layers sharing a name do not draw identical random numbers, each
+    repetition of a name since the last call of :func:`set_rng` gets a
+    different seed. The seeds of such layers depend on the order in which
+    they were created relative to each other, and rebuilding a network in
+    the same process only reproduces its seeds after calling :func:`set_rng`
+    again.
+
+    Parameters
+    ----------
+    name : str or None
+        The scoped name of the layer, see :attr:`lasagne.layers.Layer.name`.
+        ``None`` and the empty string count as unnamed.
+
+    Returns
+    -------
+    int
+        A seed between 1 and ``MAX_SEED - 1``.
+    """
+    if not name:
+        return int(_rng.randint(1, MAX_SEED))
+    global _base_seed
+    if _base_seed is None:
+        _base_seed = _peek_seed(_rng)
+    count = _name_counts.get(name, 0)
+    _name_counts[name] = count + 1
+    if count:
+        name = '%s\0%d' % (name, count)
+    name_hash = zlib.crc32(name.encode('utf-8')) & 0xffffffff
+    return (_base_seed ^ name_hash) % (MAX_SEED - 1) + 1
+
+
+def create_streams(name=None):
+    """Create random streams for a noise layer.
+
+    Parameters
+    ----------
+    name : str or None
+        The scoped name of the layer, used to derive the seed with
+        :func:`get_seed`.
+
+    Returns
+    -------
+    random streams
+        An instance of the class selected with :func:`set_streams`.
+    """
+    return _streams(get_seed(name))
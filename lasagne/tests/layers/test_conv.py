@@ -239,6 +239,27 @@ def dilated_conv2d_test_sets():
     yield _convert(input, kernel, output, {'untie_biases': True})
 
 
+def space_to_batch_dilated_conv2d_test_sets():
+    def _convert(input, kernel, output, kwargs):
+        return [floatX(input), floatX(kernel), output, kwargs]
+
+    input_shape = (3, 2, 11, 16)
+    for dilation in (1, 2, (3, 2), 4):
+        for pad in (0, 'same', 'full', (2, 1)):
+            for flip_filters in (False, True):
+                input = np.random.random(input_shape)
+                kernel = np.random.random((4, 2, 3, 3))
+                if not flip_filters:
+                    output = dilated_convNd(input, kernel[:, :, ::-1, ::-1],
+                                            pad, dilation, 2)
+                else:
+                    output = dilated_convNd(input, kernel, pad, dilation, 2)
+                yield _convert(input, kernel, output,
+                               {'dilation': dilation, 'pad': pad,
+                                'flip_filters': flip_filters,
+                                'implementation': 'space_to_batch'})
+
+
 def test_conv_output_length():
     from lasagne.layers.conv import conv_output_length
 
@@ -297,6 +318,22 @@ class TestBaseConvLayer:
         with pytest.raises(NotImplementedError):
             layer.convolve(theano.tensor.tensor3())
 
+    def test_num_groups(self):
+        from lasagne.layers.conv import BaseConvLayer
+        layer = BaseConvLayer((10, 6, 30, 40), 4, 3, num_groups=2)
+        assert layer.get_W_shape() == (4, 3, 3, 3)
+        assert layer.W.get_value().shape == (4, 3, 3, 3)
+        assert layer.output_shape == (10, 4, 28, 38)
+        with pytest.raises(ValueError) as exc:
+            BaseConvLayer((10, 6, 30, 40), 3, 3, num_groups=2)
+        assert "must be divisible by num_groups" in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            BaseConvLayer((10, 6, 30, 40), 4, 3, num_groups=4)
+        assert "must be divisible by num_groups" in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            BaseConvLayer((10, None, 30, 40), 4, 3, num_groups=2)
+        assert "known number of input channels" in exc.value.args[0]
+
     def test_fail_on_mismatching_dimensionality(self):
         from lasagne.layers.conv import BaseConvLayer
         with pytest.raises(ValueError) as exc:
@@ -454,10 +491,50 @@ class TestConv2DLayerImplementations:
         assert layer.get_params(_nonexistent_tag=False) == [layer.W, layer.b]
 
 
+class TestGroupedConvLayers:
+
+    @pytest.mark.parametrize("n", [1, 2])
+    @pytest.mark.parametrize("kwargs", [dict(),
+                                        dict(pad='same', stride=2)])
+    def test_output(self, DummyInputLayer, n, kwargs):
+        from lasagne.layers import Conv1DLayer, Conv2DLayer
+        input = floatX(np.random.random((2, 6) + (9, 8)[:n]))
+        kernel = floatX(np.random.random((6, 2) + (3,) * n))
+        layer = (Conv1DLayer, Conv2DLayer)[n - 1](
+                DummyInputLayer(input.shape), 6, 3, W=kernel, num_groups=3,
+                nonlinearity=None, **kwargs)
+        assert layer.output_shape[1] == 6
+        actual = layer.get_output_for(theano.shared(input)).eval()
+        # two filters per group of two input channels
+        output = np.concatenate(
+                [convNd(input[:, 2 * g:2 * g + 2], kernel[2 * g:2 * g + 2],
+                        kwargs.get('pad', 0), kwargs.get('stride', 1), n=n)
+                 for g in range(3)], axis=1)
+        assert actual.shape == output.shape == layer.output_shape
+        assert np.allclose(actual, output)
+
+    def test_default_init(self, DummyInputLayer):
+        from lasagne.layers import Conv2DLayer
+        layer = Conv2DLayer(DummyInputLayer((2, 64, 9, 8)), 400, 3,
+                            num_groups=8)
+        reference = Conv2DLayer(DummyInputLayer((2, 8, 9, 8)), 50, 3)
+        assert np.isclose(layer.W.get_value().std(),
+                          reference.W.get_value().std(), rtol=0.05)
+
+    def test_unsupported(self, DummyInputLayer):
+        from lasagne.layers import TransposedConv2DLayer, DilatedConv2DLayer
+        input_layer = DummyInputLayer((2, 4, 9, 8))
+        for layer_class in TransposedConv2DLayer, DilatedConv2DLayer:
+            with pytest.raises(NotImplementedError) as exc:
+                layer_class(input_layer, 4, 3, num_groups=2)
+            assert "does not support num_groups" in exc.value.args[0]
+
+
 class TestConv3DLayerImplementations:
 
     @pytest.fixture(
         params=[
+            ('lasagne.layers', 'Conv3DLayer'),
             ('lasagne.layers.dnn', 'Conv3DDNNLayer'),
         ],
     )
@@ -646,6 +723,35 @@ class TestDilatedConv2DLayer:
         assert actual.shape == output.shape
         assert np.allclose(actual, output)
 
+    @pytest.mark.parametrize(
+        "input, kernel, output, kwargs",
+        list(space_to_batch_dilated_conv2d_test_sets()))
+    def test_space_to_batch(self, DummyInputLayer, input, kernel, output,
+                            kwargs):
+        from lasagne.layers import DilatedConv2DLayer
+        for input_shape in input.shape, (None, 2, None, None):
+            layer = DilatedConv2DLayer(
+                    DummyInputLayer(input_shape),
+                    num_filters=kernel.shape[0],
+                    filter_size=kernel.shape[2:],
+                    W=kernel.transpose(1, 0, 2, 3),
+                    **kwargs)
+            actual = layer.get_output_for(theano.shared(input)).eval()
+            assert actual.shape == output.shape
+            assert np.allclose(actual, output)
+        assert actual.shape == DilatedConv2DLayer(
+                DummyInputLayer(input.shape), kernel.shape[0],
+                kernel.shape[2:], **kwargs).output_shape
+
+    def test_space_to_batch_same_stack(self, DummyInputLayer):
+        from lasagne.layers import DilatedConv2DLayer
+        layer = DummyInputLayer((2, 3, 20, 20))
+        for dilation in 1, 2, 4, 8:
+            layer = DilatedConv2DLayer(layer, 3, 3, dilation=dilation,
+                                       pad='same',
+                                       implementation='space_to_batch')
+            assert layer.output_shape == (2, 3, 20, 20)
+
     def test_unsupported_settings(self, DummyInputLayer):
         from lasagne.layers import DilatedConv2DLayer
         input_layer = DummyInputLayer((10, 20, 30, 40))
@@ -656,6 +762,97 @@ class TestDilatedConv2DLayer:
         with pytest.raises(NotImplementedError) as exc:
             DilatedConv2DLayer(input_layer, 2, 3, flip_filters=True)
         assert "requires flip_filters=False" in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            DilatedConv2DLayer(input_layer, 2, 3, implementation='fft')
+        assert "implementation must be" in exc.value.args[0]
+
+
+def depthwise_conv2d_test_sets():
+    def _convert(input, kernel, output, kwargs):
+        return [floatX(input), floatX(kernel), output, kwargs]
+
+    for depth_multiplier in (1, 2):
+        for pad, stride in ((0, 1), ('same', 1), ('full', 2), (1, 2)):
+            input = np.random.random((2, 3, 7, 6))
+            kernel = np.random.random((3 * depth_multiplier, 1, 3, 3))
+            output = np.concatenate(
+                    [convNd(input[:, c:c + 1],
+                            kernel[c * depth_multiplier:
+                                   (c + 1) * depth_multiplier],
+                            pad, stride, n=2)
+                     for c in range(3)], axis=1)
+            yield _convert(input, kernel, output,
+                           {'pad': pad, 'stride': stride,
+                            'depth_multiplier': depth_multiplier})
+
+
+class TestDepthwiseConv2DLayer:
+    @pytest.mark.parametrize(
+        "input, kernel, output, kwargs", list(depthwise_conv2d_test_sets()))
+    def test_defaults(self, DummyInputLayer, input, kernel, output, kwargs):
+        from lasagne.layers import DepthwiseConv2DLayer
+        input_layer = DummyInputLayer(input.shape)
+        layer = DepthwiseConv2DLayer(input_layer, filter_size=3, W=kernel,
+                                     nonlinearity=None, **kwargs)
+        actual = layer.get_output_for(theano.shared(input)).eval()
+        assert layer.num_filters == kernel.shape[0]
+        assert actual.shape == output.shape
+        assert actual.shape == layer.output_shape
+        assert np.allclose(actual, output)
+
+    def test_default_init(self, DummyInputLayer):
+        from lasagne.layers import DepthwiseConv2DLayer
+        from lasagne.init import GlorotUniform
+        W = GlorotUniform()
+        layer = DepthwiseConv2DLayer(DummyInputLayer((2, 512, 5, 5)), 3, W=W)
+        # the fans are those of a single 3x3 filter, not of all channels
+        assert 0.31 < layer.W.get_value().std() < 0.36
+        assert W.num_groups == 1
+
+    def test_unknown_channels(self, DummyInputLayer):
+        from lasagne.layers import DepthwiseConv2DLayer
+        with pytest.raises(ValueError) as exc:
+            DepthwiseConv2DLayer(DummyInputLayer((2, None, 5, 5)), 3)
+        assert "known number of channels" in exc.value.args[0]
+
+
+class TestSeparableConv2DLayer:
+    @pytest.mark.parametrize(
+        "input, kernel, output, kwargs", list(depthwise_conv2d_test_sets()))
+    def test_defaults(self, DummyInputLayer, input, kernel, output, kwargs):
+        from lasagne.layers import SeparableConv2DLayer
+        input_layer = DummyInputLayer(input.shape)
+        pointwise = floatX(np.random.random((4, kernel.shape[0], 1, 1)))
+        layer = SeparableConv2DLayer(input_layer, 4, filter_size=3, W=kernel,
+                                     W_pointwise=pointwise,
+                                     nonlinearity=None, **kwargs)
+        actual = layer.get_output_for(theano.shared(input)).eval()
+        output = np.einsum('bchw,fc->bfhw', output, pointwise[:, :, 0, 0])
+        assert actual.shape == output.shape
+        assert actual.shape == layer.output_shape
+        assert np.allclose(actual, output)
+
+    def test_params(self, DummyInputLayer):
+        from lasagne.layers import SeparableConv2DLayer
+        layer = SeparableConv2DLayer(DummyInputLayer((2, 3, 5, 5)), 8, 3,
+                                     depth_multiplier=2, untie_biases=True)
+        assert layer.W.get_value().shape == (6, 1, 3, 3)
+        assert layer.W_pointwise.get_value().shape == (8, 6, 1, 1)
+        assert layer.b.get_value().shape == (8, 3, 3)
+        assert layer.get_params() == [layer.W, layer.b, layer.W_pointwise]
+        assert layer.output_shape == (2, 8, 3, 3)
+        assert layer.num_groups == 3
+
+    def test_default_init(self, DummyInputLayer):
+        from lasagne.layers import SeparableConv2DLayer
+        layer = SeparableConv2DLayer(DummyInputLayer((2, 512, 5, 5)), 7, 3)
+        assert 0.31 < layer.W.get_value().std() < 0.36
+
+    def test_unknown_channels(self, DummyInputLayer):
+        from lasagne.layers import SeparableConv2DLayer
+        with pytest.raises(ValueError) as exc:
+            SeparableConv2DLayer(DummyInputLayer((2, None, 5, 5)), 8, 3)
+        assert "known number of channels" in exc.value.args[0]
 
 
 class TestConv2DDNNLayer:
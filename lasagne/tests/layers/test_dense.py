@@ -136,6 +136,28 @@ class TestDenseLayer:
         assert layer.W.name == "foo" + utils.SCOPE_DELIMITER + "W"
         assert layer.b.name == "foo" + utils.SCOPE_DELIMITER + "b"
 
+    @pytest.mark.parametrize('format', ('csr', 'csc'))
+    def test_sparse_input(self, DenseLayer, format):
+        import scipy.sparse
+        from lasagne.layers import InputLayer
+        l_in = InputLayer((None, 100), sparse=format)
+        layer = DenseLayer(l_in, num_units=4,
+                           nonlinearity=lasagne.nonlinearities.tanh)
+        output = lasagne.layers.get_output(layer)
+        X = scipy.sparse.random(5, 100, density=0.05, format=format,
+                                dtype=theano.config.floatX)
+        result = output.eval({l_in.input_var: X})
+        expected = np.tanh(X.toarray().dot(layer.W.get_value()) +
+                           layer.b.get_value())
+        assert np.allclose(result, expected, atol=1e-6)
+
+        # the gradient only touches the rows of nonzero columns
+        grad = theano.grad(output.sum(), layer.W)
+        grad = grad.eval({l_in.input_var: X})
+        assert np.all(np.any(grad != 0, axis=1) <=
+                      np.any(X.toarray() != 0, axis=0))
+        assert np.allclose(grad, X.T.dot(1 - expected ** 2), atol=1e-5)
+
 
 class TestNINLayer:
     @pytest.fixture
@@ -1,7 +1,9 @@
-import numpy
+import numpy as np
 import pytest
 import theano
 
+import lasagne
+
 
 def test_embedding_2D_input():
     import numpy as np
@@ -54,3 +56,77 @@ def test_embedding_1D_input():
     output = helper.get_output(l1, x)
     f = theano.function([x], output)
     np.testing.assert_array_almost_equal(f(x_test), W[x_test])
+
+
+class TestEmbeddingBagLayer:
+    @pytest.fixture
+    def W(self):
+        return lasagne.utils.floatX(np.random.randn(7, 3))
+
+    def reference(self, W, bags, mode):
+        pool = dict(sum=np.sum, mean=np.mean, max=np.max)[mode]
+        return np.array([pool(W[bag], axis=0) if len(bag) else np.zeros(3)
+                         for bag in bags])
+
+    @pytest.mark.parametrize('mode', ('sum', 'mean', 'max'))
+    def test_offsets(self, W, mode):
+        from lasagne.layers import InputLayer, EmbeddingBagLayer
+        l_ids = InputLayer((None, ), dtype='int32')
+        l_offsets = InputLayer((4, ), dtype='int32')
+        layer = EmbeddingBagLayer(l_ids, 7, 3, mode=mode,
+                                  offsets=l_offsets, W=W)
+        assert layer.output_shape == (4, 3)
+        output = lasagne.layers.get_output(layer)
+        bags = [[1, 2, 2], [], [0], [6, 5]]
+        ids = np.array(sum(bags, []), dtype='int32')
+        offsets = np.array([0, 3, 3, 4], dtype='int32')
+        result = output.eval({l_ids.input_var: ids,
+                              l_offsets.input_var: offsets})
+        assert np.allclose(result, self.reference(W, bags, mode), atol=1e-6)
+        # trailing empty bag
+        result = output.eval({l_ids.input_var: ids[:4],
+                              l_offsets.input_var: offsets})
+        assert np.allclose(result,
+                           self.reference(W, bags[:3] + [[]], mode),
+                           atol=1e-6)
+
+    @pytest.mark.parametrize('mode', ('sum', 'mean', 'max'))
+    @pytest.mark.parametrize('masked', (False, True))
+    def test_padded(self, W, mode, masked):
+        from lasagne.layers import InputLayer, EmbeddingBagLayer
+        l_ids = InputLayer((None, 3), dtype='int32')
+        l_mask = InputLayer((None, 3)) if masked else None
+        layer = EmbeddingBagLayer(l_ids, 7, 3, mode=mode, mask_input=l_mask,
+                                  W=W)
+        assert layer.output_shape == (None, 3)
+        ids = np.array([[1, 2, 2], [4, 0, 0], [3, 6, 5]], dtype='int32')
+        mask = np.array([[1, 1, 1], [0, 0, 0], [1, 0, 1]])
+        inputs = {l_ids.input_var: ids}
+        if masked:
+            inputs[l_mask.input_var] = lasagne.utils.floatX(mask)
+            bags = [[1, 2, 2], [], [3, 5]]
+        else:
+            bags = ids.tolist()
+        result = lasagne.layers.get_output(layer).eval(inputs)
+        assert np.allclose(result, self.reference(W, bags, mode), atol=1e-6)
+
+    def test_sparse_gradient(self, W):
+        from lasagne.layers import InputLayer, EmbeddingBagLayer
+        l_ids = InputLayer((None, 2), dtype='int32')
+        layer = EmbeddingBagLayer(l_ids, 7, 3, mode='sum', W=W)
+        loss = lasagne.layers.get_output(layer).sum()
+        updates = lasagne.updates.sgd(loss, [layer.W], learning_rate=1.)
+        fn = theano.function([l_ids.input_var], updates=updates)
+        fn(np.array([[1, 3], [3, 3]], dtype='int32'))
+        expected = W.copy()
+        expected[1] -= 1
+        expected[3] -= 3
+        assert np.allclose(layer.W.get_value(), expected)
+
+    def test_invalid(self):
+        from lasagne.layers import EmbeddingBagLayer
+        with pytest.raises(ValueError):
+            EmbeddingBagLayer((None, 3), 7, 3, mode='min')
+        with pytest.raises(ValueError):
+            EmbeddingBagLayer((None, ), 7, 3, offsets=(None, ),
+                              mask_input=(None, 3))
@@ -49,3 +49,15 @@ class TestInputLayer:
         with pytest.raises(ValueError):
             InputLayer(shape=(None, 0, 0))
         InputLayer(shape=(None, 1, 1))
+
+    @pytest.mark.parametrize('format', ('csr', 'csc'))
+    def test_sparse(self, format):
+        from lasagne.layers import InputLayer
+        layer = InputLayer((None, 10), sparse=format, name="foo")
+        assert isinstance(layer.input_var, theano.sparse.SparseVariable)
+        assert layer.input_var.format == format
+        assert layer.input_var.dtype == theano.config.floatX
+        assert layer.input_var.name == "foo.input"
+        assert layer.output_shape == (None, 10)
+        with pytest.raises(ValueError):
+            InputLayer((None, 10, 10), sparse=format)
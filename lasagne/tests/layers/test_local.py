@@ -120,19 +120,39 @@ def DummyInputLayer():
 class TestLocallyConnected2DLayer:
     @pytest.mark.parametrize(
         "input, W, output, kwargs", list(locally_connected2d_test_sets()))
-    def test_defaults(self, DummyInputLayer, input, W, output, kwargs):
+    @pytest.mark.parametrize("implementation", ['shift', 'im2col'])
+    def test_defaults(self, DummyInputLayer, input, W, output, kwargs,
+                      implementation):
         from lasagne.layers import LocallyConnected2DLayer
         b, c, h, w = input.shape
         input_layer = DummyInputLayer((b, c, h, w))
         layer = LocallyConnected2DLayer(
                 input_layer,
                 W=W,
+                implementation=implementation,
                 **kwargs)
         actual = layer.get_output_for(theano.shared(input)).eval()
         assert actual.shape == output.shape
         assert actual.shape == layer.output_shape
         assert np.allclose(actual, output)
 
+    @pytest.mark.parametrize("channelwise", [True, False])
+    def test_im2col_gradient(self, DummyInputLayer, channelwise):
+        from lasagne.layers import LocallyConnected2DLayer
+        input = theano.shared(floatX(np.random.random((2, 3, 5, 4))))
+        grads = []
+        for implementation in 'shift', 'im2col':
+            layer = LocallyConnected2DLayer(
+                    DummyInputLayer((2, 3, 5, 4)), 3, (3, 5),
+                    channelwise=channelwise, implementation=implementation)
+            layer.W.set_value(floatX(np.arange(layer.W.get_value().size)
+                                     .reshape(layer.get_W_shape()) % 7))
+            cost = (layer.get_output_for(input) ** 2).sum()
+            grads.append([g.eval() for g in theano.grad(cost,
+                                                        [input, layer.W])])
+        for expected, actual in zip(*grads):
+            assert np.allclose(expected, actual)
+
     def test_unsupported_settings(self, DummyInputLayer):
         from lasagne.layers import LocallyConnected2DLayer
         input_layer = DummyInputLayer((10, 2, 4, 4))
@@ -156,3 +176,7 @@ class TestLocallyConnected2DLayer:
             LocallyConnected2DLayer(input_layer, 4, 3, channelwise=True)
         assert "A LocallyConnected2DLayer requires a fixed input shape " \
                "(except for the batch size)" in exc.value.args[0]
+        input_layer = DummyInputLayer((10, 2, 4, 4))
+        with pytest.raises(ValueError) as exc:
+            LocallyConnected2DLayer(input_layer, 4, 3, implementation='fft')
+        assert "implementation must be" in exc.value.args[0]
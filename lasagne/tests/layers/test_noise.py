@@ -156,3 +156,85 @@ class TestGaussianNoiseLayer:
 
         set_rng(rng)  # reset to original RNG for other tests
         assert numpy.allclose(result_eval1, result_eval2)
+
+
+class TestRandomStreams:
+    @pytest.fixture
+    def input_layer(self):
+        from lasagne.layers.input import InputLayer
+        return InputLayer((100, 100))
+
+    @pytest.fixture(autouse=True)
+    def restore(self):
+        from lasagne.random import get_streams, set_streams
+        rng, streams = get_rng(), get_streams()
+        yield
+        set_rng(rng)
+        set_streams(streams)
+
+    def test_named_layers_independent_of_order(self, input_layer):
+        from lasagne.layers.noise import DropoutLayer
+        input = theano.shared(numpy.ones((100, 100)))
+
+        set_rng(RandomState(42))
+        a1 = DropoutLayer(input_layer, name='a')
+        b1 = DropoutLayer(input_layer, name='b')
+        set_rng(RandomState(42))
+        get_rng().rand(10)  # other draws must not change the seeds
+        b2 = DropoutLayer(input_layer, name='b')
+        a2 = DropoutLayer(input_layer, name='a')
+
+        def sample(layer):
+            return layer.get_output_for(input).eval()
+        assert np.allclose(sample(a1), sample(a2))
+        assert np.allclose(sample(b1), sample(b2))
+        assert not np.allclose(sample(a2), sample(b2))
+
+    def test_duplicate_names(self, input_layer):
+        from lasagne.layers.noise import DropoutLayer
+        input = theano.shared(numpy.ones((100, 100)))
+        set_rng(RandomState(42))
+        a1 = DropoutLayer(input_layer, name='a')
+        a2 = DropoutLayer(input_layer, name='a')
+        result1 = a1.get_output_for(input).eval()
+        result2 = a2.get_output_for(input).eval()
+        assert not np.allclose(result1, result2)
+
+    def test_get_seed(self):
+        from lasagne.random import get_seed, MAX_SEED
+        set_rng(RandomState(1))
+        seed = get_seed('layer')
+        assert 0 < seed < MAX_SEED
+        assert get_seed('other') != seed
+        set_rng(RandomState(2))
+        assert get_seed('layer') != seed
+        # repeated names get distinct seeds until the generator is set again
+        set_rng(RandomState(1))
+        assert get_seed('layer') == seed
+        assert get_seed('layer') != seed
+        assert get_seed('layer') != get_seed('layer')
+        set_rng(RandomState(1))
+        assert get_seed('layer') == seed
+        # unnamed layers draw from the generator
+        set_rng(RandomState(1))
+        assert get_seed() == RandomState(1).randint(1, MAX_SEED)
+        assert get_seed('') != get_seed('')
+
+    @pytest.mark.parametrize('streams', ['mrg', 'numpy'])
+    def test_set_streams(self, input_layer, streams):
+        from lasagne.layers.noise import DropoutLayer, GaussianNoiseLayer
+        from lasagne.layers.special import RandomizedRectifierLayer
+        from lasagne.random import set_streams, get_streams
+        set_streams(streams)
+        input = theano.shared(-numpy.ones((100, 100)))
+        for cls in DropoutLayer, GaussianNoiseLayer, RandomizedRectifierLayer:
+            layer = cls(input_layer)
+            assert isinstance(layer._srng, get_streams())
+            result = layer.get_output_for(input).eval()
+            assert result.shape == (100, 100)
+            assert not np.allclose(result, -1)
+
+    def test_set_streams_invalid(self):
+        from lasagne.random import set_streams
+        with pytest.raises(ValueError):
+            set_streams('cuda')
@@ -440,6 +440,89 @@ class TestMaxPool2DLayer:
         assert "Expected 4 input dimensions" in exc.value.args[0]
 
 
+class TestMaxPool3DLayer:
+    def pool_test_sets_ignoreborder():
+        for pool_size in [2, 3]:
+            for stride in [1, 2, 3]:
+                for pad in range(pool_size):
+                    yield (pool_size, stride, pad)
+
+    def input_layer(self, output_shape):
+        return Mock(output_shapes=(output_shape, ))
+
+    def layer(self, input_layer, pool_size, stride=None,
+              pad=(0, 0, 0), ignore_border=True):
+        from lasagne.layers.pool import MaxPool3DLayer
+        return MaxPool3DLayer(
+            input_layer,
+            pool_size=pool_size,
+            stride=stride,
+            pad=pad,
+            ignore_border=ignore_border,
+        )
+
+    @pytest.mark.parametrize(
+        "pool_size, stride, pad", list(pool_test_sets_ignoreborder()))
+    def test_get_output_for_ignoreborder(self, pool_size,
+                                         stride, pad):
+        input = floatX(np.random.randn(2, 3, 7, 8, 6))
+        input_layer = self.input_layer(input.shape)
+        input_theano = theano.shared(input)
+
+        layer = self.layer(input_layer, pool_size, stride, pad)
+        result_eval = layer.get_output_for(input_theano).eval()
+        numpy_result = max_pool_3d_ignoreborder(
+            input, [pool_size] * 3, [stride] * 3, [pad] * 3)
+
+        assert numpy_result.shape == result_eval.shape == layer.output_shape
+        assert np.allclose(result_eval, numpy_result)
+
+    def test_get_output_for_partial_regions(self):
+        input = floatX(np.random.randn(2, 3, 7, 8, 5))
+        layer = self.layer(self.input_layer(input.shape), (3, 2, 2),
+                           ignore_border=False)
+        result_eval = layer.get_output_for(theano.shared(input)).eval()
+        # pad with -inf to cover the partial pooling regions
+        padded = np.pad(input, [(0, 0), (0, 0), (0, 2), (0, 0), (0, 1)],
+                        mode='constant', constant_values=-np.inf)
+        numpy_result = max_pool_3d_ignoreborder(padded, (3, 2, 2), (3, 2, 2),
+                                                (0, 0, 0))
+        assert numpy_result.shape == result_eval.shape == layer.output_shape
+        assert np.allclose(result_eval, numpy_result)
+
+    @pytest.mark.parametrize(
+        "input_shape,output_shape",
+        [((32, 32, 64, 24, 24), (32, 32, 32, 12, 12)),
+         ((None, 32, 48, 24, 24), (None, 32, 24, 12, 12)),
+         ((32, None, 32, 24, 24), (32, None, 16, 12, 12)),
+         ((32, 64, None, 24, 24), (32, 64, None, 12, 12)),
+         ((32, 64, 12, None, None), (32, 64, 6, None, None))],
+    )
+    def test_get_output_shape_for(self, input_shape, output_shape):
+        input_layer = self.input_layer(input_shape)
+        layer = self.layer(input_layer, pool_size=(2, 2, 2))
+        assert layer.get_output_shape_for(input_shape) == output_shape
+
+    @pytest.mark.parametrize("mode", ['average_inc_pad', 'average_exc_pad'])
+    def test_average(self, mode):
+        from lasagne.layers.pool import Pool3DLayer
+        input = floatX(np.random.randn(2, 3, 4, 6, 2))
+        layer = Pool3DLayer(self.input_layer(input.shape), 2, mode=mode)
+        result_eval = layer.get_output_for(theano.shared(input)).eval()
+        numpy_result = input.reshape(2, 3, 2, 2, 3, 2, 1, 2).mean(
+            axis=(3, 5, 7))
+        assert np.allclose(result_eval, numpy_result)
+
+    def test_fail_on_mismatching_dimensionality(self):
+        from lasagne.layers.pool import MaxPool3DLayer
+        with pytest.raises(ValueError) as exc:
+            MaxPool3DLayer((10, 20, 30, 40), 3, 2)
+        assert "Expected 5 input dimensions" in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            MaxPool3DLayer((10, 20, 30, 40, 50, 60), 3, 2)
+        assert "Expected 5 input dimensions" in exc.value.args[0]
+
+
 class TestMaxPool2DCCLayer:
     def pool_test_sets():
         for pool_size in [2, 3]:
@@ -996,6 +1079,67 @@ class TestUpscale3DLayer:
             input_shape) == output_shape
 
 
+def pixel_shuffle(data, scale_factor):
+    a, b = scale_factor
+    N, C, H, W = data.shape
+    result = np.empty((N, C // (a * b), H * a, W * b), dtype=data.dtype)
+    for c in range(C):
+        i, j = divmod(c % (a * b), b)
+        result[:, c // (a * b), i::a, j::b] = data[:, c]
+    return result
+
+
+class TestPixelShuffleLayer:
+
+    @pytest.mark.parametrize("scale_factor", [1, 2, (2, 3)])
+    def test_get_output_for(self, scale_factor):
+        from lasagne.layers import InputLayer, PixelShuffleLayer
+        from lasagne.utils import as_tuple
+        input = floatX(np.random.randn(3, 12, 5, 4))
+        layer = PixelShuffleLayer(InputLayer((None, 12, 5, 4)),
+                                  scale_factor)
+        result = layer.get_output_for(theano.shared(input)).eval()
+        expected = pixel_shuffle(input, as_tuple(scale_factor, 2))
+        assert layer.output_shape == (None, ) + expected.shape[1:]
+        assert np.allclose(result, expected)
+
+    def test_get_output_shape_for(self):
+        from lasagne.layers import PixelShuffleLayer
+        layer = PixelShuffleLayer((None, 18, 5, None), (3, 2))
+        assert layer.output_shape == (None, 3, 15, None)
+        assert layer.get_output_shape_for((4, None, 2, 3)) == (4, None, 6, 6)
+
+    def test_invalid(self):
+        from lasagne.layers import PixelShuffleLayer
+        with pytest.raises(ValueError) as exc:
+            PixelShuffleLayer((None, 6, 5, 4), 2)
+        assert 'divisible' in exc.value.args[0]
+        with pytest.raises(ValueError):
+            PixelShuffleLayer((None, 8, 5, 4), (2, 0))
+        with pytest.raises(ValueError):
+            PixelShuffleLayer((None, 8, 5), 2)
+
+    def test_pixel_shuffle_upsample(self):
+        from lasagne.layers import (InputLayer, Conv2DLayer,
+                                    PixelShuffleLayer, pixel_shuffle_upsample,
+                                    get_output)
+        from lasagne.nonlinearities import identity
+        l_in = InputLayer((None, 3, 6, 5))
+        layer = pixel_shuffle_upsample(l_in, 2, (2, 3), name='up',
+                                       nonlinearity=identity)
+        l_conv = layer.input_layers[0]
+        assert isinstance(layer, PixelShuffleLayer)
+        assert isinstance(l_conv, Conv2DLayer)
+        assert (l_conv.name, layer.name) == ('up', 'up_shuffle')
+        assert l_conv.get_W_shape() == (12, 3, 3, 3)
+        assert layer.output_shape == (None, 2, 12, 15)
+        # with ICNR, the output starts as a nearest-neighbour upscaling
+        input = floatX(np.random.randn(2, 3, 6, 5))
+        result = get_output(layer, input).eval()
+        assert np.allclose(result, upscale_2d(result[:, :, ::2, ::3], (2, 3)),
+                           atol=1e-6)
+
+
 class TestFeatureWTALayer(object):
     @pytest.fixture
     def FeatureWTALayer(self):
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+import lasagne
+from lasagne.layers import InputLayer, RNNLayer, helper
+from lasagne.layers.recurrent_new import *
+
+
+def scan_inner_ops(output):
+    from theano.scan_module.scan_op import Scan
+    ops = []
+    for node in theano.gof.graph.io_toposort(
+            theano.gof.graph.inputs([output]), [output]):
+        if isinstance(node.op, Scan):
+            ops.extend(theano.gof.graph.ops(node.op.inputs, node.op.outputs))
+    return ops
+
+
+@pytest.mark.parametrize("step_cls", [StandardStep, GRUStep, LSTMStep,
+                                      RWAStep])
+@pytest.mark.parametrize("pre_compute_input", [True, False])
+def test_variational_dropout_deterministic(step_cls, pre_compute_input):
+    l_in = InputLayer((4, 3, 5))
+    l_rec = RNNLayer(l_in, step_cls((None, 5), 6, dropout_input=0.5,
+                                    dropout_hidden=0.5,
+                                    pre_compute_input=pre_compute_input))
+    x = np.random.randn(4, 3, 5).astype(theano.config.floatX)
+    det = helper.get_output(l_rec, x, deterministic=True).eval()
+    noisy = helper.get_output(l_rec, x).eval()
+    assert det.shape == noisy.shape == (4, 3, 6)
+    assert not np.allclose(det, noisy)
+
+    # without dropout, the deterministic output must not change
+    l_ref = RNNLayer(l_in, step_cls((None, 5), 6,
+                                    pre_compute_input=pre_compute_input))
+    lasagne.layers.set_all_param_values(
+        l_ref, lasagne.layers.get_all_param_values(l_rec))
+    ref = helper.get_output(l_ref, x, deterministic=True).eval()
+    assert np.allclose(det, ref)
+
+
+def test_variational_dropout_masks_outside_scan():
+    from theano.sandbox.rng_mrg import mrg_uniform
+    l_in = InputLayer((4, 3, 5))
+    l_rec = RNNLayer(l_in, LSTMStep((None, 5), 6, dropout_input=0.3,
+                                    dropout_hidden=0.3))
+    output = helper.get_output(l_rec)
+    assert scan_inner_ops(output)
+    assert not any(isinstance(op, mrg_uniform)
+                   for op in scan_inner_ops(output))
+    # gradients can be taken through the masked recurrence
+    params = helper.get_all_params(l_rec, trainable=True)
+    theano.function([l_in.input_var], T.grad(output.sum(), params))
+
+
+def test_variational_dropout_masks():
+    step = GRUStep((None, 5), 6, dropout_input=0.2, dropout_hidden=0.5)
+    x = T.tensor3()
+    input_masks, hidden_mask = step.get_dropout_masks((x, ))
+    x_val = np.ones((4, 30, 5), dtype=theano.config.floatX)
+    input_mask = input_masks[0].eval({x: x_val})
+    assert input_mask.shape == (1, 30, 5)
+    assert np.allclose(np.unique(input_mask), [0, 1.25])
+    hidden = hidden_mask.eval({x: x_val})
+    assert hidden.shape == (30, 6)
+    assert np.allclose(np.unique(hidden), [0, 2])
+
+    assert step.get_dropout_masks((x, ), deterministic=True) == (None, None)
+    step = GRUStep((None, 5), 6)
+    assert step.get_dropout_masks((x, )) == (None, None)
@@ -0,0 +1,133 @@
+from mock import Mock
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+import lasagne
+
+
+def log_softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    return x - np.log(np.exp(x).sum(axis=1, keepdims=True))
+
+
+class TestSampledSoftmaxLayer:
+    @pytest.fixture
+    def layer(self):
+        from lasagne.layers import SampledSoftmaxLayer
+        return SampledSoftmaxLayer((None, 4), num_units=10, num_sampled=3,
+                                   b=lasagne.init.Normal())
+
+    def logits(self, layer, X):
+        return X.dot(layer.W.get_value().T) + layer.b.get_value()
+
+    def test_init(self, layer):
+        assert layer.W.get_value().shape == (10, 4)
+        assert layer.b.get_value().shape == (10, )
+        assert layer.output_shape == (None, 10)
+        with pytest.raises(ValueError):
+            lasagne.layers.SampledSoftmaxLayer((None, 3, 4), 10, 3)
+
+    def test_get_output_for(self, layer):
+        x = T.matrix('x')
+        X = lasagne.utils.floatX(np.random.randn(5, 4))
+        result = layer.get_output_for(x).eval({x: X})
+        assert np.allclose(result, np.exp(log_softmax(self.logits(layer, X))),
+                           atol=1e-6)
+
+    def test_deterministic_loss(self, layer):
+        x, t = T.matrix('x'), T.ivector('t')
+        X = lasagne.utils.floatX(np.random.randn(5, 4))
+        targets = np.array([0, 9, 3, 3, 5], dtype='int32')
+        loss = layer.get_loss_for(x, t, deterministic=True)
+        expected = -log_softmax(self.logits(layer, X))[np.arange(5), targets]
+        assert np.allclose(loss.eval({x: X, t: targets}), expected,
+                           atol=1e-5)
+
+    @pytest.mark.parametrize('remove_accidental_hits', (True, False))
+    def test_sampled_loss(self, layer, remove_accidental_hits):
+        layer.remove_accidental_hits = remove_accidental_hits
+        sampled = np.array([3, 0, 3])
+        # uniform values mapping to the sampled classes
+        u = np.log(sampled + 1.5) / np.log(11)
+        layer._srng = Mock(uniform=lambda size, dtype: T.constant(u))
+        x, t = T.matrix('x'), T.ivector('t')
+        X = lasagne.utils.floatX(np.random.randn(5, 4))
+        targets = np.array([0, 9, 3, 3, 5], dtype='int32')
+        loss = layer.get_loss_for(x, t).eval({x: X, t: targets})
+
+        log_q = np.log(3 * np.log((np.arange(10) + 2.) / (np.arange(10) + 1))
+                       / np.log(11))
+        logits = self.logits(layer, X) - log_q
+        candidates = np.concatenate([targets[:, None],
+                                     np.tile(sampled, (5, 1))], axis=1)
+        logits = logits[np.arange(5)[:, None], candidates]
+        if remove_accidental_hits:
+            logits[:, 1:][candidates[:, 1:] == targets[:, None]] = -np.inf
+        assert np.allclose(loss, -log_softmax(logits)[:, 0], atol=1e-5)
+
+    def test_sampler(self, layer):
+        layer.num_sampled = 20000
+        sampled = layer._sample_classes().eval()
+        counts = np.bincount(sampled, minlength=10) / 20000.
+        probs = np.log((np.arange(10) + 2.) / (np.arange(10) + 1)) / np.log(11)
+        assert np.allclose(counts, probs, atol=0.015)
+
+    def test_sparse_update(self, layer):
+        x, t = T.matrix('x'), T.ivector('t')
+        loss = layer.get_loss_for(x, t).mean()
+        updates = lasagne.updates.sgd(loss, [layer.W, layer.b], 0.1)
+        assert isinstance(updates[layer.W].owner.op,
+                          T.subtensor.AdvancedIncSubtensor1)
+        assert isinstance(updates[layer.b].owner.op,
+                          T.subtensor.AdvancedIncSubtensor1)
+
+
+class TestAdaptiveSoftmaxLayer:
+    @pytest.fixture
+    def layer(self):
+        from lasagne.layers import AdaptiveSoftmaxLayer
+        return AdaptiveSoftmaxLayer((None, 16), num_units=20,
+                                    cutoffs=[4, 10], div_value=2.)
+
+    def test_init(self, layer):
+        assert layer.W_head.get_value().shape == (16, 6)
+        assert layer.b_head.get_value().shape == (6, )
+        assert [W.get_value().shape for W in layer.W_proj] == [(16, 8),
+                                                               (16, 4)]
+        assert [W.get_value().shape for W in layer.W_tail] == [(8, 6),
+                                                               (4, 10)]
+        assert layer.output_shape == (None, 20)
+
+    @pytest.mark.parametrize('cutoffs', ([], [0, 3], [4, 4], [5, 3], [20]))
+    def test_invalid_cutoffs(self, cutoffs):
+        from lasagne.layers import AdaptiveSoftmaxLayer
+        with pytest.raises(ValueError):
+            AdaptiveSoftmaxLayer((None, 16), 20, cutoffs)
+
+    def test_output_and_loss(self, layer):
+        x, t = T.matrix('x'), T.ivector('t')
+        X = lasagne.utils.floatX(np.random.randn(6, 16))
+        targets = np.array([0, 3, 4, 9, 10, 19], dtype='int32')
+        probs = layer.get_output_for(x).eval({x: X})
+        assert probs.shape == (6, 20)
+        assert np.allclose(probs.sum(axis=1), 1, atol=1e-5)
+        loss = layer.get_loss_for(x, t).eval({x: X, t: targets})
+        assert np.allclose(loss, -np.log(probs[np.arange(6), targets]),
+                           atol=1e-4)
+        # a batch without targets in some cluster
+        loss = layer.get_loss_for(x, t).eval({x: X[:2], t: targets[:2]})
+        assert np.allclose(loss, -np.log(probs[np.arange(2), targets[:2]]),
+                           atol=1e-4)
+
+    def test_gradient(self, layer):
+        x, t = T.matrix('x'), T.ivector('t')
+        loss = layer.get_loss_for(x, t).mean()
+        grads = theano.grad(loss, layer.get_params())
+        fn = theano.function([x, t], grads)
+        values = fn(lasagne.utils.floatX(np.random.randn(3, 16)),
+                    np.array([1, 5, 6], dtype='int32'))
+        # the second tail cluster is not used
+        assert np.all(values[-1] == 0)
+        assert all(np.any(v != 0) for v in values[:-2])
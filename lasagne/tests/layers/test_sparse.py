@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import scipy.sparse
+import theano
+import theano.tensor as T
+import lasagne
+
+
+class TestSparseDenseLayer:
+    @pytest.fixture
+    def SparseDenseLayer(self):
+        from lasagne.layers.sparse import SparseDenseLayer
+        return SparseDenseLayer
+
+    @pytest.fixture
+    def W(self):
+        W = np.random.randn(12, 5)
+        W[np.random.rand(*W.shape) < 0.7] = 0
+        return lasagne.utils.floatX(W)
+
+    def test_init(self, SparseDenseLayer, W):
+        layer = SparseDenseLayer((None, 12), 5, W=W)
+        value = layer.W.get_value()
+        assert scipy.sparse.issparse(value)
+        assert value.nnz == np.count_nonzero(W)
+        assert np.all(value.toarray() == W)
+        assert layer.density == np.count_nonzero(W) / 60.
+        assert layer.W in layer.get_params(regularizable=True)
+
+    def test_init_initializer(self, SparseDenseLayer):
+        layer = SparseDenseLayer((None, 12), 5)
+        assert layer.W.get_value().shape == (12, 5)
+        assert layer.density == 1
+
+    def test_init_wrong_shape(self, SparseDenseLayer, W):
+        with pytest.raises(ValueError) as exc:
+            SparseDenseLayer((None, 10), 5, W=W)
+        assert "shape" in exc.value.args[0]
+
+    @pytest.mark.parametrize('num_leading_axes', (1, 2, -1))
+    def test_get_output_for(self, SparseDenseLayer, W, num_leading_axes):
+        input_shape = (2, 3, 4) if num_leading_axes == 1 else (2, 3, 12)
+        kwargs = dict(num_units=5, b=np.arange(5.),
+                      num_leading_axes=num_leading_axes,
+                      nonlinearity=lasagne.nonlinearities.tanh)
+        dense = lasagne.layers.DenseLayer(input_shape, W=W, **kwargs)
+        sparse = SparseDenseLayer(input_shape, W=W, **kwargs)
+        assert sparse.output_shape == dense.output_shape
+        x = T.tensor3('x')
+        X = lasagne.utils.floatX(np.random.randn(*input_shape))
+        expected = dense.get_output_for(x).eval({x: X})
+        result = sparse.get_output_for(x).eval({x: X})
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected, atol=1e-6)
+
+    def test_sgd_keeps_sparsity(self, SparseDenseLayer, W):
+        layer = SparseDenseLayer((None, 12), 5, W=W)
+        x = T.matrix('x')
+        loss = layer.get_output_for(x).sum()
+        updates = lasagne.updates.sgd(loss, layer.get_params(), 0.1)
+        train_fn = theano.function([x], loss, updates=updates)
+        train_fn(lasagne.utils.floatX(np.random.rand(4, 12)))
+        value = layer.W.get_value()
+        assert scipy.sparse.issparse(value)
+        assert np.all((value.toarray() != 0) <= (W != 0))
+        assert np.any(value.toarray() != W)
@@ -167,6 +167,35 @@ class TestNonlinearityLayer:
         assert result is nonlinearity.return_value
 
 
+class TestLogitsLayer:
+    @pytest.fixture
+    def LogitsLayer(self):
+        from lasagne.layers.special import LogitsLayer
+        return LogitsLayer
+
+    def test_get_output(self, LogitsLayer):
+        from lasagne.layers import InputLayer, DenseLayer, get_output
+        l_in = InputLayer((None, 5))
+        l_dense = DenseLayer(l_in, 3, nonlinearity=None)
+        layer = LogitsLayer(l_dense)
+        x = np.random.randn(4, 5).astype(theano.config.floatX)
+        logits = get_output(l_dense, x).eval()
+        assert np.allclose(get_output(layer, x).eval(), logits)
+        probs = get_output(layer, x, probabilities=True).eval()
+        expected = np.exp(logits) / np.exp(logits).sum(1, keepdims=True)
+        assert np.allclose(probs, expected)
+        assert layer.output_shape == (None, 3)
+
+    def test_nonlinearity(self, LogitsLayer, dummy_input_layer):
+        nonlinearity = Mock()
+        layer = LogitsLayer(dummy_input_layer, nonlinearity=nonlinearity)
+        input = theano.tensor.matrix()
+        assert layer.get_output_for(input) is input
+        result = layer.get_output_for(input, probabilities=True)
+        nonlinearity.assert_called_with(input)
+        assert result is nonlinearity.return_value
+
+
 class TestBiasLayer:
     @pytest.fixture
     def BiasLayer(self):
@@ -0,0 +1,144 @@
+import json
+import time
+
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+from lasagne.layers import InputLayer, Conv1DLayer
+
+
+class Sleep(theano.Op):
+    __props__ = ()
+
+    def make_node(self, x):
+        x = T.as_tensor_variable(x)
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        time.sleep(0.02)
+        outputs[0][0] = inputs[0].copy()
+
+    def grad(self, inputs, output_grads):
+        return output_grads
+
+
+def pointwise(input, filters, image_shape=None, filter_shape=None,
+              border_mode='valid', subsample=(1,), filter_flip=True):
+    # a convolution with filters of length 1
+    return T.tensordot(filters[:, :, 0], input, [[1], [1]]).dimshuffle(
+            1, 0, 2)
+
+
+def slow(*args, **kwargs):
+    return Sleep()(pointwise(*args, **kwargs))
+
+
+def wrong(*args, **kwargs):
+    return 2 * pointwise(*args, **kwargs)
+
+
+def failing(*args, **kwargs):
+    raise NotImplementedError()
+
+
+class PointwiseConvLayer(Conv1DLayer):
+    pass
+
+
+@pytest.fixture
+def candidates():
+    from lasagne import autotune
+    calls = []
+
+    def counted(*args, **kwargs):
+        calls.append(True)
+        return pointwise(*args, **kwargs)
+
+    autotune.register_convolution(PointwiseConvLayer, 'failing', failing)
+    autotune.register_convolution(PointwiseConvLayer, 'slow', slow)
+    autotune.register_convolution(PointwiseConvLayer, 'wrong', wrong)
+    autotune.register_convolution(PointwiseConvLayer, 'fast', counted)
+    yield calls
+    del autotune._convolutions[PointwiseConvLayer]
+
+
+@pytest.fixture
+def network():
+    l_in = InputLayer((None, 3, 10))
+    return PointwiseConvLayer(l_in, num_filters=4, filter_size=1,
+                              convolution=failing)
+
+
+def test_autotune(candidates, network, tmpdir):
+    from lasagne.autotune import autotune, _convolutions
+    cache = str(tmpdir.join('cache', 'autotune.json'))
+    with pytest.warns(UserWarning,
+                      match='wrong gives results different from slow'):
+        choices = autotune(network, batch_size=5, cache=cache)
+    assert list(choices.items()) == [(network, 'fast')]
+    assert network.convolution is _convolutions[PointwiseConvLayer]['fast']
+    with open(cache) as f:
+        entries = json.load(f)
+    assert list(entries.values()) == ['fast']
+
+    # a second call takes the choice from the cache without benchmarks
+    del candidates[:]
+    network.convolution = failing
+    assert autotune(network, batch_size=5, cache=cache)[network] == 'fast'
+    assert not candidates
+    # another batch size is tuned separately
+    autotune(network, batch_size=6, cache=cache)
+    with open(cache) as f:
+        assert len(json.load(f)) == 2
+
+
+def test_output(candidates, network):
+    from lasagne.autotune import autotune
+    from lasagne.layers import get_output
+    with pytest.warns(UserWarning):
+        autotune(network, batch_size=5, cache=False)
+    x = np.random.randn(5, 3, 10).astype(theano.config.floatX)
+    W = network.W.get_value()
+    expected = np.maximum(np.einsum('fc,bcl->bfl', W[:, :, 0], x), 0)
+    assert np.allclose(get_output(network, x).eval(), expected, atol=1e-5)
+
+
+def test_no_batch_size(candidates, network):
+    from lasagne.autotune import autotune
+    with pytest.raises(ValueError) as exc:
+        autotune(network, cache=False)
+    assert 'batch_size' in exc.value.args[0]
+
+
+def test_nothing_works(network):
+    from lasagne import autotune
+    autotune.register_convolution(PointwiseConvLayer, 'failing', failing)
+    try:
+        with pytest.raises(RuntimeError) as exc:
+            autotune.autotune(network, batch_size=5, cache=False)
+        assert 'no convolution implementation' in exc.value.args[0]
+    finally:
+        del autotune._convolutions[PointwiseConvLayer]
+
+
+def test_skips_other_layers(tmpdir):
+    from lasagne.autotune import autotune
+    from lasagne.layers import DenseLayer
+    l_out = DenseLayer(InputLayer((None, 3)), 2)
+    assert autotune(l_out, cache=False) == {}
+
+
+@pytest.mark.parametrize('os_name', ['posix', 'nt'])
+def test_save_cache_without_replace(tmpdir, monkeypatch, os_name):
+    import os
+    from lasagne.autotune import _load_cache, _save_cache
+    filename = str(tmpdir.join('cache.json'))
+    _save_cache(filename, {'a': 1})
+    # Python 2 has no os.replace
+    monkeypatch.delattr(os, 'replace')
+    monkeypatch.setattr(os, 'name', os_name)
+    _save_cache(filename, {'b': 2})
+    assert _load_cache(filename) == {'b': 2}
+    assert os.listdir(str(tmpdir)) == ['cache.json']
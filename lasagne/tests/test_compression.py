@@ -0,0 +1,215 @@
+import pytest
+import numpy as np
+import scipy.sparse
+import theano
+import theano.tensor as T
+import lasagne
+
+from collections import OrderedDict
+
+
+class TestPruneByMagnitude(object):
+    @pytest.fixture
+    def network(self):
+        l_1 = lasagne.layers.InputLayer((None, 10))
+        l_2 = lasagne.layers.DenseLayer(l_1, num_units=20)
+        l_3 = lasagne.layers.DenseLayer(l_2, num_units=30)
+        return l_2, l_3
+
+    def test_per_param(self, network):
+        from lasagne.compression import prune_by_magnitude
+        l_2, l_3 = network
+        W2, W3 = l_2.W.get_value(), l_3.W.get_value()
+        masks = prune_by_magnitude(l_3, 0.75)
+        for W_before, W in [(W2, l_2.W.get_value()), (W3, l_3.W.get_value())]:
+            assert np.sum(W == 0) == W.size * 3 // 4
+            # the remaining weights are unchanged and the largest ones
+            kept = W != 0
+            assert np.all(W[kept] == W_before[kept])
+            assert (np.abs(W_before[kept]).min() >=
+                    np.abs(W_before[~kept]).max())
+        # biases are not pruned by default
+        assert np.all(l_3.b.get_value() == 0)
+        assert list(masks) == [l_2.W, l_3.W]
+        for param, mask in masks.items():
+            assert mask.dtype == param.dtype
+            assert np.all(mask.get_value() == (param.get_value() != 0))
+
+    def test_global(self, network):
+        from lasagne.compression import prune_by_magnitude
+        l_2, l_3 = network
+        l_2.W.set_value(l_2.W.get_value() * 10)
+        prune_by_magnitude(l_3, 0.5, scope='global')
+        W2, W3 = l_2.W.get_value(), l_3.W.get_value()
+        assert np.sum(W2 == 0) + np.sum(W3 == 0) == (W2.size + W3.size) // 2
+        assert np.mean(W2 == 0) < np.mean(W3 == 0)
+
+    def test_gradual(self, network):
+        from lasagne.compression import prune_by_magnitude
+        l_2, l_3 = network
+        masks = prune_by_magnitude(l_3, 0.2)
+        mask_vars = list(masks.values())
+        W = l_3.W.get_value()
+        assert prune_by_magnitude(l_3, 0.6, masks=masks) is masks
+        assert list(masks.values()) == mask_vars
+        assert np.mean(masks[l_3.W].get_value() == 0) == 0.6
+        # weights pruned before stay pruned
+        assert np.all(l_3.W.get_value()[W == 0] == 0)
+
+    def test_tags(self, network):
+        from lasagne.compression import prune_by_magnitude
+        l_2, l_3 = network
+        l_3.b.set_value(np.arange(30).astype(theano.config.floatX))
+        masks = prune_by_magnitude(l_3, 0.5, trainable=True)
+        assert len(masks) == 4
+        assert np.sum(l_3.b.get_value() == 0) == 15
+
+    def test_sparse_param(self):
+        from lasagne.compression import prune_by_magnitude
+        W = np.random.randn(10, 20)
+        W[:5] = 0
+        l_sparse = lasagne.layers.SparseDenseLayer((None, 10), 20, W=W)
+        masks = prune_by_magnitude(l_sparse, 0.75)
+        assert len(masks) == 0
+        value = l_sparse.W.get_value()
+        assert scipy.sparse.issparse(value)
+        assert value.nnz == 50
+        assert np.abs(value.data).min() >= np.sort(np.abs(W[5:].ravel()))[50]
+
+    def test_invalid(self, network):
+        from lasagne.compression import prune_by_magnitude
+        with pytest.raises(ValueError):
+            prune_by_magnitude(network[1], 1.5)
+        with pytest.raises(ValueError):
+            prune_by_magnitude(network[1], 0.5, scope='layer')
+
+
+def test_polynomial_sparsity():
+    from lasagne.compression import polynomial_sparsity
+    schedule = [polynomial_sparsity(t, 0.8, begin_step=2, end_step=6)
+                for t in range(10)]
+    assert schedule[:3] == [0, 0, 0]
+    assert np.allclose(schedule[3:7], [0.8 * (1 - 0.75 ** 3),
+                                       0.8 * (1 - 0.5 ** 3),
+                                       0.8 * (1 - 0.25 ** 3), 0.8])
+    assert schedule[7:] == [0.8] * 3
+    assert np.all(np.diff(schedule) >= 0)
+    assert polynomial_sparsity(0, 0.8, 0, 4, initial_sparsity=0.4) == 0.4
+    with pytest.raises(ValueError):
+        polynomial_sparsity(0, 0.8, 4, 4)
+
+
+def test_mask_updates():
+    from lasagne.compression import prune_by_magnitude, mask_updates
+    l_in = lasagne.layers.InputLayer((None, 10))
+    l_out = lasagne.layers.DenseLayer(l_in, num_units=5)
+    x = T.matrix('x')
+    loss = lasagne.layers.get_output(l_out, x).sum()
+    params = lasagne.layers.get_all_params(l_out)
+    masks = prune_by_magnitude(l_out, 0.5)
+    updates = lasagne.updates.momentum(loss, params, learning_rate=0.1)
+    masked = mask_updates(updates, masks)
+    assert isinstance(masked, OrderedDict)
+    assert list(masked) == list(updates)
+    assert masked[l_out.b] is updates[l_out.b]
+    train_fn = theano.function([x], loss, updates=masked)
+    X = lasagne.utils.floatX(np.random.rand(4, 10))
+    for _ in range(3):
+        train_fn(X)
+    assert np.mean(l_out.W.get_value() == 0) == 0.5
+    # pruning further takes effect without recompiling
+    prune_by_magnitude(l_out, 0.8, masks=masks)
+    train_fn(X)
+    assert np.mean(l_out.W.get_value() == 0) == 0.8
+
+
+class TestLowRankFactorize(object):
+    def low_rank_weights(self, shape, rank):
+        W = np.random.randn(shape[0], rank).dot(np.random.randn(rank,
+                                                                shape[1]))
+        return lasagne.utils.floatX(W)
+
+    def test_dense(self):
+        from lasagne.compression import low_rank_factorize
+        L = lasagne.layers
+        l_in = L.InputLayer((None, 3, 40))
+        l_hid = L.DenseLayer(l_in, 50, W=self.low_rank_weights((40, 50), 5),
+                             b=np.arange(50.), num_leading_axes=2,
+                             name='hid')
+        l_out = L.DenseLayer(l_hid, 10)
+        x = T.tensor3('x')
+        X = lasagne.utils.floatX(np.random.randn(4, 3, 40))
+        expected = L.get_output(l_out, x).eval({x: X})
+        replaced = low_rank_factorize(l_out, layers=[l_hid], energy=0.999)
+        l_new = replaced[l_hid]
+        assert list(replaced) == [l_hid]
+        assert l_out.input_layers == (l_new, )
+        l_factor = l_new.input_layers[0]
+        assert l_factor.input_layers == (l_in, )
+        assert l_factor.output_shape == (None, 3, 5)
+        assert l_factor.b is None and l_new.b is l_hid.b
+        assert l_factor.nonlinearity is lasagne.nonlinearities.identity
+        assert l_new.nonlinearity is l_hid.nonlinearity
+        assert l_factor.name == 'hid_factor' and l_new.name == 'hid'
+        assert np.allclose(L.get_output(l_out, x).eval({x: X}), expected,
+                           rtol=1e-4, atol=1e-4)
+
+    def test_chained(self):
+        from lasagne.compression import low_rank_factorize
+        L = lasagne.layers
+        l_in = L.InputLayer((None, 30))
+        l_1 = L.DenseLayer(l_in, 200, W=self.low_rank_weights((30, 200), 5))
+        l_2 = L.DenseLayer(l_1, 200, W=self.low_rank_weights((200, 200), 5))
+        l_out = L.DenseLayer(l_2, 10, W=self.low_rank_weights((200, 10), 5))
+        x = T.matrix('x')
+        X = lasagne.utils.floatX(np.random.randn(4, 30))
+        expected = L.get_output(l_out, x).eval({x: X})
+        replaced = low_rank_factorize(l_out, rank=5)
+        assert list(replaced) == [l_1, l_2, l_out]
+        all_layers = L.get_all_layers(replaced[l_out])
+        assert not any(l in replaced for l in all_layers)
+        assert len(all_layers) == 7
+        assert np.allclose(L.get_output(replaced[l_out], x).eval({x: X}),
+                           expected, rtol=1e-3, atol=1e-3)
+
+    @pytest.mark.parametrize('untie_biases', (False, True))
+    def test_nin(self, untie_biases):
+        from lasagne.compression import low_rank_factorize
+        L = lasagne.layers
+        l_in = L.InputLayer((None, 20, 2, 3))
+        l_out = L.NINLayer(l_in, 30, untie_biases=untie_biases,
+                           W=self.low_rank_weights((20, 30), 3))
+        x = T.tensor4('x')
+        X = lasagne.utils.floatX(np.random.randn(4, 20, 2, 3))
+        expected = L.get_output(l_out, x).eval({x: X})
+        l_new = low_rank_factorize(l_out, rank=3)[l_out]
+        assert l_new.input_layers[0].output_shape == (None, 3, 2, 3)
+        assert np.allclose(L.get_output(l_new, x).eval({x: X}), expected,
+                           rtol=1e-4, atol=1e-4)
+
+    def test_rank_selection(self):
+        from lasagne.compression import low_rank_factorize
+        L = lasagne.layers
+        l_in = L.InputLayer((None, 100))
+        l_1 = L.DenseLayer(l_in, 100)
+        l_2 = L.DenseLayer(l_1, 100)
+        l_3 = L.DenseLayer(l_2, 100)
+        l_3.W.set_value(l_3.W.get_value() * 0 +
+                        self.low_rank_weights((100, 100), 1))
+        replaced = low_rank_factorize(
+                l_3, rank={l_1: 10}, energy={l_3: 0.99}, flop_budget=0.25)
+        ranks = [l.input_layers[0].num_units for l in replaced.values()]
+        # 0.25 * 100 * 100 / (100 + 100) = 12.5
+        assert ranks == [10, 12, 1]
+        # the cost of a rank of 50 would not be lower
+        assert low_rank_factorize(replaced[l_3], rank=50) == {}
+
+    def test_invalid(self):
+        from lasagne.compression import low_rank_factorize
+        L = lasagne.layers
+        l_in = L.InputLayer((None, 10))
+        l_out = L.DenseLayer(l_in, 10)
+        with pytest.raises(ValueError):
+            low_rank_factorize(l_out)
+        with pytest.raises(TypeError):
+            low_rank_factorize(l_out, layers=[l_in], rank=1)
@@ -0,0 +1,327 @@
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+
+floatX = theano.config.floatX
+
+
+class TestSharedDataset:
+
+    @pytest.fixture
+    def arrays(self):
+        images = np.random.randint(256, size=(10, 1, 2, 3)).astype(np.uint8)
+        labels = np.random.randint(5, size=10).astype(np.uint8)
+        return images, labels
+
+    @pytest.fixture
+    def dataset(self, arrays):
+        from lasagne.data import SharedDataset
+        return SharedDataset(arrays, batch_size=4, scale=[0.5, None])
+
+    def test_batches(self, dataset, arrays):
+        images, labels = arrays
+        x = T.tensor4('x', dtype=floatX)
+        t = T.ivector('t')
+        fn = dataset.function([x, t], [x, t])
+        assert len(dataset) == 10
+        assert dataset.num_batches == 3
+        for index in range(3):
+            rows = slice(index * 4, (index + 1) * 4)
+            x_batch, t_batch = fn(index)
+            assert x_batch.dtype == floatX
+            assert t_batch.dtype == 'int32'
+            assert np.allclose(x_batch, images[rows] * 0.5)
+            assert np.all(t_batch == labels[rows])
+
+    def test_broadcastable_input(self, dataset, arrays):
+        from lasagne.layers import InputLayer
+        l_in = InputLayer((None, 1, 2, 3))
+        assert l_in.input_var.broadcastable[1]
+        fn = dataset.function([l_in.input_var, T.ivector()],
+                              l_in.input_var.sum())
+        assert np.allclose(fn(0), arrays[0][:4].sum() * 0.5)
+
+    def test_shuffle(self, dataset, arrays):
+        images, labels = arrays
+        x = T.tensor4('x', dtype=floatX)
+        t = T.ivector('t')
+        fn = dataset.function([x, t], [x, t], shuffled=True)
+        # unshuffled order before the first call of shuffle
+        assert np.all(fn(0)[1] == labels[:4])
+        dataset.shuffle(np.random.RandomState(1))
+        order = np.random.RandomState(1).permutation(10)
+        seen = []
+        for index in range(dataset.num_batches):
+            x_batch, t_batch = fn(index)
+            rows = order[index * 4:(index + 1) * 4]
+            assert np.allclose(x_batch, images[rows] * 0.5)
+            assert np.all(t_batch == labels[rows])
+            seen.extend(rows)
+        assert sorted(seen) == list(range(10))
+
+    def test_training(self, arrays):
+        import lasagne
+        from lasagne.data import SharedDataset
+        images, labels = arrays
+        l_in = lasagne.layers.InputLayer((None, 1, 2, 3))
+        l_out = lasagne.layers.DenseLayer(
+                l_in, 5, nonlinearity=lasagne.nonlinearities.softmax)
+        targets = T.ivector('targets')
+        loss = lasagne.objectives.categorical_crossentropy(
+                lasagne.layers.get_output(l_out), targets).mean()
+        params = lasagne.layers.get_all_params(l_out)
+        updates = lasagne.updates.sgd(loss, params, learning_rate=0.1)
+        initial = lasagne.layers.get_all_param_values(l_out)
+        step_fn = theano.function([l_in.input_var, targets], loss,
+                                  updates=updates)
+        expected = [step_fn(images[i:i + 4] / np.float32(255),
+                            labels[i:i + 4].astype('int32'))
+                    for i in range(0, 10, 4)]
+        final = lasagne.layers.get_all_param_values(l_out)
+        lasagne.layers.set_all_param_values(l_out, initial)
+        dataset = SharedDataset([images, labels], batch_size=4,
+                                scale=[1 / 255., None])
+        train_fn = dataset.function([l_in.input_var, targets], loss,
+                                    updates=updates)
+        losses = [train_fn(index) for index in range(dataset.num_batches)]
+        assert np.allclose(losses, expected, atol=1e-6)
+        for value, expected in zip(
+                lasagne.layers.get_all_param_values(l_out), final):
+            assert np.allclose(value, expected, atol=1e-6)
+
+    def test_set_arrays(self, dataset, arrays):
+        images, labels = arrays
+        x = T.tensor4('x', dtype=floatX)
+        t = T.ivector('t')
+        fn = dataset.function([x, t], t, shuffled=True)
+        dataset.shuffle()
+        dataset.set_arrays([images[:6], labels[:6]])
+        assert len(dataset) == 6
+        assert dataset.num_batches == 2
+        assert np.all(fn(1) == labels[4:6])
+
+    def test_invalid(self, dataset, arrays):
+        from lasagne.data import SharedDataset
+        images, labels = arrays
+        with pytest.raises(ValueError) as exc:
+            SharedDataset([images, labels[:5]], batch_size=4)
+        assert 'same length' in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            dataset.set_arrays([images])
+        assert 'expected 2 arrays' in exc.value.args[0]
+        with pytest.raises(ValueError) as exc:
+            dataset.function([T.tensor4()], [])
+        assert 'expected 2 input variables' in exc.value.args[0]
+
+
+def square(x):
+    return x ** 2
+
+
+def noisy(x, rng):
+    return x + rng.rand()
+
+
+class TestPrefetch:
+
+    def test_order(self):
+        from lasagne.data import prefetch
+        assert list(prefetch(iter(range(20)), num_prefetch=3)) == list(
+                range(20))
+
+    def test_bounded(self):
+        import time
+        from lasagne.data import prefetch
+        produced = []
+
+        def source():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        iterator = prefetch(source(), num_prefetch=2)
+        assert next(iterator) == 0
+        time.sleep(0.2)
+        # two items in the queue, one waiting to be put
+        assert len(produced) <= 4
+        iterator.close()
+
+    def test_exception(self):
+        from lasagne.data import prefetch
+
+        def source():
+            yield 1
+            raise RuntimeError("failed")
+
+        iterator = prefetch(source())
+        assert next(iterator) == 1
+        with pytest.raises(RuntimeError) as exc:
+            next(iterator)
+        assert 'failed' in exc.value.args[0]
+
+    def test_base_exception(self):
+        from lasagne.data import prefetch
+
+        def source():
+            yield 1
+            raise KeyboardInterrupt()
+
+        iterator = prefetch(source())
+        assert next(iterator) == 1
+        with pytest.raises(KeyboardInterrupt):
+            next(iterator)
+
+    def test_close(self):
+        import time
+        from lasagne.data import prefetch
+        closed = []
+
+        def source():
+            try:
+                for i in range(100):
+                    yield i
+            finally:
+                closed.append(True)
+
+        for i in prefetch(source()):
+            if i == 3:
+                break
+        for _ in range(50):
+            if closed:
+                break
+            time.sleep(0.01)
+        assert closed
+
+    def test_reuse_buffers(self):
+        from lasagne.data import prefetch
+        batches = [(np.full((2, 3), i), i) for i in range(10)]
+        seen = []
+        for x, i in prefetch(iter(batches), num_prefetch=1,
+                             reuse_buffers=True):
+            assert np.all(x == i)
+            assert all(x is not b[0] for b in batches)
+            seen.append(id(x))
+        assert len(set(seen)) == 5
+
+    @pytest.mark.parametrize('num_prefetch', (1, 2, 3))
+    def test_reuse_buffers_window(self, num_prefetch):
+        import time
+        from lasagne.data import prefetch
+        batches = [np.full((2, 3), i) for i in range(20)]
+        iterator = prefetch(iter(batches), num_prefetch=num_prefetch,
+                            reuse_buffers=True)
+        held = [next(iterator)]
+        # a held item stays valid while the next num_prefetch + 1 items are
+        # received, even if the producer runs ahead as far as it can
+        for i in range(1, num_prefetch + 2):
+            held.append(next(iterator))
+            time.sleep(0.05)
+            for j, x in enumerate(held):
+                assert np.all(x == j)
+        iterator.close()
+
+
+class TestParallelMap:
+
+    @pytest.mark.parametrize('processes', (False, True))
+    def test_order(self, processes):
+        from lasagne.data import parallel_map
+        items = [np.arange(i, i + 3) for i in range(20)]
+        results = list(parallel_map(square, items, num_workers=3,
+                                    processes=processes))
+        assert len(results) == 20
+        for item, result in zip(items, results):
+            assert np.all(result == item ** 2)
+
+    def test_seed(self):
+        from lasagne.data import parallel_map
+        items = np.arange(10.)
+        first = list(parallel_map(noisy, items, num_workers=1, seed=3))
+        second = list(parallel_map(noisy, items, num_workers=4, seed=3))
+        other = list(parallel_map(noisy, items, num_workers=4, seed=4))
+        assert first == second
+        assert first != other
+        assert np.all((np.array(first) >= items) &
+                      (np.array(first) < items + 1))
+
+    def test_exception(self):
+        from lasagne.data import parallel_map
+        with pytest.raises(ZeroDivisionError):
+            list(parallel_map(lambda x: 1 / x, [1, 0, 2]))
+
+
+class TestChunkedReader:
+
+    @pytest.fixture
+    def arrays(self, tmpdir):
+        path = str(tmpdir.join('inputs.dat'))
+        inputs = np.memmap(path, dtype=np.float16, mode='w+', shape=(103, 3))
+        inputs[:] = np.arange(103)[:, None]
+        inputs.flush()
+        inputs = np.memmap(path, dtype=np.float16, mode='r', shape=(103, 3))
+        targets = np.arange(103)
+        return inputs, targets
+
+    def check_epoch(self, reader, batch_size, num_examples):
+        seen = []
+        batches = list(reader)
+        assert len(batches) == reader.num_batches
+        for i, (X, y) in enumerate(batches):
+            expected = min(batch_size, num_examples - i * batch_size)
+            assert len(X) == len(y) == expected
+            assert isinstance(X, np.ndarray)
+            assert np.all(X == y[:, None])
+            seen.extend(y)
+        assert sorted(seen) == list(range(num_examples))
+        return seen
+
+    def test_ordered(self, arrays):
+        from lasagne.data import ChunkedReader
+        reader = ChunkedReader(arrays, batch_size=10, chunk_size=7,
+                               buffer_chunks=3, shuffle=False)
+        assert len(reader) == 103
+        assert reader.num_batches == 11
+        seen = self.check_epoch(reader, 10, 103)
+        assert seen == list(range(103))
+
+    @pytest.mark.parametrize('buffer_chunks', (1, 3, 100))
+    def test_shuffled(self, arrays, buffer_chunks):
+        from lasagne.data import ChunkedReader
+        reader = ChunkedReader(arrays, batch_size=10, chunk_size=7,
+                               buffer_chunks=buffer_chunks,
+                               rng=np.random.RandomState(1))
+        first = self.check_epoch(reader, 10, 103)
+        second = self.check_epoch(reader, 10, 103)
+        assert first != list(range(103))
+        assert first != second
+        reader.rng = np.random.RandomState(1)
+        assert self.check_epoch(reader, 10, 103) == first
+
+    def test_mixing(self, arrays):
+        from lasagne.data import ChunkedReader
+        reader = ChunkedReader(arrays, batch_size=21, chunk_size=7,
+                               buffer_chunks=3,
+                               rng=np.random.RandomState(2))
+        X, y = next(iter(reader))
+        # a minibatch draws from several chunks of the buffer
+        assert len(set(y // 7)) > 1
+
+    def test_shards(self, arrays):
+        from lasagne.data import ChunkedReader
+        inputs, targets = arrays
+        shards = [[inputs[:50], targets[:50]], [inputs[50:], targets[50:]]]
+        reader = ChunkedReader(shards, batch_size=8, chunk_size=16,
+                               buffer_chunks=2)
+        assert len(reader) == 103
+        self.check_epoch(reader, 8, 103)
+
+    def test_invalid(self, arrays):
+        from lasagne.data import ChunkedReader
+        inputs, targets = arrays
+        with pytest.raises(ValueError) as exc:
+            ChunkedReader([inputs, targets[:5]], batch_size=4)
+        assert 'same length' in exc.value.args[0]
+        with pytest.raises(ValueError):
+            ChunkedReader([[inputs, targets], [inputs]], batch_size=4)
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+
+@pytest.fixture(params=["StandardStep", "GRUStep", "LSTMStep"])
+def network(request):
+    import lasagne.layers as L
+    from lasagne.nonlinearities import softmax
+    vocab, num_units = 7, 6
+    l_in = L.InputLayer((None, None), dtype='int32')
+    l_emb = L.EmbeddingLayer(l_in, vocab, 5)
+    step = getattr(L, request.param)((None, 5), num_units)
+    l_rec = L.RNNLayer(l_emb, step, in_order="NTD", out_order="NTD")
+    l_flat = L.ReshapeLayer(l_rec, (-1, num_units))
+    l_out = L.DenseLayer(l_flat, vocab, nonlinearity=softmax)
+    return l_in, l_emb, l_rec, l_out
+
+
+def test_step_matches_full_sequence(network):
+    from lasagne.layers import get_output
+    from lasagne.decoding import StepDecoder
+    l_in, l_emb, l_rec, l_out = network
+    x = np.random.randint(0, 7, (3, 4)).astype('int32')
+    full = get_output(l_out, x).eval().reshape(3, 4, 7)
+
+    decoder = StepDecoder(l_rec, l_emb, l_out)
+    states = decoder.init_states(3)
+    for t in range(4):
+        log_probs, states = decoder.step(x[:, t], states)
+        assert np.allclose(np.exp(log_probs), full[:, t], atol=1e-5)
+
+
+def test_greedy(network):
+    from lasagne.layers import get_output
+    from lasagne.decoding import StepDecoder
+    l_in, l_emb, l_rec, l_out = network
+    decoder = StepDecoder(l_rec, l_emb, l_out)
+    start = np.array([0, 1, 2], dtype='int32')
+    tokens, scores = decoder.greedy(start, max_length=5)
+    assert tokens.shape == (3, 5)
+
+    # feeding the generated tokens back must reproduce them as the argmax
+    inputs = np.hstack([start[:, None], tokens[:, :-1]])
+    probs = get_output(l_out, inputs).eval().reshape(3, 5, 7)
+    assert (probs.argmax(axis=-1) == tokens).all()
+    expected = np.log(np.take_along_axis(probs, tokens[:, :, None], 2))
+    assert np.allclose(scores, expected.sum(axis=(1, 2)), atol=1e-4)
+
+
+def test_greedy_eos(network):
+    from lasagne.decoding import StepDecoder
+    l_in, l_emb, l_rec, l_out = network
+    decoder = StepDecoder(l_rec, l_emb, l_out)
+    start = np.array([0, 1], dtype='int32')
+    tokens, _ = decoder.greedy(start, max_length=6)
+    eos = tokens[0, 0]
+    tokens, _ = decoder.greedy(start, max_length=6, eos=eos)
+    assert (tokens[0] == eos).all()
+
+
+def test_beam_search(network):
+    from lasagne.decoding import StepDecoder
+    l_in, l_emb, l_rec, l_out = network
+    decoder = StepDecoder(l_rec, l_emb, l_out)
+    start = np.array([0, 1, 2], dtype='int32')
+    greedy_tokens, greedy_scores = decoder.greedy(start, max_length=4)
+
+    tokens, scores = decoder.beam_search(start, beam_size=1, max_length=4)
+    assert (tokens[:, 0] == greedy_tokens).all()
+    assert np.allclose(scores[:, 0], greedy_scores, atol=1e-4)
+
+    tokens, scores = decoder.beam_search(start, beam_size=3, max_length=4)
+    assert tokens.shape == (3, 3, 4)
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+    # the returned scores must match rescoring the returned hypotheses
+    for b in range(3):
+        for k in range(3):
+            states = decoder.init_states(1)
+            prev, total = start[b:b + 1], 0
+            for t in range(4):
+                log_probs, states = decoder.step(prev, states)
+                prev = tokens[b, k, t:t + 1]
+                total += log_probs[0, prev[0]]
+            assert np.allclose(total, scores[b, k], atol=1e-4)
+
+
+def test_beam_search_initial_states(network):
+    from lasagne.decoding import StepDecoder
+    l_in, l_emb, l_rec, l_out = network
+    decoder = StepDecoder(l_rec, l_emb, l_out)
+    start = np.array([0, 1], dtype='int32')
+    states = [np.random.randn(*s.shape).astype(s.dtype)
+              for s in decoder.init_states(2)]
+    greedy_tokens, _ = decoder.greedy(start, 3, states=states)
+    tokens, _ = decoder.beam_search(start, 1, 3, states=states)
+    assert (tokens[:, 0] == greedy_tokens).all()
+
+
+def test_logits_output():
+    import lasagne.layers as L
+    from lasagne.decoding import StepDecoder
+    l_in = L.InputLayer((None, None), dtype='int32')
+    l_emb = L.EmbeddingLayer(l_in, 5, 4)
+    l_rec = L.RNNLayer(l_emb, L.GRUStep((None, 4), 3), in_order="NTD")
+    l_out = L.DenseLayer(L.ReshapeLayer(l_rec, (-1, 3)), 5,
+                         nonlinearity=None)
+    decoder = StepDecoder(l_rec, l_emb, l_out, probabilities=False)
+    log_probs, _ = decoder.step([0, 1], decoder.init_states(2))
+    assert np.allclose(np.exp(log_probs).sum(axis=1), 1, atol=1e-5)
+
+
+def test_embedding_inputs_error():
+    import lasagne.layers as L
+    from lasagne.decoding import StepDecoder
+    l_rec = L.RNNLayer(L.InputLayer((None, None, 4)),
+                       L.GRUStep((None, 4), 3))
+    l_emb = L.ConcatLayer([L.InputLayer((None, 2)), L.InputLayer((None, 2))])
+    with pytest.raises(ValueError):
+        StepDecoder(l_rec, l_emb, l_rec)
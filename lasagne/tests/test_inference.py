@@ -0,0 +1,429 @@
+import pickle
+
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+import lasagne.layers as L
+from lasagne import nonlinearities
+
+
+def check_export(network, *inputs):
+    from lasagne.inference import export
+    input_layers = [l for l in L.get_all_layers(network)
+                    if isinstance(l, L.InputLayer)]
+    expected = L.get_outputs(network, dict(zip(input_layers, inputs)),
+                             deterministic=True)
+    exported = export(network)
+    actual = exported(*inputs)
+    if not isinstance(actual, list):
+        actual = [actual]
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        e = e.eval()
+        assert a.shape == e.shape
+        assert np.allclose(a, e, atol=1e-5)
+    return exported
+
+
+def floats(*shape):
+    return np.random.randn(*shape).astype(theano.config.floatX)
+
+
+@pytest.mark.parametrize("nonlinearity", [
+    nonlinearities.sigmoid, nonlinearities.softmax, nonlinearities.tanh,
+    nonlinearities.ScaledTanH(0.5, 2), nonlinearities.rectify,
+    nonlinearities.leaky_rectify, nonlinearities.elu,
+    nonlinearities.LeakyElu(0.5, free=False), nonlinearities.softplus,
+    None])
+def test_dense(nonlinearity):
+    l_in = L.InputLayer((None, 3, 4))
+    network = L.DenseLayer(l_in, 5, nonlinearity=nonlinearity)
+    check_export(network, floats(6, 3, 4))
+    if nonlinearity is not nonlinearities.softmax:
+        network = L.DenseLayer(l_in, 5, nonlinearity=nonlinearity,
+                               num_leading_axes=2, b=None)
+        check_export(network, floats(6, 3, 4))
+
+
+def test_sparse_dense():
+    W = floats(12, 5)
+    W[np.random.rand(12, 5) < 0.8] = 0
+    l_in = L.InputLayer((None, 3, 4))
+    check_export(L.SparseDenseLayer(l_in, 5, W=W), floats(6, 3, 4))
+    check_export(L.SparseDenseLayer(l_in, 5, W=W[:4], num_leading_axes=2),
+                 floats(6, 3, 4))
+
+
+def test_large_softmax():
+    l_in = L.InputLayer((None, 8))
+    check_export(L.SampledSoftmaxLayer(l_in, 20, 5), floats(3, 8))
+    check_export(L.AdaptiveSoftmaxLayer(l_in, 20, [4, 10], b=None),
+                 floats(3, 8))
+
+
+@pytest.mark.parametrize("untie_biases", [False, True])
+def test_nin(untie_biases):
+    l_in = L.InputLayer((None, 3, 4, 5))
+    check_export(L.NINLayer(l_in, 6, untie_biases=untie_biases),
+                 floats(2, 3, 4, 5))
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(filter_size=3),
+    dict(filter_size=(3, 2), stride=(2, 1), pad=1),
+    dict(filter_size=3, pad='same', flip_filters=False),
+    dict(filter_size=(2, 3), pad='full', untie_biases=True),
+    dict(filter_size=1, b=None, nonlinearity=nonlinearities.tanh),
+])
+def test_conv2d(kwargs):
+    l_in = L.InputLayer((None, 3, 7, 6))
+    check_export(L.Conv2DLayer(l_in, 4, **kwargs), floats(2, 3, 7, 6))
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(filter_size=3),
+    dict(filter_size=2, stride=2, pad='full'),
+    dict(filter_size=3, pad='same', flip_filters=False),
+])
+def test_conv1d(kwargs):
+    l_in = L.InputLayer((None, 3, 9))
+    check_export(L.Conv1DLayer(l_in, 4, **kwargs), floats(2, 3, 9))
+
+
+def test_conv3d():
+    l_in = L.InputLayer((None, 2, 5, 6, 4))
+    check_export(L.Conv3DLayer(l_in, 3, 3, pad='same'), floats(2, 2, 5, 6, 4))
+    check_export(L.Conv3DLayer(l_in, 3, (2, 3, 1), stride=(1, 2, 1),
+                               flip_filters=False), floats(2, 2, 5, 6, 4))
+
+
+def test_grouped_conv():
+    l_in = L.InputLayer((None, 4, 7, 6))
+    check_export(L.Conv2DLayer(l_in, 6, 3, num_groups=2, pad='same'),
+                 floats(2, 4, 7, 6))
+    check_export(L.DepthwiseConv2DLayer(l_in, 3, depth_multiplier=2,
+                                        stride=2),
+                 floats(2, 4, 7, 6))
+    l_in = L.InputLayer((None, 4, 9))
+    check_export(L.Conv1DLayer(l_in, 2, 3, num_groups=2), floats(2, 4, 9))
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(filter_size=3),
+    dict(filter_size=3, stride=2, crop=1, flip_filters=True),
+    dict(filter_size=(3, 1), stride=(2, 3), crop='same'),
+    dict(filter_size=3, stride=2, output_size=(10, 11)),
+    dict(filter_size=2, crop='full', untie_biases=True),
+])
+def test_transposed_conv2d(kwargs):
+    l_in = L.InputLayer((None, 3, 4, 5))
+    check_export(L.TransposedConv2DLayer(l_in, 2, **kwargs),
+                 floats(2, 3, 4, 5))
+
+
+def test_dilated_conv2d():
+    l_in = L.InputLayer((None, 3, 9, 8))
+    check_export(L.DilatedConv2DLayer(l_in, 4, 3, dilation=(2, 3)),
+                 floats(2, 3, 9, 8))
+    check_export(L.DilatedConv2DLayer(l_in, 4, 3, dilation=(2, 3), pad='same',
+                                      flip_filters=True,
+                                      implementation='space_to_batch'),
+                 floats(2, 3, 9, 8))
+
+
+@pytest.mark.parametrize("mode", ['max', 'sum', 'average_inc_pad',
+                                  'average_exc_pad'])
+@pytest.mark.parametrize("kwargs", [
+    dict(pool_size=2),
+    dict(pool_size=3, stride=2, pad=1),
+    dict(pool_size=(3, 2), stride=(2, 1), ignore_border=False),
+])
+def test_pool2d(mode, kwargs):
+    if not kwargs.get('ignore_border', True) and mode != 'max':
+        pytest.skip("Theano requires ignore_border for averaging")
+    l_in = L.InputLayer((None, 2, 7, 6))
+    check_export(L.Pool2DLayer(l_in, mode=mode, **kwargs),
+                 floats(3, 2, 7, 6))
+
+
+@pytest.mark.parametrize("mode", ['max', 'average_exc_pad'])
+def test_pool3d(mode):
+    l_in = L.InputLayer((None, 2, 5, 6, 4))
+    check_export(L.Pool3DLayer(l_in, 3, stride=2, pad=1, mode=mode),
+                 floats(2, 2, 5, 6, 4))
+
+
+def test_pool1d_and_global_pool():
+    l_in = L.InputLayer((None, 2, 9))
+    check_export(L.MaxPool1DLayer(l_in, 3, stride=2, pad=1),
+                 floats(3, 2, 9))
+    l_in = L.InputLayer((None, 2, 4, 5))
+    for function in T.mean, T.max, T.sum:
+        check_export(L.GlobalPoolLayer(l_in, function), floats(3, 2, 4, 5))
+
+
+@pytest.mark.parametrize("mode", ['repeat', 'dilate'])
+def test_upscale(mode):
+    check_export(L.Upscale1DLayer(L.InputLayer((None, 2, 3)), 2, mode=mode),
+                 floats(2, 2, 3))
+    check_export(L.Upscale2DLayer(L.InputLayer((None, 2, 3, 4)), (2, 3),
+                                  mode=mode), floats(2, 2, 3, 4))
+    check_export(L.Upscale3DLayer(L.InputLayer((None, 2, 3, 4, 2)), 2,
+                                  mode=mode), floats(2, 2, 3, 4, 2))
+
+
+def test_pixel_shuffle():
+    check_export(L.PixelShuffleLayer(L.InputLayer((None, 12, 3, 4)), (2, 3)),
+                 floats(2, 12, 3, 4))
+
+
+def test_batch_norm_and_elemwise():
+    l_in = L.InputLayer((None, 3, 4, 5))
+    l_bn = L.BatchNormLayer(l_in)
+    for param in l_bn.get_params():
+        param.set_value(np.random.rand(*param.get_value().shape)
+                        .astype(theano.config.floatX) + 0.5)
+    l_bias = L.BiasLayer(l_bn, b=np.random.randn(3))
+    l_scale = L.ScaleLayer(l_bias, scales=np.random.randn(3, 4, 5),
+                           shared_axes=0)
+    l_prelu = L.ParametricRectifierLayer(l_scale)
+    l_rrelu = L.RandomizedRectifierLayer(l_prelu)
+    l_nonlin = L.NonlinearityLayer(l_rrelu, nonlinearities.tanh)
+    l_noise = L.GaussianNoiseLayer(L.DropoutLayer(l_nonlin))
+    check_export(l_noise, floats(2, 3, 4, 5))
+
+
+def test_logits():
+    l_in = L.InputLayer((None, 6))
+    l_dense = L.DenseLayer(l_in, 4, nonlinearity=None)
+    check_export(L.LogitsLayer(l_dense), floats(3, 6))
+
+
+def test_shape_layers():
+    l_in = L.InputLayer((None, 2, 3, 4))
+    l_pad = L.PadLayer(l_in, [(1, 0), 2], val=3)
+    l_flat = L.FlattenLayer(l_pad, outdim=3)
+    l_reshape = L.ReshapeLayer(l_flat, ([0], -1, 4))
+    l_slice = L.SliceLayer(l_reshape, slice(1, None, 2), axis=1)
+    l_shuffle = L.DimshuffleLayer(l_slice, (2, 'x', 0, 1))
+    check_export(l_shuffle, floats(2, 2, 3, 4))
+    check_export(L.SliceLayer(l_in, 1, axis=-1), floats(2, 2, 3, 4))
+
+
+def test_merge_layers():
+    l_a = L.InputLayer((None, 3, 4))
+    l_b = L.InputLayer((None, 2, 5))
+    l_concat = L.ConcatLayer([l_a, l_b], axis=1,
+                             cropping=[None, None, 'center'])
+    l_c = L.InputLayer((None, 5, 4))
+    l_max = L.ElemwiseMergeLayer([l_concat, l_c], T.maximum)
+    l_sum = L.ElemwiseSumLayer([l_max, l_c], coeffs=[0.5, -2])
+    check_export(l_sum, floats(2, 3, 4), floats(2, 2, 5), floats(2, 5, 4))
+
+
+def test_embedding():
+    l_in = L.InputLayer((None, 3), dtype='int32')
+    ids = np.random.randint(0, 4, (2, 3)).astype('int32')
+    check_export(L.EmbeddingLayer(l_in, 5, 6), ids)
+    check_export(L.EmbeddingLayer(l_in, 5, 6, zero_out=1), ids)
+
+
+@pytest.mark.parametrize("mode", ["sum", "mean", "max"])
+def test_embedding_bag(mode):
+    l_ids = L.InputLayer((None, ), dtype='int32')
+    l_offsets = L.InputLayer((None, ), dtype='int32')
+    check_export(L.EmbeddingBagLayer(l_ids, 5, 6, mode=mode,
+                                     offsets=l_offsets),
+                 np.array([1, 2, 2, 0, 4], 'int32'),
+                 np.array([0, 3, 3], 'int32'))
+    l_ids = L.InputLayer((None, 3), dtype='int32')
+    l_mask = L.InputLayer((None, 3))
+    check_export(L.EmbeddingBagLayer(l_ids, 5, 6, mode=mode,
+                                     mask_input=l_mask),
+                 np.random.randint(0, 5, (4, 3)).astype('int32'),
+                 floats(4, 3) > 0)
+
+
+@pytest.mark.parametrize("step_cls", ["StandardStep", "GRUStep",
+                                      "LSTMStep", "RWAStep"])
+@pytest.mark.parametrize("kwargs", [
+    dict(),
+    dict(in_order="NTD", out_order="NTD", backwards=True),
+    dict(only_return_final=True),
+])
+@pytest.mark.parametrize("pre_compute_input", [True, False])
+def test_recurrent(step_cls, kwargs, pre_compute_input):
+    if step_cls == "RWAStep" and not pre_compute_input:
+        pytest.skip("RWAStep requires a precomputed input")
+    l_in = L.InputLayer((5, 3, 4))
+    step = getattr(L, step_cls)((None, 4), 6,
+                                pre_compute_input=pre_compute_input)
+    l_rec = L.RNNLayer(l_in, step, **kwargs)
+    for param in step.get_params():
+        value = param.get_value()
+        param.set_value(np.random.randn(*value.shape).astype(value.dtype))
+    check_export(l_rec, floats(5, 3, 4))
+
+
+def test_recurrent_two_inputs():
+    l_a = L.InputLayer((None, 3, 4))
+    l_b = L.InputLayer((None, 3, 2))
+    l_rec = L.RNNLayer([l_a, l_b], L.GRUStep((None, 6), 5))
+    check_export(l_rec, floats(7, 3, 4), floats(7, 3, 2))
+
+
+def test_buffers_and_pickle():
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3, 6, 6))
+    l_conv = L.Conv2DLayer(l_in, 4, 3, pad=1)
+    l_pool = L.MaxPool2DLayer(l_conv, 2)
+    l_out = L.DenseLayer(l_pool, 5, nonlinearity=nonlinearities.softmax)
+    network = export(l_out)
+    x1, x2 = floats(2, 3, 6, 6), floats(4, 3, 6, 6)
+    y1 = network(x1)
+    # the returned arrays are not overwritten by later calls
+    y2 = network(x2)
+    assert np.allclose(network(x1), y1)
+    assert y2.shape == (4, 5)
+
+    loaded = pickle.loads(pickle.dumps(network))
+    assert np.allclose(loaded(x1), y1)
+    assert np.allclose(loaded(x2), y2)
+
+
+def test_load_without_theano(tmpdir):
+    import os
+    import subprocess
+    import sys
+    import lasagne_numpy
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3, 6, 6))
+    l_conv = L.Conv2DLayer(l_in, 4, 3, pad=1)
+    l_pool = L.MaxPool2DLayer(l_conv, 2)
+    l_out = L.DenseLayer(l_pool, 5, nonlinearity=nonlinearities.softmax)
+    network = export(l_out, quantize=[l_out])
+    x = floats(2, 3, 6, 6)
+    with open(str(tmpdir.join('network.pkl')), 'wb') as f:
+        pickle.dump((network, x), f)
+    script = "\n".join([
+        "import pickle, sys",
+        "import numpy as np",
+        "with open(sys.argv[1], 'rb') as f:",
+        "    network, x = pickle.load(f)",
+        "np.save(sys.argv[2], network(x))",
+        "assert 'theano' not in sys.modules",
+        "assert 'lasagne' not in sys.modules",
+    ])
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(
+        os.path.dirname(os.path.abspath(lasagne_numpy.__file__))))
+    subprocess.check_call([sys.executable, '-c', script,
+                           str(tmpdir.join('network.pkl')),
+                           str(tmpdir.join('y.npy'))], env=env)
+    assert np.allclose(np.load(str(tmpdir.join('y.npy'))), network(x))
+
+
+def test_multiple_outputs_and_inputs():
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3))
+    l_a = L.DenseLayer(l_in, 4)
+    l_b = L.DenseLayer(l_a, 2)
+    x = floats(5, 3)
+    a, b = export([l_a, l_b])(x)
+    assert np.allclose(a, L.get_output(l_a, x).eval())
+    assert np.allclose(b, L.get_output(l_b, x).eval())
+
+    network = export(l_b, input_layers=[l_a])
+    assert np.allclose(network(a), b)
+    with pytest.raises(TypeError):
+        network(a, a)
+
+
+def test_unsupported():
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3))
+    with pytest.raises(NotImplementedError):
+        export(L.ExpressionLayer(l_in, lambda x: x * 2))
+    with pytest.raises(NotImplementedError):
+        export(L.DenseLayer(l_in, 2, nonlinearity=lambda x: x))
+    l_in = L.InputLayer((None, 3, 5, 5))
+    with pytest.raises(NotImplementedError):
+        export(L.LocallyConnected2DLayer(l_in, 2, 3))
+
+
+def quantized_network():
+    l_in = L.InputLayer((None, 3, 6, 6))
+    l_dense = L.DenseLayer(l_in, 6, num_leading_axes=-1)
+    l_nin = L.NINLayer(l_dense, 5)
+    l_out = L.Conv2DLayer(l_nin, 4, 3, pad=1, nonlinearity=None)
+    return l_in, l_dense, l_nin, l_out
+
+
+@pytest.mark.parametrize("calibrate", [False, True])
+def test_quantize(calibrate):
+    from lasagne.inference import export
+    l_in, l_dense, l_nin, l_out = quantized_network()
+    x = floats(8, 3, 6, 6)
+    calibration = [x[:4], (x[4:], )] if calibrate else None
+    network = export(l_out, quantize=True, calibration=calibration)
+    for op, _ in network.program:
+        assert op.W.dtype == np.int8
+        assert (op.input_scale is not None) == calibrate
+        assert (np.abs(op.W).max(axis=1) == 127).all()
+    expected = export(l_out)(x)
+    actual = network(x)
+    assert actual.dtype == expected.dtype
+    error = np.abs(actual - expected).max() / np.abs(expected).max()
+    assert 0 < error < 0.05
+
+    # the quantized network can be pickled and calibration ranges persist
+    loaded = pickle.loads(pickle.dumps(network))
+    assert np.allclose(loaded(x), actual)
+
+
+def test_quantize_blocks():
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3, 6, 6))
+    l_dense = L.DenseLayer(l_in, 7, num_leading_axes=-1)
+    l_nin = L.NINLayer(l_dense, 12)
+    l_out = L.Conv2DLayer(l_nin, 8, 3, num_groups=4, nonlinearity=None)
+    x = floats(2, 3, 6, 6)
+    network = export(l_out, quantize=True)
+    # the reference dequantizes all weights in advance
+    reference = pickle.loads(pickle.dumps(network))
+    for op, _ in reference.program:
+        op.W = op.W * op.W_scale
+        op.W_scale = None
+    expected = reference(x)
+    for block_size in 100, 3, 1:
+        blocked = pickle.loads(pickle.dumps(network))
+        for op, _ in blocked.program:
+            op.block_size = block_size
+        assert np.allclose(blocked(x), expected)
+    # the weights are only dequantized one block of output units at a time
+    for op, _ in blocked.program:
+        for key, buf in op._buffers.items():
+            if key[0] == 'W':
+                assert buf.shape[0] == 1
+
+
+def test_quantize_layers():
+    from lasagne.inference import export
+    l_in, l_dense, l_nin, l_out = quantized_network()
+    x = floats(2, 3, 6, 6)
+    network = export(l_out, quantize=[l_nin])
+    assert [op.W.dtype == np.int8 for op, _ in network.program] == [
+        False, True, False]
+    assert np.allclose(network(x), export(l_out)(x), atol=0.1)
+    l_flat = L.FlattenLayer(l_out)
+    with pytest.raises(NotImplementedError):
+        export(l_flat, quantize=[l_flat])
+
+
+def test_quantize_zero_weights():
+    from lasagne.inference import export
+    l_in = L.InputLayer((None, 3))
+    l_out = L.DenseLayer(l_in, 2, W=np.zeros((3, 2)), b=np.ones(2))
+    x = floats(4, 3)
+    assert np.allclose(export(l_out, quantize=True, calibration=[x])(x), 1)
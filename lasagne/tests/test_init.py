@@ -113,6 +113,17 @@ def test_glorot_normal_gain():
     assert 0.132 < sample.std() < 0.152
 
 
+def test_glorot_normal_num_groups():
+    from lasagne.init import GlorotNormal
+
+    # depthwise filters: fan-in and fan-out of one filter each
+    sample = GlorotNormal(num_groups=512).sample((512, 1, 3, 3))
+    assert 0.31 < sample.std() < 0.36
+
+    sample = GlorotNormal(num_groups=4).sample((200, 50, 2))
+    assert 0.09 < sample.std() < 0.11
+
+
 def test_glorot_normal_c01b():
     from lasagne.init import GlorotNormal
 
@@ -349,3 +360,20 @@ def test_orthogonal_1d_not_supported():
 
     with pytest.raises(RuntimeError):
         Orthogonal().sample((100,))
+
+
+def test_icnr():
+    from lasagne.init import ICNR, Constant
+
+    sample = ICNR(2).sample((12, 3, 3, 3))
+    assert sample.shape == (12, 3, 3, 3)
+    for c in range(3):
+        block = sample[4 * c:4 * (c + 1)]
+        assert (block == block[0]).all()
+    assert not (sample[0] == sample[4]).all()
+
+    sample = ICNR((1, 3), Constant(1.5)).sample((6, 2))
+    assert (sample == 1.5).all()
+
+    with pytest.raises(RuntimeError):
+        ICNR(2).sample((6, 3, 3, 3))
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+
+floatX = theano.config.floatX
+
+
+def accumulate(metric, variables, batches):
+    updates = metric.get_updates(*variables)
+    fn = theano.function(variables, [], updates=updates)
+    for batch in batches:
+        fn(*batch)
+    return metric.get_value()
+
+
+def split(*arrays):
+    return [tuple(a[i:i + 7] for a in arrays) for i in range(0, 30, 7)]
+
+
+def test_mean():
+    from lasagne.metrics import Mean
+    x = T.vector('x')
+    values = np.random.randn(30).astype(floatX)
+    metric = Mean()
+    result = accumulate(metric, [x], split(values))
+    assert np.allclose(result, values.mean(), atol=1e-6)
+    metric.reset()
+    assert np.isnan(metric.get_value())
+
+
+def test_mean_mask():
+    from lasagne.metrics import Mean
+    x, m = T.matrices('xm')
+    values = np.random.randn(30, 4).astype(floatX)
+    mask = (np.random.rand(30, 4) < 0.5).astype(floatX)
+    values[mask == 0] = np.nan
+    metric = Mean(name='loss')
+    updates = metric.get_updates(x, mask=m)
+    fn = theano.function([x, m], [], updates=updates)
+    for batch in split(values, mask):
+        fn(*batch)
+    assert np.allclose(metric.get_value(), values[mask == 1].mean(),
+                       atol=1e-6)
+    assert metric.total.name == 'loss.total'
+
+
+@pytest.mark.parametrize('top_k', (1, 3))
+def test_categorical_accuracy(top_k):
+    from lasagne.metrics import CategoricalAccuracy
+    p = T.matrix('p')
+    t = T.ivector('t')
+    predictions = np.random.rand(30, 10).astype(floatX)
+    targets = np.random.randint(10, size=30).astype('int32')
+    top = np.argsort(predictions, axis=1)[:, -top_k:]
+    expected = np.any(top == targets[:, None], axis=1).mean()
+    metric = CategoricalAccuracy(top_k=top_k)
+    result = accumulate(metric, [p, t], split(predictions, targets))
+    assert np.allclose(result, expected)
+
+
+def test_binary_accuracy():
+    from lasagne.metrics import BinaryAccuracy
+    p, t = T.vectors('pt')
+    predictions = np.random.rand(30).astype(floatX)
+    targets = (np.random.rand(30) < 0.5).astype(floatX)
+    expected = ((predictions >= 0.3) == targets).mean()
+    metric = BinaryAccuracy(threshold=0.3)
+    result = accumulate(metric, [p, t], split(predictions, targets))
+    assert np.allclose(result, expected)
+
+
+def test_confusion_matrix():
+    from lasagne.metrics import ConfusionMatrix
+    p = T.matrix('p')
+    t = T.ivector('t')
+    predictions = np.random.rand(30, 4).astype(floatX)
+    targets = np.random.randint(4, size=30).astype('int32')
+    expected = np.zeros((4, 4), 'int64')
+    np.add.at(expected, (targets, predictions.argmax(axis=1)), 1)
+    metric = ConfusionMatrix(4)
+    result = accumulate(metric, [p, t], split(predictions, targets))
+    assert np.all(result == expected)
+    # one-hot targets, masked
+    t1 = T.matrix('t')
+    m = T.vector('m')
+    mask = np.ones(30, floatX)
+    mask[::3] = 0
+    metric.reset()
+    updates = metric.get_updates(p, t1, mask=m)
+    fn = theano.function([p, t1, m], [], updates=updates)
+    for batch in split(predictions, np.eye(4, dtype=floatX)[targets], mask):
+        fn(*batch)
+    expected = np.zeros((4, 4), 'int64')
+    keep = mask == 1
+    np.add.at(expected, (targets[keep], predictions[keep].argmax(axis=1)), 1)
+    assert np.all(metric.get_value() == expected)
+
+
+def test_confusion_matrix_invalid():
+    from lasagne.metrics import ConfusionMatrix
+    with pytest.raises(TypeError) as exc:
+        ConfusionMatrix(3).get_updates(T.tensor3(), T.ivector())
+    assert 'rank mismatch' in exc.value.args[0]
+
+
+def test_auc():
+    from lasagne.metrics import AUC
+    p, t = T.vectors('pt')
+    # predictions on the bin grid give the exact area, counting ties as 1/2
+    predictions = (np.random.randint(10, size=30) + .5).astype(floatX) / 10
+    targets = (np.random.rand(30) < 0.5).astype(floatX)
+    targets[:2] = [0, 1]
+    pos = predictions[targets == 1]
+    neg = predictions[targets == 0]
+    expected = ((pos[:, None] > neg).sum() +
+                0.5 * (pos[:, None] == neg).sum()) / (len(pos) * len(neg))
+    metric = AUC(num_bins=10)
+    result = accumulate(metric, [p, t], split(predictions, targets))
+    assert np.allclose(result, expected)
+    assert metric.positives.get_value().sum() == len(pos)
@@ -58,6 +58,99 @@ def test_categorical_crossentropy_onehot():
     assert np.allclose(crossent, c.eval({p: predictions, t: targets}))
 
 
+def log_softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    return x - np.log(np.exp(x).sum(axis=-1, keepdims=True))
+
+
+@pytest.mark.parametrize('colvect', (False, True))
+def test_binary_crossentropy_logits(colvect):
+    from lasagne.objectives import binary_crossentropy_logits
+    if not colvect:
+        x, t = theano.tensor.matrices('xt')
+        c = binary_crossentropy_logits(x, t)
+    else:
+        x, t = theano.tensor.vectors('xt')
+        c = binary_crossentropy_logits(x.dimshuffle(0, 'x'), t)[:, 0]
+    floatX = theano.config.floatX
+    shape = (10, 20) if not colvect else (10,)
+    logits = (np.random.randn(*shape) * 5).astype(floatX)
+    targets = np.random.rand(*shape).astype(floatX)
+    p = 1 / (1 + np.exp(-logits.astype('float64')))
+    crossent = -targets * np.log(p) - (1 - targets) * np.log(1 - p)
+    assert np.allclose(crossent, c.eval({x: logits, t: targets}), atol=1e-5)
+    # stable for large logits
+    logits = np.array([[-1000, 1000]] * 10, floatX)
+    if colvect:
+        logits = logits[:, 0]
+    targets = np.ones_like(logits)
+    result = c.eval({x: logits, t: targets}) if colvect else \
+        binary_crossentropy_logits(x, t).eval({x: logits, t: targets})
+    assert np.all(np.isfinite(result))
+
+
+def test_binary_crossentropy_logits_mask():
+    from lasagne.objectives import binary_crossentropy_logits
+    x, t, m = theano.tensor.matrices('xtm')
+    c = binary_crossentropy_logits(x, t, m)
+    floatX = theano.config.floatX
+    logits = np.array([[0, np.nan], [1, 2]], floatX)
+    targets = np.ones((2, 2), floatX)
+    mask = np.array([[1, 0], [1, 1]], floatX)
+    result = c.eval({x: logits, t: targets, m: mask})
+    assert result[0, 1] == 0
+    assert np.allclose(result[1], np.log1p(np.exp(-logits[1])))
+
+
+@pytest.mark.parametrize('hard', (False, True))
+def test_categorical_crossentropy_logits(hard):
+    from lasagne.objectives import categorical_crossentropy_logits
+    x = theano.tensor.matrix('x')
+    t = theano.tensor.ivector('t') if hard else theano.tensor.matrix('t')
+    c = categorical_crossentropy_logits(x, t)
+    floatX = theano.config.floatX
+    logits = (np.random.randn(10, 20) * 5).astype(floatX)
+    if hard:
+        targets = np.random.randint(20, size=10).astype('int32')
+        crossent = -log_softmax(logits)[np.arange(10), targets]
+    else:
+        targets = np.random.rand(10, 20).astype(floatX)
+        targets /= targets.sum(axis=1, keepdims=True)
+        crossent = -(targets * log_softmax(logits)).sum(axis=-1)
+    assert np.allclose(crossent, c.eval({x: logits, t: targets}), atol=1e-5)
+    # gradient w.r.t. the logits is softmax(x) - t
+    grad = theano.grad(c.sum(), x).eval({x: logits, t: targets})
+    if hard:
+        targets = np.eye(20)[targets]
+    assert np.allclose(grad, np.exp(log_softmax(logits)) - targets,
+                       atol=1e-5)
+
+
+@pytest.mark.parametrize('hard', (False, True))
+def test_categorical_crossentropy_logits_sequences(hard):
+    from lasagne.objectives import categorical_crossentropy_logits
+    x = theano.tensor.tensor3('x')
+    t = theano.tensor.imatrix('t') if hard else theano.tensor.tensor3('t')
+    m = theano.tensor.matrix('m')
+    c = categorical_crossentropy_logits(x, t, mask=m)
+    floatX = theano.config.floatX
+    logits = np.random.randn(4, 5, 6).astype(floatX)
+    mask = (np.arange(5) < np.array([[5], [3], [1], [0]])).astype(floatX)
+    logits[mask == 0] = np.inf
+    if hard:
+        targets = np.random.randint(6, size=(4, 5)).astype('int32')
+        crossent = -np.take_along_axis(log_softmax(logits),
+                                       targets[..., None], axis=-1)[..., 0]
+    else:
+        targets = np.random.rand(4, 5, 6).astype(floatX)
+        targets /= targets.sum(axis=-1, keepdims=True)
+        crossent = -(targets * log_softmax(logits)).sum(axis=-1)
+    result = c.eval({x: logits, t: targets, m: mask})
+    assert result.shape == (4, 5)
+    assert np.all(result[mask == 0] == 0)
+    assert np.allclose(result[mask == 1], crossent[mask == 1], atol=1e-5)
+
+
 @pytest.mark.parametrize('colvect', (False, True))
 def test_squared_error(colvect):
     # symbolic version
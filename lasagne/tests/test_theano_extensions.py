@@ -17,7 +17,7 @@ def conv1d(input, kernel, stride=1):
 
 @pytest.mark.parametrize('impl', ['conv1d_sc', 'conv1d_mc0',
                                   'conv1d_mc1', 'conv1d_unstrided',
-                                  'conv1d_sd', 'conv1d_md'])
+                                  'conv1d_sd', 'conv1d_md', 'conv1d_fft'])
 @pytest.mark.parametrize('filter_flip', [True, False])
 @pytest.mark.parametrize('stride', [1, 2])
 def test_conv(impl, stride, filter_flip):
@@ -56,7 +56,7 @@ def test_conv_nones(impl):
     assert np.allclose(conv_theano, conv_np)
 
 
-@pytest.mark.parametrize('impl', ['conv1d_mc0', 'conv1d_mc1'])
+@pytest.mark.parametrize('impl', ['conv1d_mc0', 'conv1d_mc1', 'conv1d_fft'])
 @pytest.mark.parametrize('pad', [1, (2,)])
 def test_conv_pad(impl, pad):
     import lasagne.theano_extensions.conv
@@ -105,6 +105,146 @@ def test_conv_stride(impl):
         conv(X, W, (1, 1, 10), (2, 1, 3), subsample=(2,))
 
 
+def conv2d(input, kernel, pad=0, stride=1, flip=True):
+    if flip:
+        kernel = kernel[:, :, ::-1, ::-1]
+    size = np.array(kernel.shape[2:])
+    pad = {'valid': 0, 'full': size - 1, 'half': size // 2}.get(pad, pad)
+    pad = np.broadcast_to(pad, (2,))
+    input = np.pad(input, [(0, 0), (0, 0), (pad[0], pad[0]),
+                           (pad[1], pad[1])], mode='constant')
+    height, width = np.array(input.shape[2:]) - size + 1
+    output = np.zeros((len(input), len(kernel), height, width))
+    for i in range(size[0]):
+        for j in range(size[1]):
+            output += np.einsum('bchw,fc->bfhw',
+                                input[:, :, i:i + height, j:j + width],
+                                kernel[:, :, i, j])
+    return output[:, :, ::stride, ::stride]
+
+
+@pytest.mark.parametrize('pad', ['valid', 'full', 'half', 1, (2, 0)])
+@pytest.mark.parametrize('filter_flip', [True, False])
+@pytest.mark.parametrize('stride', [1, 2])
+def test_conv2d_convop(pad, filter_flip, stride):
+    from lasagne.theano_extensions.conv import conv2d_convop
+    X = T.tensor4()
+    W = T.tensor4()
+    input = lasagne.utils.floatX(np.random.randn(2, 3, 7, 6))
+    kernel = lasagne.utils.floatX(np.random.randn(4, 3, 3, 3))
+    conv_theano = conv2d_convop(X, W, input.shape, kernel.shape,
+                                border_mode=pad, subsample=(stride, stride),
+                                filter_flip=filter_flip).eval(
+                                        {X: input, W: kernel})
+    conv_np = conv2d(input, kernel, pad, stride, filter_flip)
+    assert np.allclose(conv_theano, conv_np, atol=1e-5)
+
+
+@pytest.mark.parametrize('pad', ['valid', 'full', 'half', 1, (2, 0)])
+@pytest.mark.parametrize('filter_flip', [True, False])
+@pytest.mark.parametrize('stride', [1, 2])
+@pytest.mark.parametrize('block_size', [None, 3])
+def test_conv2d_fft(pad, filter_flip, stride, block_size):
+    from lasagne.theano_extensions.conv import conv2d_fft
+    X = T.tensor4()
+    W = T.tensor4()
+    input = lasagne.utils.floatX(np.random.randn(2, 3, 7, 6))
+    kernel = lasagne.utils.floatX(np.random.randn(4, 3, 3, 2))
+    conv_theano = conv2d_fft(X, W, input.shape, kernel.shape,
+                             border_mode=pad, subsample=(stride, stride),
+                             filter_flip=filter_flip,
+                             block_size=block_size).eval(
+                                     {X: input, W: kernel})
+    conv_np = conv2d(input, kernel, pad, stride, filter_flip)
+    assert np.allclose(conv_theano, conv_np, atol=1e-4)
+
+
+@pytest.mark.parametrize('image_shape', [(2, 3, 100), (None, 3, None)])
+@pytest.mark.parametrize('block_size', [None, 7])
+def test_conv1d_fft_overlap_add(image_shape, block_size):
+    from lasagne.theano_extensions.conv import conv1d_fft
+    X = T.tensor3()
+    W = T.tensor3()
+    input = lasagne.utils.floatX(np.random.randn(2, 3, 100))
+    kernel = lasagne.utils.floatX(np.random.randn(4, 3, 5))
+    conv_theano = conv1d_fft(X, W, image_shape, kernel.shape,
+                             border_mode='half', block_size=block_size).eval(
+                                     {X: input, W: kernel})
+    conv_np = conv2d(input[:, :, None], kernel[:, :, None],
+                     pad=(0, 2))[:, :, 0]
+    assert np.allclose(conv_theano, conv_np, atol=1e-4)
+
+
+def test_conv_fft_blocks():
+    from lasagne.theano_extensions.conv import fft_block_sizes
+    # short inputs are transformed at once, long ones in blocks
+    assert fft_block_sizes((10, 100), (3, 3)) == [(10, 16), (14, 16)]
+    assert fft_block_sizes((None,), (9,)) == [(56, 64)]
+    assert fft_block_sizes((100,), (3,), block_size=30) == [(30, 32)]
+
+
+def test_conv_fft_grad():
+    import theano
+    from lasagne.theano_extensions.conv import conv2d_fft
+    input = lasagne.utils.floatX(np.random.randn(2, 2, 9, 5))
+    kernel = lasagne.utils.floatX(np.random.randn(3, 2, 3, 3))
+
+    def fn(x, w):
+        return conv2d_fft(x, w, input.shape, kernel.shape,
+                          border_mode='half', block_size=4)
+    theano.gradient.verify_grad(fn, [input, kernel],
+                                rng=np.random.RandomState(1), eps=1e-2,
+                                abs_tol=1e-2, rel_tol=1e-2)
+
+
+def test_conv_fft_unknown_filter_shape():
+    from lasagne.theano_extensions.conv import conv2d_fft
+    with pytest.raises(ValueError):
+        conv2d_fft(T.tensor4(), T.tensor4())
+
+
+@pytest.mark.parametrize('pad', ['valid', 'half', 'full', (1, 0)])
+@pytest.mark.parametrize('filter_flip', [True, False])
+@pytest.mark.parametrize('size', [(7, 6), (8, 5)])
+def test_conv2d_winograd(pad, filter_flip, size):
+    from lasagne.theano_extensions.conv import conv2d_winograd
+    X = T.tensor4()
+    W = T.tensor4()
+    input = lasagne.utils.floatX(np.random.randn(2, 3, *size))
+    kernel = lasagne.utils.floatX(np.random.randn(4, 3, 3, 3))
+    conv_theano = conv2d_winograd(X, W, input.shape, kernel.shape,
+                                  border_mode=pad,
+                                  filter_flip=filter_flip).eval(
+                                          {X: input, W: kernel})
+    conv_np = conv2d(input, kernel, pad, 1, filter_flip)
+    assert np.allclose(conv_theano, conv_np, atol=1e-4)
+
+
+def test_conv2d_winograd_grad():
+    import theano
+    from lasagne.theano_extensions.conv import conv2d_winograd
+    input = lasagne.utils.floatX(np.random.randn(2, 2, 5, 4))
+    kernel = lasagne.utils.floatX(np.random.randn(3, 2, 3, 3))
+
+    def fn(x, w):
+        return conv2d_winograd(x, w, input.shape, kernel.shape,
+                               border_mode='half')
+    theano.gradient.verify_grad(fn, [input, kernel],
+                                rng=np.random.RandomState(1), eps=1e-2,
+                                abs_tol=1e-2, rel_tol=1e-2)
+
+
+@pytest.mark.parametrize('kwargs', [dict(subsample=(2, 2)),
+                                    dict(filter_shape=(4, 3, 5, 5)),
+                                    dict(filter_shape=None),
+                                    dict(border_mode='same')])
+def test_conv2d_winograd_unsupported(kwargs):
+    from lasagne.theano_extensions.conv import conv2d_winograd
+    kwargs.setdefault('filter_shape', (4, 3, 3, 3))
+    with pytest.raises(RuntimeError):
+        conv2d_winograd(T.tensor4(), T.tensor4(), **kwargs)
+
+
 @pytest.mark.parametrize('val', [0, 7])
 @pytest.mark.parametrize('batch_ndim', [1, 2])
 def test_pad(batch_ndim, val, width=3):
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+import theano
+import theano.tensor as T
+
+import lasagne
+
+
+floatX = theano.config.floatX
+
+
+def build_model(dropout=False):
+    lasagne.random.set_rng(np.random.RandomState(42))
+    l_in = lasagne.layers.InputLayer((None, 5))
+    l_hid = l_in
+    if dropout:
+        l_hid = lasagne.layers.DropoutLayer(l_hid, name='drop')
+    l_out = lasagne.layers.DenseLayer(
+            l_hid, 3, nonlinearity=lasagne.nonlinearities.softmax)
+    targets = T.ivector('targets')
+    prediction = lasagne.layers.get_output(l_out)
+    loss = lasagne.objectives.categorical_crossentropy(prediction,
+                                                       targets).mean()
+    params = lasagne.layers.get_all_params(l_out, trainable=True)
+    return l_in, l_out, targets, prediction, loss, params
+
+
+class TestMultistepFunction:
+
+    @pytest.fixture
+    def data(self):
+        X = np.random.randn(4, 6, 5).astype(floatX)
+        y = np.random.randint(3, size=(4, 6)).astype('int32')
+        return X, y
+
+    @pytest.mark.parametrize('dropout', (False, True))
+    def test_matches_single_steps(self, data, dropout):
+        from lasagne.training import multistep_function
+        X, y = data
+        l_in, l_out, targets, _, loss, params = build_model(dropout)
+        updates = lasagne.updates.adam(loss, params, learning_rate=0.1)
+        train_fn = multistep_function([l_in.input_var, targets], loss,
+                                      updates)
+        losses = train_fn(X, y)
+        values = lasagne.layers.get_all_param_values(l_out)
+
+        l_in, l_out, targets, _, loss, params = build_model(dropout)
+        updates = lasagne.updates.adam(loss, params, learning_rate=0.1)
+        step_fn = theano.function([l_in.input_var, targets], loss,
+                                  updates=updates)
+        expected = [step_fn(X[i], y[i]) for i in range(len(X))]
+        assert np.allclose(losses, expected)
+        for value, expected in zip(
+                values, lasagne.layers.get_all_param_values(l_out)):
+            assert np.allclose(value, expected)
+
+    def test_random_state_advances(self, data):
+        from lasagne.training import multistep_function
+        X, y = data
+        l_in, l_out, targets, _, loss, params = build_model(dropout=True)
+        train_fn = multistep_function([l_in.input_var, targets], loss,
+                                      updates={})
+        # without parameter updates, only the dropout masks differ
+        first = train_fn(X[[0, 0]], y[[0, 0]])
+        assert first[0] != first[1]
+        assert train_fn(X[[0]], y[[0]])[0] not in first
+
+    def test_outputs_and_static_inputs(self, data):
+        from lasagne.training import multistep_function
+        X, y = data
+        l_in, l_out, targets, prediction, loss, params = build_model()
+        learning_rate = T.scalar('lr')
+        updates = lasagne.updates.sgd(loss, params, learning_rate)
+        accuracy = lasagne.objectives.categorical_accuracy(
+                prediction, targets).mean()
+        train_fn = multistep_function([l_in.input_var, targets], loss,
+                                      updates, outputs=[accuracy],
+                                      static_inputs=[learning_rate])
+        before = lasagne.layers.get_all_param_values(l_out)
+        losses, accuracies = train_fn(X, y, 0)
+        assert losses.shape == accuracies.shape == (4,)
+        for value, expected in zip(
+                lasagne.layers.get_all_param_values(l_out), before):
+            assert np.allclose(value, expected)
+        train_fn(X, y, 1)
+        assert not np.allclose(l_out.b.get_value(), before[1])
@@ -114,6 +114,21 @@ class TestUpdateFunctions(object):
             theano.config.floatX = floatX_
 
 
+def test_sgd_sparse_rows():
+    from lasagne.updates import sgd
+    W = theano.shared(np.ones((6, 3)))
+    b = theano.shared(np.ones(3))
+    idx = T.ivector('idx')
+    loss = (W[idx] * b).sum()
+    updates = sgd(loss, [W, b], learning_rate=0.5)
+    # only the indexed rows are updated, and repeated rows accumulate
+    assert isinstance(updates[W].owner.op, T.subtensor.AdvancedIncSubtensor1)
+    theano.function([idx], updates=updates)(np.array([1, 4, 4], 'int32'))
+    assert np.allclose(W.get_value(), [[1] * 3, [.5] * 3, [1] * 3, [1] * 3,
+                                       [0] * 3, [1] * 3])
+    assert np.allclose(b.get_value(), -0.5)
+
+
 def test_get_or_compute_grads():
 
     from lasagne.updates import get_or_compute_grads
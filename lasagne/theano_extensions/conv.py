@@ -41,7 +41,8 @@ def conv1d_sc(input, filters, image_shape=None, filter_shape=None,
 
 
 def conv1d_mc0(input, filters, image_shape=None, filter_shape=None,
-               border_mode='valid', subsample=(1,), filter_flip=True):
+               border_mode='valid', subsample=(1,), filter_flip=True,
+               num_groups=1):
     """
     using conv2d with width == 1
     """
@@ -68,12 +69,13 @@ def conv1d_mc0(input, filters, image_shape=None, filter_shape=None,
     conved = T.nnet.conv2d(
         input_mc0, filters_mc0, image_shape_mc0, filter_shape_mc0,
         subsample=(1, subsample[0]), border_mode=border_mode,
-        filter_flip=filter_flip)
+        filter_flip=filter_flip, num_groups=num_groups)
     return conved[:, :, 0, :]  # drop the unused dimension
 
 
 def conv1d_mc1(input, filters, image_shape=None, filter_shape=None,
-               border_mode='valid', subsample=(1,), filter_flip=True):
+               border_mode='valid', subsample=(1,), filter_flip=True,
+               num_groups=1):
     """
     using conv2d with height == 1
     """
@@ -100,7 +102,7 @@ def conv1d_mc1(input, filters, image_shape=None, filter_shape=None,
     conved = T.nnet.conv2d(
         input_mc1, filters_mc1, image_shape_mc1, filter_shape_mc1,
         subsample=(subsample[0], 1), border_mode=border_mode,
-        filter_flip=filter_flip)
+        filter_flip=filter_flip, num_groups=num_groups)
     return conved[:, :, :, 0]  # drop the unused dimension
 
 
@@ -266,8 +268,376 @@ def conv1d_md(input, filters, image_shape, filter_shape, border_mode='valid',
     return conved
 
 
+def conv1d_fft(input, filters, image_shape=None, filter_shape=None,
+               border_mode='valid', subsample=(1,), filter_flip=True,
+               block_size=None):
+    """
+    using FFTs of the input and the filters, which is cheaper than the
+    direct implementations for long filters; long inputs are split into
+    blocks combined by overlap-add, see `conv_fft`
+    """
+    return conv_fft(input, filters, image_shape, filter_shape, border_mode,
+                    subsample, filter_flip, block_size, n=1)
+
+
 # TODO: conv1d_md_channelslast?
 
+def _constant_shape(x):
+    # the shape of x if it is known at compile time, else None
+    try:
+        return [int(T.get_scalar_constant_value(s))
+                for s in T.as_tensor_variable(x).shape]
+    except T.NotScalarConstantError:
+        return None
+
+
 # 2D convolutions
 
-# TODO
+def conv2d_convop(input, filters, image_shape=None, filter_shape=None,
+                  border_mode='valid', subsample=(1, 1), filter_flip=True):
+    """
+    using the legacy ConvOp of ``theano.tensor.nnet.conv`` directly, which
+    has its own CPU implementation; paddings other than 'valid' and 'full'
+    are applied to the input explicitly
+    """
+    from theano.tensor.nnet.conv import conv2d
+    from .padding import pad
+
+    if not filter_flip:
+        filters = filters[:, :, ::-1, ::-1]
+    if border_mode == 'half':
+        if filter_shape is None:
+            raise ValueError("border_mode='half' requires filter_shape")
+        border_mode = tuple(s // 2 for s in filter_shape[2:])
+    elif isinstance(border_mode, int):
+        border_mode = (border_mode, border_mode)
+    if border_mode not in ('valid', 'full'):
+        if any(border_mode):
+            input = pad(input, border_mode, batch_ndim=2)
+            if image_shape is not None:
+                image_shape = (tuple(image_shape[:2]) +
+                               tuple(None if s is None else s + 2 * p
+                                     for s, p in zip(image_shape[2:],
+                                                     border_mode)))
+        border_mode = 'valid'
+    if image_shape is not None and None in image_shape:
+        image_shape = None
+    return conv2d(input, filters, image_shape=image_shape,
+                  filter_shape=filter_shape, border_mode=border_mode,
+                  subsample=subsample)
+
+
+def conv2d_fft(input, filters, image_shape=None, filter_shape=None,
+               border_mode='valid', subsample=(1, 1), filter_flip=True,
+               block_size=None):
+    """
+    using FFTs of the input and the filters, see `conv_fft`
+    """
+    return conv_fft(input, filters, image_shape, filter_shape, border_mode,
+                    subsample, filter_flip, block_size, n=2)
+
+
+def conv2d_winograd(input, filters, image_shape=None, filter_shape=None,
+                    border_mode='valid', subsample=(1, 1), filter_flip=True):
+    """
+    using Winograd's minimal filtering algorithm F(2x2, 3x3), only for 3x3
+    filters and unit strides, see `winograd_f2x2_3x3`
+    """
+    if tuple(subsample) != (1, 1):
+        raise RuntimeError("Unsupported subsample for conv2d_winograd: "
+                           "%s" % (subsample, ))
+    if filter_shape is None:
+        filter_shape = _constant_shape(filters)
+    if filter_shape is None or tuple(filter_shape[2:]) != (3, 3):
+        raise RuntimeError("conv2d_winograd requires a known filter_shape "
+                           "of 3x3 filters")
+    if border_mode == 'valid':
+        border_mode = (0, 0)
+    elif border_mode == 'half':
+        border_mode = (1, 1)
+    elif border_mode == 'full':
+        border_mode = (2, 2)
+    elif isinstance(border_mode, int):
+        border_mode = (border_mode, border_mode)
+    if not (isinstance(border_mode, tuple) and len(border_mode) == 2 and
+            all(isinstance(p, int) for p in border_mode)):
+        raise RuntimeError("Unsupported border_mode for conv2d_winograd: "
+                           "%s" % (border_mode, ))
+    if filter_flip:
+        filters = filters[:, :, ::-1, ::-1]
+    return winograd_f2x2_3x3(input, filters, border_mode)
+
+
+# Winograd convolutions
+
+# transforms of F(2x2, 3x3), see Lavin & Gray, "Fast Algorithms for
+# Convolutional Neural Networks", 2016
+_winograd_BT = np.array([[1, 0, -1, 0],
+                         [0, 1, 1, 0],
+                         [0, -1, 1, 0],
+                         [0, 1, 0, -1]])
+_winograd_G = np.array([[1, 0, 0],
+                        [.5, .5, .5],
+                        [.5, -.5, .5],
+                        [0, 0, 1]])
+_winograd_AT = np.array([[1, 1, 1, 0],
+                         [0, 1, -1, -1]])
+
+
+def _transform(x, matrix):
+    # multiplies the matrix with the first axis of x, given as a list,
+    # turning unit coefficients into additions
+    rows = []
+    for coefficients in matrix:
+        row = None
+        for c, x_k in zip(coefficients, x):
+            if c == 0:
+                continue
+            term = x_k if abs(c) == 1 else x_k * np.asarray(abs(c), x_k.dtype)
+            if row is None:
+                row = term if c > 0 else -term
+            else:
+                row = row + term if c > 0 else row - term
+        rows.append(row)
+    return rows
+
+
+def _transform2d(x, matrix):
+    # computes matrix . x . matrix^T for x given as a nested list
+    x = [_transform(row, matrix) for row in x]
+    x = [_transform(list(column), matrix) for column in zip(*x)]
+    return [list(row) for row in zip(*x)]
+
+
+def winograd_f2x2_3x3(input, filters, pad=(0, 0)):
+    """
+    Correlates the input with 3x3 filters by Winograd's algorithm F(2x2, 3x3).
+
+    The zero-padded input is cut into overlapping 4x4 tiles with a stride of
+    2, each yielding a 2x2 tile of the output. The tiles and the filters are
+    transformed into 4x4 matrices with additions only; the filters are
+    transformed a single time per call. For each of the 16 elements, the
+    transformed filters are multiplied with the transformed tiles of all
+    examples as one matrix product over the input channels, and the results
+    are transformed back into output tiles. This takes 16 instead of 36
+    multiplications per output tile, input channel and filter.
+
+    Parameters
+    ----------
+    input : Theano 4D tensor
+        The input of shape ``(batch, channels, rows, columns)``.
+    filters : Theano 4D tensor
+        The filters of shape ``(num_filters, channels, 3, 3)``. They are not
+        flipped, i.e., this computes a correlation.
+    pad : tuple of int
+        The zero-padding added to both sides of the rows and columns.
+
+    Returns
+    -------
+    Theano 4D tensor
+        The output of shape ``(batch, num_filters, rows + 2 * pad[0] - 2,
+        columns + 2 * pad[1] - 2)``.
+    """
+    batch, channels = input.shape[0], input.shape[1]
+    out_rows = input.shape[2] + 2 * pad[0] - 2
+    out_cols = input.shape[3] + 2 * pad[1] - 2
+    tile_rows = (out_rows + 1) // 2
+    tile_cols = (out_cols + 1) // 2
+
+    # pad the input to a whole number of tiles and cut out the 4x4 tiles
+    x = T.zeros((batch, channels, 2 * tile_rows + 2, 2 * tile_cols + 2),
+                input.dtype)
+    x = T.set_subtensor(x[:, :, pad[0]:pad[0] + input.shape[2],
+                          pad[1]:pad[1] + input.shape[3]], input)
+    tiles = [[x[:, :, i:i + 2 * tile_rows:2, j:j + 2 * tile_cols:2]
+              for j in range(4)] for i in range(4)]
+
+    # transform the tiles and filters, with the 16 elements of the
+    # transformed tiles in the leading axis
+    tiles = _transform2d(tiles, _winograd_BT)
+    v = T.stack([t.dimshuffle(1, 0, 2, 3).reshape((channels, -1))
+                 for row in tiles for t in row])
+    weights = [[filters[:, :, i, j] for j in range(3)] for i in range(3)]
+    weights = _transform2d(weights, _winograd_G)
+    u = T.stack([w for row in weights for w in row])
+
+    # multiply (num_filters x channels) by (channels x tiles) per element
+    m = T.batched_dot(u, v)
+    m = m.reshape((4, 4, filters.shape[0], batch, tile_rows, tile_cols))
+
+    # transform back into 2x2 output tiles and interleave them
+    y = _transform2d([[m[i, j] for j in range(4)] for i in range(4)],
+                     _winograd_AT)
+    y = T.stack([T.stack(row) for row in y])
+    y = y.dimshuffle(3, 2, 4, 0, 5, 1).reshape(
+            (batch, filters.shape[0], 2 * tile_rows, 2 * tile_cols))
+    return y[:, :, :out_rows, :out_cols]
+
+
+# FFT convolutions
+
+def _next_power_of_two(x):
+    # at least 2, as a real FFT of odd size is not supported
+    return max(2, 1 << int(x - 1).bit_length())
+
+
+def fft_block_sizes(input_size, filter_size, block_size=None):
+    """
+    Chooses the block size and FFT size along each axis for `conv_fft`.
+
+    Inputs up to the length of a block are transformed at once. Longer or
+    unknown lengths are split into blocks that fill an FFT of the next power
+    of two of at least four times the filter length.
+    """
+    blocks = []
+    for i, (length, k) in enumerate(zip(input_size, filter_size)):
+        if block_size is not None:
+            b = block_size[i] if isinstance(block_size, tuple) else block_size
+            blocks.append((b, _next_power_of_two(b + k - 1)))
+            continue
+        fft_size = _next_power_of_two(4 * k)
+        if length is not None and length <= fft_size - k + 1:
+            fft_size = _next_power_of_two(length + k - 1)
+            blocks.append((length, fft_size))
+        else:
+            blocks.append((fft_size - k + 1, fft_size))
+    return blocks
+
+
+def _zero_pad(x, shape, offsets=None):
+    # embeds x into zeros of the given (possibly symbolic) shape
+    if offsets is None:
+        offsets = (0, ) * x.ndim
+    index = tuple(slice(o, o + x.shape[i]) for i, o in enumerate(offsets))
+    return T.set_subtensor(T.zeros(shape, x.dtype)[index], x)
+
+
+def _overlap_add(y, axis, block, num_blocks, fft_size):
+    # y holds the block results in axis and their samples in axis + 1; sums
+    # the results of all blocks shifted by their offsets into a single axis
+    splits = -(-fft_size // block)
+    shape = [y.shape[i] for i in range(y.ndim)]
+    shape[axis + 1] = splits * block
+    y = _zero_pad(y, shape)
+    shape = shape[:axis + 1] + [splits, block] + shape[axis + 2:]
+    y = y.reshape(shape, ndim=len(shape))
+    out_shape = (shape[:axis] + [num_blocks + splits - 1, block] +
+                 shape[axis + 3:])
+    out = T.zeros(out_shape, y.dtype)
+    before = (slice(None), ) * axis
+    for s in range(splits):
+        out = T.inc_subtensor(out[before + (slice(s, s + num_blocks), )],
+                              y[before + (slice(None), s)])
+    out_shape = (out_shape[:axis] + [(num_blocks + splits - 1) * block] +
+                 out_shape[axis + 2:])
+    return out.reshape(out_shape, ndim=len(out_shape))
+
+
+def conv_fft(input, filters, image_shape=None, filter_shape=None,
+             border_mode='valid', subsample=None, filter_flip=True,
+             block_size=None, n=2):
+    """
+    n-dimensional convolution by multiplication in the frequency domain.
+
+    The input is split into blocks along each spatial axis, chosen by
+    `fft_block_sizes` unless `block_size` gives their length. All blocks of
+    all examples are transformed at once; their spectra are multiplied with
+    the filter spectra, which are computed a single time per call, summed
+    over the input channels, transformed back, and the overlapping block
+    results are added up (overlap-add). A stride is applied by subsampling
+    the unstrided result.
+
+    The filter size must be known, from `filter_shape` or as a constant
+    shape of `filters`. The cost does not depend on the filter size beyond
+    the FFT size, so this pays off for large filters.
+    """
+    from theano.tensor import fft
+
+    if filter_shape is None:
+        filter_shape = _constant_shape(filters)
+        if filter_shape is None:
+            raise ValueError("conv_fft requires a known filter_shape")
+    kernel = tuple(int(k) for k in filter_shape[2:])
+    if image_shape is None:
+        image_shape = (None, ) * (n + 2)
+    subsample = (1, ) * n if subsample is None else tuple(subsample)
+
+    if border_mode == 'valid':
+        border_mode = (0, ) * n
+    elif border_mode == 'full':
+        border_mode = tuple(k - 1 for k in kernel)
+    elif border_mode == 'half':
+        border_mode = tuple(k // 2 for k in kernel)
+    elif isinstance(border_mode, int):
+        border_mode = (border_mode, ) * n
+    border_mode = tuple(border_mode)
+    if len(border_mode) != n:
+        raise ValueError("invalid border_mode for conv_fft: %r"
+                         % (border_mode, ))
+    if filter_flip is False:
+        filters = filters[(slice(None), slice(None)) +
+                          (slice(None, None, -1), ) * n]
+
+    spatial = range(2, n + 2)
+    lengths = [input.shape[d] + 2 * p
+               for d, p in zip(spatial, border_mode)]
+    known = [None if s is None else s + 2 * p
+             for s, p in zip(image_shape[2:], border_mode)]
+    blocks = fft_block_sizes(known, kernel, block_size)
+    num_blocks = [-(-length // b) for length, (b, _) in zip(lengths, blocks)]
+
+    # pad the input and split it into blocks, moved into the batch axis
+    batch, channels = input.shape[0], input.shape[1]
+    shape = [batch, channels] + [nb * b for nb, (b, _) in
+                                 zip(num_blocks, blocks)]
+    x = _zero_pad(input, shape, (0, 0) + border_mode)
+    shape = [batch, channels]
+    for nb, (b, _) in zip(num_blocks, blocks):
+        shape += [nb, b]
+    x = x.reshape(shape, ndim=2 + 2 * n)
+    x = x.dimshuffle([0] + [2 + 2 * i for i in range(n)] + [1] +
+                     [3 + 2 * i for i in range(n)])
+    num_examples = batch
+    for nb in num_blocks:
+        num_examples *= nb
+    fft_sizes = [f for _, f in blocks]
+    x = x.reshape([num_examples * channels] + [b for b, _ in blocks],
+                  ndim=n + 1)
+    x = _zero_pad(x, [x.shape[0]] + fft_sizes)
+
+    # transform the blocks and the filters
+    num_frequencies = int(np.prod(fft_sizes[:-1])) * (fft_sizes[-1] // 2 + 1)
+    x = fft.rfft(x).reshape((num_examples, channels, num_frequencies, 2))
+    num_filters = filters.shape[0]
+    w = filters.reshape([num_filters * channels] + list(kernel),
+                        ndim=n + 1)
+    w = _zero_pad(w, [w.shape[0]] + fft_sizes)
+    w = fft.rfft(w).reshape((num_filters, channels, num_frequencies, 2))
+
+    # multiply the spectra and sum over the input channels, computing one
+    # complex matrix product (examples x channels x filters) per frequency
+    xr, xi = x[..., 0].dimshuffle(2, 0, 1), x[..., 1].dimshuffle(2, 0, 1)
+    wr, wi = w[..., 0].dimshuffle(2, 1, 0), w[..., 1].dimshuffle(2, 1, 0)
+    yr = T.batched_dot(xr, wr) - T.batched_dot(xi, wi)
+    yi = T.batched_dot(xr, wi) + T.batched_dot(xi, wr)
+    y = T.stack([yr, yi], axis=-1).dimshuffle(1, 2, 0, 3)
+    y = y.reshape([num_examples * num_filters] + fft_sizes[:-1] +
+                  [fft_sizes[-1] // 2 + 1, 2], ndim=n + 2)
+    y = fft.irfft(y)
+
+    # add up the overlapping results of the blocks
+    y = y.reshape([batch] + num_blocks + [num_filters] + fft_sizes,
+                  ndim=2 * n + 2)
+    order = [0, n + 1]
+    for i in range(n):
+        order += [1 + i, n + 2 + i]
+    y = y.dimshuffle(order)
+    for i in reversed(range(n)):
+        y = _overlap_add(y, 2 + 2 * i, blocks[i][0], num_blocks[i],
+                         fft_sizes[i])
+
+    # keep the part where the filters fully overlap the padded input
+    index = (slice(None), slice(None))
+    for length, k, s in zip(lengths, kernel, subsample):
+        index += (slice(k - 1, length, s), )
+    return y[index]
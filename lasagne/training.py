@@ -0,0 +1,130 @@
+"""
+Helpers to compile training functions.
+
+Each call of a compiled Theano function has a fixed overhead in Python and
+Theano, which can take a significant part of the time of a training step for
+small networks. :func:`multistep_function` reduces that overhead by running
+several training steps per call:
+
+.. autosummary::
+    :nosignatures:
+
+    multistep_function
+
+Examples
+--------
+>>> import numpy as np
+>>> import theano
+>>> import theano.tensor as T
+>>> import lasagne
+>>> from lasagne.training import multistep_function
+>>> l_in = lasagne.layers.InputLayer((None, 20))
+>>> l_out = lasagne.layers.DenseLayer(
+...     l_in, num_units=3, nonlinearity=lasagne.nonlinearities.softmax)
+>>> targets = T.ivector('targets')
+>>> loss = lasagne.objectives.categorical_crossentropy(
+...     lasagne.layers.get_output(l_out), targets).mean()
+>>> params = lasagne.layers.get_all_params(l_out, trainable=True)
+>>> updates = lasagne.updates.adam(loss, params, learning_rate=1e-3)
+>>> train_fn = multistep_function([l_in.input_var, targets], loss, updates)
+
+The compiled function takes blocks of minibatches stacked along a new first
+axis, performs one update per minibatch and returns the loss of each step:
+
+>>> X = np.random.randn(8, 32, 20).astype(theano.config.floatX)
+>>> y = np.random.randint(3, size=(8, 32)).astype('int32')
+>>> train_fn(X, y).shape
+(8,)
+"""
+from collections import OrderedDict
+
+import theano
+import theano.tensor as T
+
+__all__ = [
+    "multistep_function",
+]
+
+
+def multistep_function(inputs, loss, updates, outputs=None,
+                       static_inputs=None, **kwargs):
+    """
+    Compiles a function performing several training steps per call.
+
+    The returned function takes each of the `inputs` stacked along a new
+    leading axis of length ``K``, i.e., a block of ``K`` minibatches. It
+    loops over the block inside a single :func:`theano.scan`, applying the
+    `updates` once per minibatch exactly as ``K`` calls of
+    ``theano.function(inputs, loss, updates=updates)`` would, and returns the
+    loss of each step.
+
+    Parameters
+    ----------
+    inputs : list of Theano variables
+        The per-minibatch inputs of the training step, such as the input
+        variable of the network and the targets.
+    loss : Theano scalar expression
+        The training loss, computed from `inputs`.
+    updates : dict
+        The update expressions of a training step, such as returned by the
+        functions of :mod:`lasagne.updates`.
+    outputs : list of Theano expressions or None
+        Further expressions to compute at each step, such as the accuracy.
+    static_inputs : list of Theano variables or None
+        Further inputs that are shared by all steps, such as a learning rate.
+        They are passed to the compiled function after the stacked inputs.
+    **kwargs
+        Any additional keyword arguments are passed on to
+        :func:`theano.function`.
+
+    Returns
+    -------
+    callable
+        The compiled function. It returns the vector of the losses of the
+        ``K`` steps if `outputs` is ``None``, and a list of the stacked loss
+        and outputs otherwise.
+
+    Notes
+    -----
+    Any updates of random number generators, such as those of the random
+    streams of :class:`lasagne.layers.DropoutLayer`, are applied at each step
+    as well, so each step draws new noise.
+
+    Since the parameters are updated inside the loop, a block should hold
+    at most as many steps as may be run between two validations or
+    checkpoints. The stacked inputs of all steps are passed in a single
+    call, so it pays to keep them in shared variables on a GPU, e.g., by
+    slicing them with ``givens``.
+    """
+    inputs = list(inputs)
+    static_inputs = list(static_inputs or [])
+    outputs = list(outputs or [])
+    updates = OrderedDict(updates)
+    # random streams update their state through the default updates of
+    # shared variables, which refer to the per-minibatch inputs as well
+    for var in theano.gof.graph.inputs([loss] + outputs +
+                                       list(updates.values())):
+        if (isinstance(var, theano.compile.SharedVariable) and
+                var not in updates and
+                getattr(var, 'default_update', None) is not None):
+            updates[var] = var.default_update
+    state = list(updates.keys())
+    num_outputs = 1 + len(outputs)
+
+    def step(*args):
+        replace = OrderedDict(zip(inputs + static_inputs, args))
+        results = theano.clone([loss] + outputs + list(updates.values()),
+                               replace=replace)
+        return (results[:num_outputs],
+                OrderedDict(zip(state, results[num_outputs:])))
+
+    sequences = [T.TensorType(x.dtype, (False,) + x.broadcastable)(
+                 None if x.name is None else x.name + '_steps')
+                 for x in inputs]
+    results, scan_updates = theano.scan(step, sequences=sequences,
+                                        non_sequences=static_inputs)
+    if num_outputs == 1:
+        results = [results]
+    return theano.function(sequences + static_inputs,
+                           results[0] if not outputs else results,
+                           updates=scan_updates, **kwargs)
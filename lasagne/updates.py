@@ -179,16 +179,47 @@ def sgd(loss_or_grads, params, learning_rate):
     -------
     OrderedDict
         A dictionary mapping each parameter to its update expression
+
+    Notes
+    -----
+    If the gradient of a parameter only increments some of its rows, as the
+    gradient of indexing the parameter does (e.g., for an
+    :class:`EmbeddingLayer`, or a :class:`DenseLayer` with sparse input),
+    only these rows are updated, instead of subtracting a mostly zero
+    gradient from the whole parameter.
     """
     grads = get_or_compute_grads(loss_or_grads, params)
     updates = OrderedDict()
 
     for param, grad in zip(params, grads):
-        updates[param] = param - learning_rate * grad
+        sparse_grad = _sparse_rows(grad)
+        if sparse_grad is None:
+            updates[param] = param - learning_rate * grad
+        else:
+            indices, rows = sparse_grad
+            updates[param] = T.inc_subtensor(param[indices],
+                                             -learning_rate * rows)
 
     return updates
 
 
+def _sparse_rows(grad):
+    # returns (indices, rows) if grad increments the given rows of a tensor
+    # of zeros, as the gradient of advanced indexing does, otherwise None
+    owner = grad.owner
+    if (owner is None or
+            not isinstance(owner.op, T.subtensor.AdvancedIncSubtensor1) or
+            owner.op.set_instead_of_inc):
+        return None
+    zeros, rows, indices = owner.inputs
+    try:
+        if T.get_scalar_constant_value(zeros) != 0:
+            return None
+    except T.NotScalarConstantError:
+        return None
+    return indices, rows
+
+
 def apply_momentum(updates, params=None, momentum=0.9, velocities=None):
     """Returns a modified update dictionary including momentum
 
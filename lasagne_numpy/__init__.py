@@ -0,0 +1,1054 @@
+"""
+Runs networks exported with :func:`lasagne.inference.export` on NumPy arrays.
+
+This module only depends on NumPy. It holds :class:`NumpyNetwork` and the
+operations it is made of, so that unpickling an exported network does not
+import Theano or Lasagne: serving replicas only need NumPy (and SciPy for
+sparse dense layers) to load and run a network.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+__all__ = [
+    "NumpyNetwork",
+]
+
+
+def _conv_input_length(output_length, filter_size, stride, pad):
+    # NumPy-only version of lasagne.layers.conv.conv_input_length for an
+    # integer pad
+    return (output_length - 1) * stride - 2 * pad + filter_size
+
+
+def _pool_output_length(input_length, pool_size, stride, pad,
+                        ignore_border):
+    # NumPy-only version of lasagne.layers.pool.pool_output_length
+    if ignore_border:
+        output_length = input_length + 2 * pad - pool_size + 1
+        return (output_length + stride - 1) // stride
+    if stride >= pool_size:
+        return (input_length + stride - 1) // stride
+    return max(0, (input_length - pool_size + stride - 1) // stride) + 1
+
+
+class NumpyNetwork(object):
+    """
+    A network exported with :func:`lasagne.inference.export`, running on
+    NumPy arrays.
+
+    Calling the network with one array per input layer returns the output of
+    the network, as a single array if the exported layers have a single
+    output in total and as a list of arrays otherwise. The returned arrays
+    are copies; all intermediate results live in buffers owned by the
+    operations, which are reused between calls with inputs of the same
+    shapes.
+
+    Parameters
+    ----------
+    input_dtypes : list of str or None
+        The dtype of each input, inputs are cast to it if given.
+
+    program : list of tuples
+        For each operation, a tuple of the operation and the indices of the
+        nodes feeding into it. The first nodes are the inputs, followed by
+        the operations in order.
+
+    output_nodes : list of int
+        The indices of the nodes whose outputs are returned.
+    """
+    def __init__(self, input_dtypes, program, output_nodes):
+        self.input_dtypes = list(input_dtypes)
+        self.program = list(program)
+        self.output_nodes = list(output_nodes)
+
+    @property
+    def num_inputs(self):
+        return len(self.input_dtypes)
+
+    def run(self, *inputs):
+        """
+        Computes the outputs without copying them out of the buffers.
+
+        The returned arrays are overwritten by the next call, use
+        :meth:`__call__` unless they are consumed immediately.
+
+        Parameters
+        ----------
+        *inputs : numpy arrays
+            One array for each input layer.
+
+        Returns
+        -------
+        list of numpy arrays
+            The outputs of the exported layers.
+        """
+        if len(inputs) != self.num_inputs:
+            raise TypeError("Expected %d inputs, got %d."
+                            % (self.num_inputs, len(inputs)))
+        values = [(np.asarray(x, dtype=dtype), )
+                  for x, dtype in zip(inputs, self.input_dtypes)]
+        for op, nodes in self.program:
+            args = ()
+            for node in nodes:
+                args += values[node]
+            values.append(tuple(op(args)))
+        outputs = []
+        for node in self.output_nodes:
+            outputs.extend(values[node])
+        return outputs
+
+    def __call__(self, *inputs):
+        outputs = [np.array(o) for o in self.run(*inputs)]
+        if len(outputs) == 1:
+            return outputs[0]
+        return outputs
+
+
+# Nonlinearities, applied as f(x, out) and returning out, with out possibly
+# being x itself.
+
+def _identity(x, out):
+    if out is not x:
+        np.copyto(out, x)
+    return out
+
+
+def _sigmoid(x, out):
+    # numerically stable as 0.5 * (1 + tanh(x / 2))
+    np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    out += 1
+    out *= 0.5
+    return out
+
+
+def _softmax(x, out):
+    np.subtract(x, x.max(axis=1, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= out.sum(axis=1, keepdims=True)
+    return out
+
+
+def _tanh(x, out):
+    return np.tanh(x, out=out)
+
+
+def _rectify(x, out):
+    return np.maximum(x, 0, out=out)
+
+
+def _elu(x, out):
+    negative = np.expm1(np.minimum(x, 0))
+    np.maximum(x, 0, out=out)
+    out += negative
+    return out
+
+
+def _softplus(x, out):
+    return np.logaddexp(0, x, out=out)
+
+
+class _ScaledTanH(object):
+    def __init__(self, scale_in, scale_out):
+        self.scale_in = scale_in
+        self.scale_out = scale_out
+
+    def __call__(self, x, out):
+        np.multiply(x, self.scale_in, out=out)
+        np.tanh(out, out=out)
+        out *= self.scale_out
+        return out
+
+
+class _LeakyRectify(object):
+    def __init__(self, leakiness):
+        self.leakiness = leakiness
+
+    def __call__(self, x, out):
+        np.multiply(x, np.where(x > 0, 1, self.leakiness), out=out)
+        return out
+
+
+class _LeakyElu(object):
+    def __init__(self, leakiness):
+        self.leakiness = leakiness
+
+    def __call__(self, x, out):
+        negative = np.expm1(np.minimum(x, 0)) * self.leakiness
+        np.maximum(x, 0, out=out)
+        out += negative
+        return out
+
+
+# Operations
+
+class _Op(object):
+    """Base class of the NumPy operations, managing reusable buffers."""
+    def _buffer(self, key, shape, dtype, fill=None):
+        buffers = self.__dict__.setdefault('_buffers', {})
+        buf = buffers.get(key)
+        shape = tuple(int(s) for s in shape)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            if fill is None:
+                buf = np.empty(shape, dtype)
+            else:
+                buf = np.full(shape, fill, dtype)
+            buffers[key] = buf
+        return buf
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_buffers', None)
+        return state
+
+
+class _Identity(_Op):
+    def __call__(self, inputs):
+        return inputs
+
+
+class _Linear(_Op):
+    """
+    Base class of the operations multiplying their input with a weight matrix
+    ``W`` holding one row per output unit, which may be quantized to int8
+    with :meth:`quantize`.
+    """
+    #: number of output units whose int8 weights are dequantized at once
+    block_size = 128
+    num_groups = 1
+    W_scale = None
+    input_scale = None
+
+    def quantize(self, input_scale=None):
+        """
+        Quantizes the weights to int8 with one scale per output unit.
+
+        Parameters
+        ----------
+        input_scale : float or None
+            If given, inputs are quantized to int8 with this scale and
+            multiplied with the weights accumulating in int32. Otherwise the
+            weights are dequantized and the product accumulates in floating
+            point, dequantizing a block of :attr:`block_size` output units
+            at a time.
+        """
+        W = self.W
+        scale = np.abs(W).max(axis=1, keepdims=True) / 127.
+        scale[scale == 0] = 1
+        self.W = np.rint(W / scale).astype(np.int8)
+        self.W_scale = scale.astype(W.dtype)
+        self.input_scale = input_scale
+
+    def _matmul(self, x, W, out, **kwargs):
+        raise NotImplementedError
+
+    def _block(self, x, out, start, stop):
+        # the part of x and out for the output units start:stop, which lie in
+        # a single group
+        raise NotImplementedError
+
+    def _block_matmul(self, x, W, out):
+        return self._matmul(x, W, out)
+
+    def _output_scale(self, scale):
+        # the scales of W, broadcastable against the output
+        return scale
+
+    def _product(self, x, out):
+        # computes the product of x with W into out
+        if self.W_scale is None:
+            self._matmul(x.astype(out.dtype, copy=False),
+                         self.W.astype(out.dtype, copy=False), out)
+        elif self.input_scale is None:
+            self._dequantized_product(x.astype(out.dtype, copy=False), out)
+        else:
+            xq = self._buffer('xq', x.shape, np.int8)
+            np.clip(np.rint(x / self.input_scale), -127, 127, out=xq,
+                    casting='unsafe')
+            acc = self._buffer('acc', out.shape, np.int32)
+            self._matmul(xq, self.W, acc, dtype=np.int32)
+            np.multiply(acc, self._output_scale(self.W_scale) *
+                        self.input_scale, out=out)
+
+    def _dequantized_product(self, x, out):
+        # Casts the int8 weights of a block of output units into a small
+        # buffer and scales the block of the output, instead of dequantizing
+        # all of W into a full-size floating-point copy on each call.
+        num_units = self.W.shape[0]
+        group_size = num_units // self.num_groups
+        for group_start in range(0, num_units, group_size):
+            group_stop = group_start + group_size
+            for start in range(group_start, group_stop, self.block_size):
+                stop = min(start + self.block_size, group_stop)
+                W = self._buffer(('W', stop - start),
+                                 (stop - start, self.W.shape[1]), out.dtype)
+                np.copyto(W, self.W[start:stop])
+                x_block, out_block = self._block(x, out, start, stop)
+                self._block_matmul(x_block, W, out_block)
+                out_block *= self._output_scale(self.W_scale[start:stop])
+
+    def _dtype(self, x):
+        if self.W_scale is None:
+            return np.result_type(x, self.W)
+        return np.result_type(x, self.W_scale)
+
+
+class _Dense(_Linear):
+    def __init__(self, W, b, nonlinearity, num_leading_axes):
+        # (num_units, num_inputs), so the weights of each unit are contiguous
+        self.W = np.ascontiguousarray(W.T)
+        self.b = b
+        self.nonlinearity = nonlinearity
+        self.num_leading_axes = num_leading_axes
+
+    def _matmul(self, x, W, out, **kwargs):
+        np.matmul(x, W.T, out=out, **kwargs)
+
+    def _block(self, x, out, start, stop):
+        return x, out[:, start:stop]
+
+    def _output_scale(self, scale):
+        return scale.T
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        num_leading_axes = self.num_leading_axes
+        if num_leading_axes < 0:
+            num_leading_axes += x.ndim
+        leading = x.shape[:num_leading_axes]
+        x = x.reshape((-1, self.W.shape[1]))
+        out = self._buffer('out', (x.shape[0], self.W.shape[0]),
+                           self._dtype(x))
+        self._product(x, out)
+        if self.b is not None:
+            out += self.b
+        self.nonlinearity(out, out)
+        return out.reshape(leading + (self.W.shape[0], )),
+
+
+class _SparseDense(_Op):
+    def __init__(self, W, b, nonlinearity, num_leading_axes):
+        # scipy.sparse matrix of shape (num_units, num_inputs)
+        self.W = W.T.tocsr()
+        self.b = b
+        self.nonlinearity = nonlinearity
+        self.num_leading_axes = num_leading_axes
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        num_leading_axes = self.num_leading_axes
+        if num_leading_axes < 0:
+            num_leading_axes += x.ndim
+        leading = x.shape[:num_leading_axes]
+        x = x.reshape((-1, self.W.shape[1]))
+        out = self._buffer('out', (x.shape[0], self.W.shape[0]),
+                           np.result_type(x, self.W.dtype))
+        out[...] = self.W.dot(x.T).T
+        if self.b is not None:
+            out += self.b
+        self.nonlinearity(out, out)
+        return out.reshape(leading + (self.W.shape[0], )),
+
+
+class _AdaptiveSoftmax(_Op):
+    def __init__(self, W_head, b_head, W_proj, W_tail, cutoffs):
+        self.W_head = W_head
+        self.b_head = b_head
+        self.W_proj = W_proj
+        self.W_tail = W_tail
+        self.cutoffs = cutoffs
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        dtype = np.result_type(x, self.W_head)
+        shortlist = self.cutoffs[0]
+        head = self._buffer('head', (x.shape[0], self.W_head.shape[1]), dtype)
+        np.dot(x, self.W_head, out=head)
+        if self.b_head is not None:
+            head += self.b_head
+        _softmax(head, head)
+        num_units = self.cutoffs[-1] + self.W_tail[-1].shape[1]
+        out = self._buffer('out', (x.shape[0], num_units), dtype)
+        out[:, :shortlist] = head[:, :shortlist]
+        bounds = self.cutoffs + [num_units]
+        for i, (W_proj, W_tail) in enumerate(zip(self.W_proj, self.W_tail)):
+            tail = out[:, bounds[i]:bounds[i + 1]]
+            _softmax(np.dot(np.dot(x, W_proj), W_tail), tail)
+            tail *= head[:, shortlist + i, np.newaxis]
+        return out,
+
+
+class _NIN(_Linear):
+    def __init__(self, W, b, nonlinearity):
+        # (num_units, channels), applied to each location of each example
+        self.W = np.ascontiguousarray(W.T)
+        self.b = None if b is None else b.reshape(b.shape[0], -1)
+        self.nonlinearity = nonlinearity
+
+    def _matmul(self, x, W, out, **kwargs):
+        np.matmul(W, x, out=out, **kwargs)
+
+    def _block(self, x, out, start, stop):
+        return x, out[:, start:stop]
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        n, c = x.shape[:2]
+        out = self._buffer('out', (n, self.W.shape[0]) + x.shape[2:],
+                           self._dtype(x))
+        out3 = out.reshape(n, self.W.shape[0], -1)
+        self._product(x.reshape(n, c, -1), out3)
+        if self.b is not None:
+            out3 += self.b
+        self.nonlinearity(out, out)
+        return out,
+
+
+class _Conv(_Linear):
+    """
+    N-dimensional cross-correlation as a single batched matrix product of
+    the filters with the im2col expansion of the input. For a grouped
+    convolution, the product is batched over the groups as well.
+    """
+    def __init__(self, W, b, nonlinearity, stride, pad, dilation,
+                 num_groups=1):
+        self.filter_size = W.shape[2:]
+        self.num_filters = W.shape[0]
+        self.W = np.ascontiguousarray(W.reshape(W.shape[0], -1))
+        self.b = None if b is None else b.reshape(b.shape[0], -1)
+        self.nonlinearity = nonlinearity
+        self.stride = tuple(stride)
+        self.pad = tuple(pad)
+        self.dilation = tuple(dilation)
+        self.num_groups = num_groups
+
+    def _matmul(self, x, W, out, **kwargs):
+        if self.num_groups != 1:
+            # the columns of each group of input channels are contiguous
+            g = self.num_groups
+            x = x.reshape(x.shape[0], g, -1, x.shape[-1])
+            W = W.reshape(g, -1, W.shape[-1])
+            out = out.reshape(out.shape[0], g, -1, out.shape[-1])
+        np.matmul(W, x, out=out, **kwargs)
+
+    def _block(self, x, out, start, stop):
+        # the columns of the group of input channels of these filters
+        group = start // (self.num_filters // self.num_groups)
+        channels = x.shape[1] // self.num_groups
+        return (x[:, group * channels:(group + 1) * channels],
+                out[:, start:stop])
+
+    def _block_matmul(self, x, W, out):
+        np.matmul(W, x, out=out)
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        n, c = x.shape[:2]
+        dtype = self._dtype(x)
+        if any(self.pad):
+            shape = tuple(s + 2 * p for s, p in zip(x.shape[2:], self.pad))
+            padded = self._buffer('pad', (n, c) + shape, dtype, fill=0)
+            padded[(Ellipsis, ) + tuple(slice(p, p + s) for s, p in
+                                        zip(x.shape[2:], self.pad))] = x
+            x = padded
+        else:
+            x = np.ascontiguousarray(x, dtype=dtype)
+        out_size = tuple((s - (k - 1) * d - 1) // st + 1 for s, k, st, d in
+                         zip(x.shape[2:], self.filter_size, self.stride,
+                             self.dilation))
+        strides = x.strides[2:]
+        windows = as_strided(
+            x, (n, c) + self.filter_size + out_size,
+            x.strides[:2] +
+            tuple(s * d for s, d in zip(strides, self.dilation)) +
+            tuple(s * st for s, st in zip(strides, self.stride)))
+        cols = self._buffer('cols', (n, self.W.shape[1] * self.num_groups,
+                                     int(np.prod(out_size))), dtype)
+        np.copyto(cols.reshape(windows.shape), windows)
+        out = self._buffer('out', (n, self.num_filters) + out_size, dtype)
+        out3 = out.reshape(n, self.num_filters, -1)
+        self._product(cols, out3)
+        if self.b is not None:
+            out3 += self.b
+        self.nonlinearity(out, out)
+        return out,
+
+
+class _TransposedConv(_Op):
+    """
+    Transposed convolution as a batched matrix product followed by a
+    scatter-add of the columns into the output (col2im).
+    """
+    def __init__(self, W, b, nonlinearity, stride, crop, output_size):
+        self.filter_size = W.shape[2:]
+        self.num_filters = W.shape[1]
+        # (num_filters * prod(filter_size), input channels)
+        self.W = np.ascontiguousarray(W.reshape(W.shape[0], -1).T)
+        self.b = None if b is None else b.reshape(b.shape[0], -1)
+        self.nonlinearity = nonlinearity
+        self.stride = tuple(stride)
+        self.crop = tuple(crop)
+        self.output_size = output_size
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        n, c = x.shape[:2]
+        in_size = x.shape[2:]
+        dtype = np.result_type(x, self.W)
+        if self.output_size is not None:
+            out_size = tuple(self.output_size)
+        else:
+            out_size = tuple(_conv_input_length(s, k, st, p) for s, k, st, p in
+                             zip(in_size, self.filter_size, self.stride,
+                                 self.crop))
+        cols = self._buffer('cols', (n, self.W.shape[0],
+                                     int(np.prod(in_size))), dtype)
+        np.matmul(self.W.astype(dtype, copy=False),
+                  x.reshape(n, c, -1).astype(dtype, copy=False), out=cols)
+        cols = cols.reshape((n, self.num_filters) + self.filter_size +
+                            in_size)
+        full_size = tuple(max((s - 1) * st + k, p + o) for s, k, st, p, o in
+                          zip(in_size, self.filter_size, self.stride,
+                              self.crop, out_size))
+        full = self._buffer('full', (n, self.num_filters) + full_size, dtype)
+        full.fill(0)
+        for offset in np.ndindex(*self.filter_size):
+            index = tuple(slice(o, o + (s - 1) * st + 1, st) for o, s, st in
+                          zip(offset, in_size, self.stride))
+            full[(Ellipsis, ) + index] += cols[(slice(None), slice(None)) +
+                                               offset]
+        out = self._buffer('out', (n, self.num_filters) + out_size, dtype)
+        out[...] = full[(Ellipsis, ) + tuple(slice(p, p + o) for p, o in
+                                             zip(self.crop, out_size))]
+        if self.b is not None:
+            out3 = out.reshape(n, self.num_filters, -1)
+            out3 += self.b
+        self.nonlinearity(out, out)
+        return out,
+
+
+class _Pool(_Op):
+    def __init__(self, pool_size, stride, pad, ignore_border, mode):
+        self.pool_size = tuple(pool_size)
+        self.stride = tuple(stride)
+        self.pad = tuple(pad)
+        self.ignore_border = ignore_border
+        self.mode = mode
+
+    def _windows(self, x, out_size):
+        strides = x.strides[2:]
+        return as_strided(
+            x, x.shape[:2] + out_size + self.pool_size,
+            x.strides[:2] + tuple(s * st for s, st in zip(strides,
+                                                          self.stride)) +
+            strides)
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        ndim = len(self.pool_size)
+        in_size = x.shape[2:]
+        out_size = tuple(_pool_output_length(s, k, st, p, self.ignore_border)
+                         for s, k, st, p in zip(in_size, self.pool_size,
+                                                self.stride, self.pad))
+        # pad to cover all windows, including partial ones at the border
+        size = tuple(max(s + 2 * p, (o - 1) * st + k) for s, p, o, st, k in
+                     zip(in_size, self.pad, out_size, self.stride,
+                         self.pool_size))
+        fill = -np.inf if self.mode == 'max' else 0
+        padded = self._buffer('pad', x.shape[:2] + size, x.dtype, fill=fill)
+        padded[(Ellipsis, ) + tuple(slice(p, p + s) for s, p in
+                                    zip(in_size, self.pad))] = x
+        axes = tuple(range(2 + ndim, 2 + 2 * ndim))
+        out = self._buffer('out', x.shape[:2] + out_size, x.dtype)
+        windows = self._windows(padded, out_size)
+        if self.mode == 'max':
+            np.max(windows, axis=axes, out=out)
+        else:
+            np.sum(windows, axis=axes, out=out)
+            if self.mode != 'sum':
+                out /= self._counts(in_size, size, out_size, axes)
+        return out,
+
+    def _counts(self, in_size, size, out_size, axes):
+        # number of elements averaged over by each window
+        key = (in_size, out_size)
+        counts = self.__dict__.get('_counts_cache')
+        if counts is None or counts[0] != key:
+            mask = np.zeros((1, 1) + size)
+            if self.mode == 'average_inc_pad':
+                mask[(Ellipsis, ) + tuple(slice(0, s + 2 * p) for s, p in
+                                          zip(in_size, self.pad))] = 1
+            else:
+                mask[(Ellipsis, ) + tuple(slice(p, p + s) for s, p in
+                                          zip(in_size, self.pad))] = 1
+            counts = (key, self._windows(mask, out_size).sum(axis=axes))
+            self._counts_cache = counts
+        return counts[1]
+
+    def __getstate__(self):
+        state = super(_Pool, self).__getstate__()
+        state.pop('_counts_cache', None)
+        return state
+
+
+class _GlobalPool(_Op):
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        x = x.reshape(x.shape[:2] + (-1, ))
+        out = self._buffer('out', x.shape[:2], x.dtype)
+        return self.function(x, axis=2, out=out),
+
+
+class _Upscale(_Op):
+    def __init__(self, scale_factor, mode):
+        self.scale_factor = tuple(scale_factor)
+        self.mode = mode
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        shape = x.shape[:2] + tuple(s * f for s, f in
+                                    zip(x.shape[2:], self.scale_factor))
+        out = self._buffer('out', shape, x.dtype)
+        if self.mode == 'repeat':
+            # broadcast each element into its block in a single copy
+            split = x.shape[:2]
+            index = (Ellipsis, )
+            for s, f in zip(x.shape[2:], self.scale_factor):
+                split += (s, f)
+                index += (slice(None), None)
+            out.reshape(split)[...] = x[index]
+        else:
+            out.fill(0)
+            out[(Ellipsis, ) + tuple(slice(None, None, f)
+                                     for f in self.scale_factor)] = x
+        return out,
+
+
+class _PixelShuffle(_Op):
+    def __init__(self, scale_factor):
+        self.scale_factor = tuple(scale_factor)
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        a, b = self.scale_factor
+        N, C, H, W = x.shape
+        C //= a * b
+        out = self._buffer('out', (N, C, H * a, W * b), x.dtype)
+        # write the subpixel channels into the strided view of their blocks
+        out.reshape(N, C, H, a, W, b)[...] = x.reshape(
+            N, C, a, b, H, W).transpose(0, 1, 4, 2, 5, 3)
+        return out,
+
+
+class _BatchNorm(_Op):
+    def __init__(self, scale, shift):
+        self.scale = scale
+        self.shift = shift
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        out = self._buffer('out', x.shape, np.result_type(x, self.scale))
+        np.multiply(x, self.scale, out=out)
+        out += self.shift
+        return out,
+
+
+class _Elemwise(_Op):
+    def __init__(self, function, param):
+        self.function = function
+        self.param = param
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        out = self._buffer('out', x.shape, np.result_type(x, self.param))
+        self.function(x, self.param, out=out)
+        return out,
+
+
+class _PReLU(_Op):
+    def __init__(self, alpha):
+        self.alpha = alpha
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        out = self._buffer('out', x.shape, np.result_type(x, self.alpha))
+        np.multiply(x, np.where(x > 0, 1, self.alpha), out=out)
+        return out,
+
+
+class _Nonlinearity(_Op):
+    def __init__(self, nonlinearity):
+        self.nonlinearity = nonlinearity
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        out = self._buffer('out', x.shape, x.dtype)
+        self.nonlinearity(x, out)
+        return out,
+
+
+class _Flatten(_Op):
+    def __init__(self, outdim):
+        self.outdim = outdim
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        return x.reshape(x.shape[:self.outdim - 1] + (-1, )),
+
+
+class _Reshape(_Op):
+    def __init__(self, shape):
+        self.shape = shape
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        shape = tuple(x.shape[s[0]] if isinstance(s, list) else s
+                      for s in self.shape)
+        return x.reshape(shape),
+
+
+class _Dimshuffle(_Op):
+    def __init__(self, pattern):
+        self.pattern = tuple(pattern)
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        used = [p for p in self.pattern if p != 'x']
+        dropped = [i for i in range(x.ndim) if i not in used]
+        x = x.transpose(used + dropped)
+        # dropped axes are broadcastable and can be removed
+        x = x.reshape(x.shape[:len(used)])
+        return x[tuple(None if p == 'x' else slice(None)
+                       for p in self.pattern)],
+
+
+class _Pad(_Op):
+    def __init__(self, width, val, batch_ndim):
+        self.width = width
+        self.val = val
+        self.batch_ndim = batch_ndim
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        widths = self.width
+        if isinstance(widths, int):
+            widths = [widths] * (x.ndim - self.batch_ndim)
+        shape = list(x.shape)
+        index = [slice(None)] * x.ndim
+        for k, w in enumerate(widths):
+            try:
+                l, r = w
+            except TypeError:
+                l = r = w
+            axis = k + self.batch_ndim
+            shape[axis] += l + r
+            index[axis] = slice(l, l + x.shape[axis])
+        out = self._buffer('out', shape, x.dtype, fill=self.val)
+        out[tuple(index)] = x
+        return out,
+
+
+class _Slice(_Op):
+    def __init__(self, index, axis):
+        self.index = index
+        self.axis = axis
+
+    def __call__(self, inputs):
+        x = inputs[0]
+        axis = self.axis if self.axis >= 0 else self.axis + x.ndim
+        return x[(slice(None), ) * axis + (self.index, )],
+
+
+def _autocrop(inputs, cropping):
+    # NumPy version of lasagne.layers.merge.autocrop
+    if cropping is None:
+        return inputs
+    min_shape = np.min([x.shape for x in inputs], axis=0)
+    slices = [[] for _ in inputs]
+    for dim, cr in enumerate(cropping):
+        for x, s in zip(inputs, slices):
+            if cr is None:
+                s.append(slice(None))
+            elif cr == 'lower':
+                s.append(slice(None, min_shape[dim]))
+            elif cr == 'upper':
+                s.append(slice(x.shape[dim] - min_shape[dim], None))
+            else:
+                offset = (x.shape[dim] - min_shape[dim]) // 2
+                s.append(slice(offset, offset + min_shape[dim]))
+    return [x[tuple(s)] for x, s in zip(inputs, slices)]
+
+
+class _Concat(_Op):
+    def __init__(self, axis, cropping):
+        self.axis = axis
+        self.cropping = cropping
+
+    def __call__(self, inputs):
+        inputs = _autocrop(inputs, self.cropping)
+        axis = self.axis if self.axis >= 0 else self.axis + inputs[0].ndim
+        shape = list(inputs[0].shape)
+        shape[axis] = sum(x.shape[axis] for x in inputs)
+        out = self._buffer('out', shape, np.result_type(*inputs))
+        return np.concatenate(inputs, axis=axis, out=out),
+
+
+class _ElemwiseMerge(_Op):
+    def __init__(self, function, coeffs, cropping):
+        self.function = function
+        self.coeffs = coeffs
+        self.cropping = cropping
+
+    def __call__(self, inputs):
+        inputs = _autocrop(inputs, self.cropping)
+        out = self._buffer('out', inputs[0].shape, np.result_type(*inputs))
+        coeffs = self.coeffs or [1] * len(inputs)
+        np.multiply(inputs[0], coeffs[0], out=out)
+        for x, coeff in zip(inputs[1:], coeffs[1:]):
+            self.function(out, x if coeff == 1 else x * coeff, out=out)
+        return out,
+
+
+class _Embedding(_Op):
+    def __init__(self, W):
+        self.W = W
+
+    def __call__(self, inputs):
+        outputs = []
+        for n, ids in enumerate(inputs):
+            out = self._buffer(n, ids.shape + self.W.shape[1:], self.W.dtype)
+            outputs.append(np.take(self.W, ids, axis=0, out=out))
+        return tuple(outputs)
+
+
+class _EmbeddingBag(_Op):
+    def __init__(self, W, mode, offsets, mask):
+        self.W = W
+        self.mode = mode
+        self.offsets = offsets
+        self.mask = mask
+
+    def __call__(self, inputs):
+        ids = inputs[0]
+        if self.offsets:
+            num_bags = len(inputs[1])
+            bags = np.zeros(len(ids) + 1, np.intp)
+            np.add.at(bags, inputs[1][1:], 1)
+            bags = np.cumsum(bags[:-1])
+        else:
+            num_bags = ids.shape[0]
+            bags = np.repeat(np.arange(num_bags), ids.shape[1])
+            ids = ids.ravel()
+            if self.mask:
+                used = inputs[1].ravel() != 0
+                ids, bags = ids[used], bags[used]
+        out = self._buffer('out', (num_bags, self.W.shape[1]), self.W.dtype)
+        counts = np.bincount(bags, minlength=num_bags)
+        if self.mode == 'max':
+            out.fill(-np.inf)
+            np.maximum.at(out, bags, self.W[ids])
+            out[counts == 0] = 0
+        else:
+            out.fill(0)
+            np.add.at(out, bags, self.W[ids])
+            if self.mode == 'mean':
+                out /= np.maximum(counts, 1)[:, np.newaxis]
+        return out,
+
+
+class _Index(_Op):
+    def __init__(self, indexes):
+        self.indexes = tuple(indexes)
+
+    def __call__(self, inputs):
+        return tuple(inputs[i] for i in self.indexes)
+
+
+# Step layers, called with the inputs and states of one step and the arrays
+# to write the new states to.
+
+class _StandardStep(_Op):
+    def __init__(self, W, b, nonlinearity, pre_compute_input):
+        self.W = W
+        self.b = b
+        self.f = nonlinearity
+        self.pre_compute_input = pre_compute_input
+
+    def __call__(self, args, outs):
+        x, h = args[:2]
+        out = outs[0]
+        if self.pre_compute_input:
+            np.dot(h, self.W, out=out)
+            out += x
+        else:
+            xh = self._buffer('xh', (x.shape[0], self.W.shape[0]), out.dtype)
+            xh[:, :x.shape[1]] = x
+            xh[:, x.shape[1]:] = h
+            np.dot(xh, self.W, out=out)
+            if self.b is not None:
+                out += self.b
+        self.f(out, out)
+
+
+class _GRUStep(_Op):
+    def __init__(self, W, nonlinearity, gates_function):
+        self.W = W
+        self.f = nonlinearity
+        self.g = gates_function
+
+    def __call__(self, args, outs):
+        x, h = args[:2]
+        out = outs[0]
+        n = h.shape[1]
+        a = self._buffer('a', (h.shape[0], 3 * n), out.dtype)
+        np.dot(h, self.W, out=a)
+        ru = a[:, :2 * n]
+        ru += x[:, :2 * n]
+        self.g(ru, ru)
+        c = a[:, 2 * n:]
+        c *= ru[:, :n]
+        c += x[:, 2 * n:]
+        self.f(c, c)
+        # u * c + (1 - u) * h
+        np.subtract(c, h, out=out)
+        out *= ru[:, n:]
+        out += h
+
+
+class _LSTMStep(_Op):
+    def __init__(self, W, b, nonlinearity, gates_function, pre_compute_input):
+        self.W = W
+        self.b = b
+        self.f = nonlinearity
+        self.g = gates_function
+        self.pre_compute_input = pre_compute_input
+
+    def __call__(self, args, outs):
+        x, h, c = args[:3]
+        h_out, c_out = outs
+        n = h.shape[1]
+        a = self._buffer('a', (h.shape[0], 4 * n), h_out.dtype)
+        if self.pre_compute_input:
+            np.dot(h, self.W, out=a)
+            a += x
+        else:
+            xh = self._buffer('xh', (x.shape[0], self.W.shape[0]), a.dtype)
+            xh[:, :x.shape[1]] = x
+            xh[:, x.shape[1]:] = h
+            np.dot(xh, self.W, out=a)
+            if self.b is not None:
+                a += self.b
+        gates = a[:, :2 * n]
+        self.g(gates, gates)
+        candidate = a[:, 2 * n:3 * n]
+        self.f(candidate, candidate)
+        np.multiply(a[:, n:2 * n], c, out=c_out)
+        candidate *= a[:, :n]
+        c_out += candidate
+        o = a[:, 3 * n:]
+        self.g(o, o)
+        self.f(c_out, h_out)
+        h_out *= o
+
+
+class _RWAStep(_Op):
+    def __init__(self, W, nonlinearity, bounding_nonlinearity):
+        self.W = W
+        self.f = nonlinearity
+        self.g = bounding_nonlinearity
+
+    def __call__(self, args, outs):
+        x, h, nt, dt = args[:4]
+        h_out, n_out, d_out = outs
+        n = h.shape[1]
+        shape = (h.shape[0], n)
+        ga = self._buffer('ga', (h.shape[0], 2 * n), h_out.dtype)
+        np.dot(h, self.W, out=ga)
+        ga += x[:, n:]
+        a = ga[:, n:]
+        z = self._buffer('z', shape, h_out.dtype)
+        self.g(ga[:, :n], z)
+        z *= x[:, :n]
+        m = self._buffer('m', shape, h_out.dtype)
+        with np.errstate(divide='ignore'):
+            np.log(dt, out=m)
+        np.maximum(a, m, out=m)
+        decay = self._buffer('decay', shape, h_out.dtype)
+        np.negative(m, out=decay)
+        np.exp(decay, out=decay)
+        weight = self._buffer('weight', shape, h_out.dtype)
+        np.subtract(a, m, out=weight)
+        np.exp(weight, out=weight)
+        np.multiply(nt, decay, out=n_out)
+        z *= weight
+        n_out += z
+        np.multiply(dt, decay, out=d_out)
+        d_out += weight
+        np.divide(n_out, d_out, out=h_out)
+        self.f(h_out, h_out)
+
+
+class _Recurrence(_Op):
+    def __init__(self, step, inits, in_to_hid, hid_to_out, pre_compute_input,
+                 pass_raw_and_computed, in_order, out_order, backwards,
+                 only_return_final):
+        self.step = step
+        self.inits = inits
+        self.in_to_hid = in_to_hid
+        self.hid_to_out = hid_to_out
+        self.pre_compute_input = pre_compute_input
+        self.pass_raw_and_computed = pass_raw_and_computed
+        self.in_order = in_order
+        self.out_order = out_order
+        self.backwards = backwards
+        self.only_return_final = only_return_final
+
+    def _apply_in_to_hid(self, inputs):
+        if self.in_to_hid is None:
+            return tuple(inputs)
+        return tuple(self.in_to_hid.run(*inputs))
+
+    def __call__(self, inputs):
+        if self.in_order == "NTD":
+            inputs = tuple(np.swapaxes(i, 0, 1) for i in inputs)
+        num_steps, batch_size = inputs[0].shape[:2]
+        sequences = inputs
+        if self.pre_compute_input:
+            computed = self._apply_in_to_hid(
+                [i.reshape((num_steps * batch_size, -1)) for i in inputs])
+            computed = tuple(c.reshape((num_steps, batch_size, -1))
+                             for c in computed)
+            if self.pass_raw_and_computed:
+                sequences = inputs + computed
+            else:
+                sequences = computed
+        states = [np.broadcast_to(i, (batch_size, ) + i.shape[1:])
+                  for i in self.inits]
+        dtype = np.result_type(*inputs)
+        outputs = [self._buffer(n, (num_steps, ) + s.shape,
+                                np.result_type(s, dtype))
+                   for n, s in enumerate(states)]
+        steps = range(num_steps)
+        if self.backwards:
+            steps = reversed(steps)
+        for t in steps:
+            args = tuple(s[t] for s in sequences)
+            if not self.pre_compute_input:
+                computed = self._apply_in_to_hid(args)
+                args = args + computed if self.pass_raw_and_computed \
+                    else computed
+            outs = [o[t] for o in outputs]
+            self.step(args + tuple(states), outs)
+            states = outs
+        if self.only_return_final:
+            outputs = [o[-1] for o in outputs]
+        elif self.out_order == "NTD":
+            outputs = [np.swapaxes(o, 0, 1) for o in outputs]
+        if self.hid_to_out is not None:
+            outputs = self.hid_to_out.run(*outputs)
+        return tuple(outputs)